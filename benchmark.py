@@ -0,0 +1,1797 @@
+# benchmark offline: misura chiamate API e tempi contro gli stand-in locali di stubs.py
+# uso: python benchmark.py {read,write,quota,byte,parser,incrementale,sessione,geop,daemon,e2e,polling,pipeline,dedicato,avvio,credenziali,ics,modello,push,traccia,coordinatore} [opzioni] (vedi --help)
+import argparse
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import urllib.error
+import urllib.request
+from zoneinfo import ZoneInfo
+
+from google.auth import _helpers as google_auth_helpers
+from google.auth.transport.requests import Request
+from google.oauth2 import credentials as google_credentials
+from google.oauth2.credentials import Credentials
+
+try:
+    import resource
+except ImportError:
+    # Windows: il picco di RSS non è disponibile
+    resource = None
+
+import business
+import calendarapi
+import daemon
+import eventi as modello
+import icsfeed
+import notifiche
+import parser
+import polling
+import scheduler
+import statestore
+import stubs
+import traccia
+
+LOCAL_TZ = ZoneInfo("Europe/Rome")
+
+# orari delle lezioni generate: mattina e pomeriggio
+ORARI_LEZIONI = [((8, 40), (12, 40)), ((13, 40), (17, 40))]
+
+# orario sintetico del benchmark end-to-end: fasce da un'ora dalle 8:40 alle 17:40
+FASCE_ORARIE = 9
+
+# tolleranza predefinita del confronto con un risultato salvato (tempo, byte e RSS), in frazione
+SOGLIA_REGRESSIONE = 0.2
+
+
+def intervallo_settimane(settimane: int) -> dict:
+    """
+    Intervallo come quello di `business.weeks_range`, ma senza data massima: da lunedì corrente per `settimane` settimane.
+    """
+    oggi = datetime.date.today()
+    start = oggi - datetime.timedelta(days=oggi.weekday())
+    return {
+        "start": start.isoformat(),
+        "end": (start + datetime.timedelta(weeks=settimane)).isoformat(),
+    }
+
+
+def genera_eventi_google(date_info: dict, personali_per_giorno: int = 2) -> list:
+    """
+    Genera eventi Google sintetici per l'intervallo: due lezioni per giorno feriale
+    più alcuni eventi personali (anche serali e nel weekend) che il filtro deve scartare.
+    Gli eventi personali hanno invitati e videochiamata, come spesso accade nei calendari reali.
+
+    Args:
+        date_info (dict): Dizionario con "start" e "end" in formato YYYY-MM-DD.
+        personali_per_giorno (int): Numero di eventi non GEOP da aggiungere ogni giorno.
+
+    Returns:
+        list: Lista di eventi in formato Google Calendar.
+    """
+    giorno = datetime.date.fromisoformat(date_info["start"])
+    ultimo = datetime.date.fromisoformat(date_info["end"])
+    eventi = []
+
+    def evento(summary, inizio, fine):
+        eventi.append({
+            "id": f"ev{len(eventi):06d}",
+            "summary": summary,
+            "start": {"dateTime": inizio.isoformat(), "timeZone": "Europe/Rome"},
+            "end": {"dateTime": fine.isoformat(), "timeZone": "Europe/Rome"},
+        })
+
+    while giorno <= ultimo:
+        if giorno.weekday() < 5:
+            for n, ((h1, m1), (h2, m2)) in enumerate(ORARI_LEZIONI):
+                inizio = datetime.datetime(giorno.year, giorno.month, giorno.day, h1, m1, tzinfo=LOCAL_TZ)
+                fine = datetime.datetime(giorno.year, giorno.month, giorno.day, h2, m2, tzinfo=LOCAL_TZ)
+                evento(f"UFS0{n + 1} - Materia sintetica - Docente", inizio, fine)
+
+        for n in range(personali_per_giorno):
+            # dalle 19 in poi, poi dalla mezzanotte: sempre fuori dalla fascia delle lezioni fino a 13 eventi
+            inizio = datetime.datetime(giorno.year, giorno.month, giorno.day, (19 + n) % 24, 0, tzinfo=LOCAL_TZ)
+            evento(f"Evento personale {n}", inizio, inizio + datetime.timedelta(hours=1))
+            eventi[-1].update({
+                "description": "Appuntamento personale sincronizzato da un altro calendario.",
+                "attendees": [{"email": f"amico{k}@example.com", "responseStatus": "needsAction"} for k in range(3)],
+                "conferenceData": {"conferenceId": f"abc-{len(eventi)}", "entryPoints": [
+                    {"entryPointType": "video", "uri": f"https://meet.example.com/abc-{len(eventi)}"}]},
+            })
+
+        giorno += datetime.timedelta(days=1)
+
+    return eventi
+
+
+def genera_eventi_geop(date_info: dict) -> list:
+    """
+    Genera eventi GEOP sintetici già elaborati da `parser.parse_json` (il formato di calendar.json):
+    due lezioni per giorno feriale nell'intervallo [start, end).
+
+    Args:
+        date_info (dict): Dizionario con "start" e "end" in formato YYYY-MM-DD, "end" esclusivo.
+
+    Returns:
+        list: Lista di eventi nel formato di calendar.json.
+    """
+    giorno = datetime.date.fromisoformat(date_info["start"])
+    ultimo = datetime.date.fromisoformat(date_info["end"])
+    eventi = []
+
+    while giorno < ultimo:
+        if giorno.weekday() < 5:
+            for n, ((h1, m1), (h2, m2)) in enumerate(ORARI_LEZIONI):
+                materia = f"UFS0{n + 1} - Materia sintetica {n + 1}"
+                eventi.append({
+                    "id": 100000 + len(eventi),
+                    "title": materia,
+                    "start": f"{giorno.isoformat()}T{h1:02d}:{m1:02d}:00",
+                    "end": f"{giorno.isoformat()}T{h2:02d}:{m2:02d}:00",
+                    "ClasseEvento": "lezione",
+                    "tooltip": "Registro lezione da compilare",
+                    "Materia": materia,
+                    "Aula": f"Aula {n + 1}",
+                    "Corsi": "Corso sintetico",
+                    "Docente": f"Docente {n + 1}",
+                })
+        giorno += datetime.timedelta(days=1)
+
+    return eventi
+
+
+def genera_eventi_geop_grezzi(date_info: dict) -> list:
+    """
+    Come `genera_eventi_geop`, ma nel formato restituito da fullcalendar_events_alunno.asp:
+    i dettagli della lezione sono nel campo "tooltip" in HTML.
+    """
+    eventi = []
+    for ev in genera_eventi_geop(date_info):
+        eventi.append({
+            "id": ev["id"],
+            "title": ev["title"],
+            "start": ev["start"],
+            "end": ev["end"],
+            "ClasseEvento": ev["ClasseEvento"],
+            "tooltip": (
+                f"{ev['tooltip']}<br>Materia: {ev['Materia']}<br>Aula: {ev['Aula']}<br>"
+                f"Corsi: {ev['Corsi']}<br>Docente: {ev['Docente']}<br>Modalit&agrave;: - In presenza"
+            ),
+        })
+    return eventi
+
+
+def read_calendar_per_giorno(service, date_info: dict) -> list:
+    """
+    Implementazione di riferimento della lettura precedente: una chiamata events.list per ogni giorno feriale.
+    Serve solo come termine di paragone nel benchmark.
+    """
+    start_date = datetime.date.fromisoformat(date_info["start"])
+    end_date = datetime.date.fromisoformat(date_info["end"])
+    all_events = []
+
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date.weekday() < 5:
+            inizio, fine = calendarapi.fascia_oraria(current_date, LOCAL_TZ)
+            events_result = service.events().list(
+                calendarId="primary",
+                timeMin=inizio.astimezone(datetime.timezone.utc).isoformat(),
+                timeMax=fine.astimezone(datetime.timezone.utc).isoformat(),
+                singleEvents=True,
+                orderBy="startTime",
+            ).execute()
+            all_events.extend(
+                event for event in events_result.get("items", [])
+                if event.get("summary", "").startswith(calendarapi.PREFISSI_GEOP)
+            )
+        current_date += datetime.timedelta(days=1)
+
+    return all_events
+
+
+def bench_read(settimane: int, latenza: float):
+    """
+    Confronta la lettura per giorno con la lettura a intervallo unico di `calendarapi.read_calendar`:
+    numero di chiamate events.list, tempo totale e uguaglianza dei risultati.
+    """
+    date_info = intervallo_settimane(settimane)
+
+    with stubs.CalendarStub(latenza=latenza) as stub:
+        stub.carica(genera_eventi_google(date_info))
+        service = stub.service()
+
+        t0 = time.perf_counter()
+        per_giorno = read_calendar_per_giorno(service, date_info)
+        t_per_giorno = time.perf_counter() - t0
+        chiamate_per_giorno = stub.richieste["events.list"]
+
+        stub.richieste.clear()
+        get_service_originale = calendarapi.get_service
+        calendarapi.get_service = lambda creds: service
+        try:
+            t0 = time.perf_counter()
+            intervallo = calendarapi.read_calendar(None, date_info)
+            t_intervallo = time.perf_counter() - t0
+        finally:
+            calendarapi.get_service = get_service_originale
+        chiamate_intervallo = stub.richieste["events.list"]
+
+    stessi = sorted(e["id"] for e in per_giorno) == sorted(e["id"] for e in intervallo)
+
+    print(f"\nIntervallo {date_info['start']} -> {date_info['end']}, latenza simulata {latenza * 1000:.0f} ms")
+    print(f"{'modalità':<14}{'chiamate':>10}{'tempo (s)':>12}{'eventi':>8}")
+    print(f"{'per giorno':<14}{chiamate_per_giorno:>10}{t_per_giorno:>12.3f}{len(per_giorno):>8}")
+    print(f"{'intervallo':<14}{chiamate_intervallo:>10}{t_intervallo:>12.3f}{len(intervallo):>8}")
+    print(f"Stesso insieme di eventi: {'sì' if stessi else 'NO'}")
+
+
+def bench_write(settimane: int, latenza: float):
+    """
+    Confronta l'invio seriale delle scritture (una richiesta HTTP per evento) con l'invio in batch
+    di `calendarapi.esegui_batch`, sullo stesso insieme di inserimenti più un'eliminazione destinata a fallire.
+    """
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_eventi_geop(date_info)
+    inesistente = {"id": "inesistente", "summary": "Evento inesistente", "start": {"date": date_info["start"]}}
+
+    risultati = {}
+    for modalita in ("seriale", "batch"):
+        with stubs.CalendarStub(latenza=latenza) as stub:
+            service = stub.service()
+            mutazioni = [calendarapi.mutazione_add(service, ev) for ev in eventi]
+            mutazioni.append(calendarapi.mutazione_delete(service, inesistente))
+
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if modalita == "seriale":
+                    stats = {"ok": 0, "errori": 0}
+                    for mutazione in mutazioni:
+                        esito = calendarapi.esegui_mutazione(mutazione)
+                        stats["ok"] += esito["ok"]
+                        stats["errori"] += esito["errori"]
+                else:
+                    stats = calendarapi.esegui_batch(service, mutazioni)
+            durata = time.perf_counter() - t0
+
+            # in modalità batch le sotto-richieste sono contate per endpoint ma viaggiano in un'unica richiesta HTTP
+            richieste = stub.richieste["batch"] if modalita == "batch" else sum(stub.richieste.values())
+            risultati[modalita] = (richieste, durata, stats["ok"], stats["errori"], len(stub.eventi.get("primary", {})))
+
+    print(f"\n{len(eventi) + 1} modifiche ({len(eventi)} inserimenti + 1 eliminazione errata), latenza simulata {latenza * 1000:.0f} ms")
+    print(f"{'modalità':<10}{'richieste HTTP':>16}{'tempo (s)':>12}{'ok':>6}{'errori':>8}{'eventi creati':>15}")
+    for modalita, (richieste, durata, ok, errori, creati) in risultati.items():
+        print(f"{modalita:<10}{richieste:>16}{durata:>12.3f}{ok:>6}{errori:>8}{creati:>15}")
+
+
+def bench_quota(settimane: int, quota: int, latenza: float):
+    """
+    Invia una raffica di inserimenti a uno stub con quota di scritture al secondo e confronta:
+    nessuna gestione dei limiti (gli eventi limitati vanno persi), solo backoff con jitter,
+    e token bucket tarato poco sotto la quota più backoff. Nessuna configurazione deve perdere eventi tranne la prima.
+    """
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_eventi_geop(date_info)
+    configurazioni = (
+        ("nessuna gestione", float("inf"), 0),
+        ("solo backoff", float("inf"), scheduler.TENTATIVI),
+        ("token bucket", quota * 0.9, scheduler.TENTATIVI),
+    )
+
+    print(f"\n{len(eventi)} inserimenti, quota dello stub {quota} scritture/s, latenza simulata {latenza * 1000:.0f} ms")
+    print(f"{'modalità':<18}{'richieste HTTP':>16}{'limitate':>10}{'tempo (s)':>12}{'ok':>6}{'errori':>8}{'rinviate':>10}{'creati':>8}")
+
+    try:
+        for nome, al_secondo, tentativi in configurazioni:
+            # bucket senza raffica iniziale oltre la quota: la capacità è pari alla quota stessa
+            scheduler.configura(al_secondo, al_secondo, capacita=min(al_secondo, quota))
+            with stubs.CalendarStub(latenza=latenza, quota_al_secondo=quota) as stub:
+                service = stub.service()
+                mutazioni = [calendarapi.mutazione_add(service, ev) for ev in eventi]
+
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = calendarapi.esegui_batch(service, mutazioni, dimensione=quota, utente="studente", tentativi=tentativi)
+                durata = time.perf_counter() - t0
+
+                errori = stats["errori"] + (len(stats["rinviate"]) if tentativi == 0 else 0)
+                rinviate = len(stats["rinviate"]) if tentativi else 0
+                print(f"{nome:<18}{stub.richieste['batch']:>16}{stub.richieste['limitate']:>10}{durata:>12.3f}"
+                      f"{stats['ok']:>6}{errori:>8}{rinviate:>10}{len(stub.eventi.get('primary', {})):>8}")
+    finally:
+        scheduler.configura()
+
+
+def parse_tooltip_precedente(tooltip: str) -> dict:
+    """
+    Implementazione di riferimento del parser precedente: split su <br>, join e regex ricompilata a ogni evento.
+    Serve solo come termine di paragone nel benchmark.
+    """
+    result = {}
+    lines = [line.strip() for line in tooltip.split("<br>") if line.strip()]
+    if lines:
+        result["tooltip"] = lines[0]
+    rest = " ".join(lines[1:])
+
+    expected_keys = ["Materia", "Aula", "Corsi", "Docente", "Argomento", "Modalit&agrave;"]
+    pattern = r"(" + "|".join(expected_keys) + r"):\s*(.*?)(?=\s+(?:" + "|".join(expected_keys) + r"):\s*|$)"
+
+    for key, value in re.findall(pattern, rest, flags=re.IGNORECASE):
+        key = key.strip()
+        value = value.strip()
+        if key.lower() == "modalit&agrave;":
+            key = "Modalità"
+            if value.startswith("-"):
+                value = value[1:].strip()
+        result[key] = value
+    return result
+
+
+def bench_parser(settimane: int, ripetizioni: int):
+    """
+    Micro-benchmark dell'elaborazione della risposta GEOP su un payload sintetico (di default un anno):
+    eventi al secondo del solo parser del tooltip (precedente contro compilato a passaggio singolo) e
+    tempo e picco di memoria (tracemalloc) della pipeline completa risposta -> calendar.json: json.loads
+    dell'intera risposta con il parser precedente contro la decodifica in streaming di `parser.iter_eventi`.
+    """
+    eventi = genera_eventi_geop_grezzi(intervallo_settimane(settimane))
+    for n, ev in enumerate(eventi):
+        ev["tooltip"] += f"<br>Argomento: Lezione n. {n} &ndash; esercitazione guidata<br>sui contenuti dell&#39;unit&agrave;"
+    payload = json.dumps(eventi, ensure_ascii=False).encode("utf-8")
+    tooltips = [ev["tooltip"] for ev in eventi]
+
+    print(f"\n{len(eventi)} eventi ({settimane} settimane), payload {len(payload) / 1024:.0f} kB, {ripetizioni} ripetizioni")
+    print(f"{'parser tooltip':<28}{'eventi/s':>12}")
+    for nome, funzione in (("precedente", parse_tooltip_precedente), ("compilato, un passaggio", parser.parse_tooltip)):
+        t0 = time.perf_counter()
+        for _ in range(ripetizioni):
+            for tooltip in tooltips:
+                funzione(tooltip)
+        durata = time.perf_counter() - t0
+        print(f"{nome:<28}{len(tooltips) * ripetizioni / durata:>12.0f}")
+
+    def completa(percorso):
+        # pipeline precedente: risposta intera in memoria, parser precedente, un unico json.dump
+        dati = json.loads(payload)
+        elaborati = [
+            {**ev, **parse_tooltip_precedente(ev["tooltip"])} for ev in dati
+            if ev.get("id") != 0 and not ev.get("title", "").strip().startswith("SOSPENSIONE DIDATTICA") and "tooltip" in ev
+        ]
+        with open(percorso, "w", encoding="utf-8") as file:
+            json.dump(elaborati, file, indent=4, ensure_ascii=False)
+
+    def streaming(percorso):
+        blocchi = (payload[i:i + parser.BLOCCO_STREAM] for i in range(0, len(payload), parser.BLOCCO_STREAM))
+        parser.write_eventi(parser.iter_eventi(blocchi), percorso)
+
+    print(f"\n{'pipeline risposta -> file':<28}{'eventi/s':>12}{'picco memoria (kB)':>20}")
+    with tempfile.TemporaryDirectory() as cartella:
+        risultati = []
+        for nome, funzione in (("precedente (json.loads)", completa), ("streaming", streaming)):
+            percorso = os.path.join(cartella, f"{nome}.json")
+            t0 = time.perf_counter()
+            for _ in range(ripetizioni):
+                funzione(percorso)
+            durata = (time.perf_counter() - t0) / ripetizioni
+
+            # tracemalloc rallenta le allocazioni: il picco si misura in un'esecuzione separata
+            tracemalloc.start()
+            funzione(percorso)
+            picco = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            risultati.append([ev["id"] for ev in parser.read_json(percorso)])
+            print(f"{nome:<28}{len(eventi) / durata:>12.0f}{picco / 1024:>20.0f}")
+
+    # i valori possono differire solo per le entità HTML, ora decodificate
+    print(f"Stessi eventi in calendar.json: {'sì' if risultati[0] == risultati[1] else 'NO'}")
+
+
+def bench_byte(settimane: int, latenza: float, modifiche: int):
+    """
+    Misura i byte scambiati con Google Calendar per ciclo di sincronizzazione con risorse complete
+    (con e senza gzip) e con risposte parziali (`calendarapi.RISPOSTE_PARZIALI`) più gzip.
+    Cicli: sincronizzazione iniziale su un calendario con eventi personali, `modifiche` lezioni cambiate
+    su GEOP (scritture con events.patch) e una lettura completa dell'intervallo.
+    """
+    date_info = intervallo_settimane(settimane)
+    configurazioni = (
+        ("complete, no gzip", False, False),
+        ("complete + gzip", False, True),
+        ("parziali, no gzip", True, False),
+        ("parziali + gzip", True, True),
+    )
+
+    print(f"\n{settimane} settimane, {modifiche} lezioni modificate, latenza simulata {latenza * 1000:.0f} ms (kB ricevuti dal client / inviati)")
+    print(f"{'modalità':<20}{'iniziale':>16}{'modifiche':>16}{'lettura':>16}{'totale kB':>12}")
+
+    originale = calendarapi.RISPOSTE_PARZIALI
+    try:
+        for nome, parziali, compressione in configurazioni:
+            calendarapi.RISPOSTE_PARZIALI = parziali
+            eventi = genera_eventi_geop_grezzi(date_info)
+
+            with stubs.GeopStub(eventi, latenza=latenza) as geop, \
+                    stubs.CalendarStub(latenza=latenza, gzip=compressione) as calendar, \
+                    tempfile.TemporaryDirectory() as cartella, stand_in(geop, calendar):
+                calendar.carica([ev for ev in genera_eventi_google(date_info) if not ev["summary"].startswith("UFS")], "cal")
+                profilo = {"nome": "studente", "username": "studente", "password": "segreta", "cartella": cartella,
+                           "calendar_id": "cal", "credentials": "credentials.json"}
+
+                colonne = []
+                totale = 0
+                for ciclo in ("iniziale", "modifiche", "lettura"):
+                    if ciclo == "modifiche":
+                        for ev in eventi[:modifiche]:
+                            ev["tooltip"] = ev["tooltip"].replace("Aula 1", "Aula 7").replace("Aula 2", "Aula 8")
+
+                    calendar.azzera_contatori()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        if ciclo == "lettura":
+                            calendarapi.read_calendar(None, date_info, "cal")
+                        else:
+                            daemon.sincronizza_utente(profilo, date_info)
+
+                    colonne.append(f"{calendar.byte_inviati / 1024:.1f}/{calendar.byte_ricevuti / 1024:.1f}")
+                    totale += calendar.byte_inviati + calendar.byte_ricevuti
+
+                print(f"{nome:<20}" + "".join(f"{colonna:>16}" for colonna in colonne) + f"{totale / 1024:>12.1f}")
+    finally:
+        calendarapi.RISPOSTE_PARZIALI = originale
+
+
+def bench_incrementale(settimane: int, latenza: float, cicli: int):
+    """
+    Simula più cicli di lettura di Google Calendar: lettura completa a ogni ciclo contro lettura
+    incrementale con syncToken. Dopo il primo ciclo viene modificato un solo evento, poi i cicli sono tranquilli;
+    l'ultimo ciclo incrementale riceve 410 Gone e deve ripiegare sulla lettura completa.
+    """
+    date_info = intervallo_settimane(settimane)
+
+    with stubs.CalendarStub(latenza=latenza) as stub, tempfile.TemporaryDirectory() as cartella:
+        stub.carica(genera_eventi_google(date_info))
+        service = stub.service()
+        mirror_path = os.path.join(cartella, "google_events.json")
+
+        get_service_originale = calendarapi.get_service
+        calendarapi.get_service = lambda creds: service
+        print(f"\n{'ciclo':<7}{'modalità':<14}{'richieste':>10}{'eventi trasferiti':>19}{'tempo (s)':>12}{'uguali':>8}")
+        try:
+            for ciclo in range(cicli):
+                if ciclo == 1:
+                    evento = dict(next(iter(stub.eventi["primary"].values())), location="Aula modificata")
+                    stub.modifica("primary", evento["id"], evento)
+                if ciclo == cicli - 1:
+                    stub.scadi_sync_token()
+
+                risultati = []
+                for modalita, lettura in (("completa", lambda: calendarapi.read_calendar(None, date_info)),
+                                          ("incrementale", lambda: calendarapi.read_calendar_incrementale(None, date_info, mirror_path))):
+                    stub.richieste.clear()
+                    stub.trasferiti = 0
+                    t0 = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        eventi = lettura()
+                    durata = time.perf_counter() - t0
+                    risultati.append(eventi)
+                    print(f"{ciclo:<7}{modalita:<14}{stub.richieste['events.list']:>10}{stub.trasferiti:>19}{durata:>12.3f}", end="")
+                    print(f"{'sì' if risultati[0] == eventi else 'NO':>8}" if len(risultati) == 2 else "")
+        finally:
+            calendarapi.get_service = get_service_originale
+
+
+def bench_sessione(cicli: int, latenza: float):
+    """
+    Simula più cicli di lettura da GEOP: login a ogni ciclo (comportamento precedente) contro
+    sessione riutilizzata di `business.GeopSession`. A metà dei cicli le sessioni del server scadono.
+    """
+    date_info = intervallo_settimane(6)
+
+    with stubs.GeopStub(genera_eventi_geop_grezzi(date_info), latenza=latenza) as stub:
+        url_originali = business.LOGIN_URL, business.XHR_URL
+        business.LOGIN_URL, business.XHR_URL = stub.login_url, stub.xhr_url
+        try:
+            print(f"\n{cicli} cicli, latenza simulata {latenza * 1000:.0f} ms, sessioni scadute al ciclo {cicli // 2}")
+            print(f"{'modalità':<14}{'login':>7}{'richieste HTTP':>16}{'tempo (s)':>12}")
+
+            for modalita in ("login a ciclo", "riutilizzata"):
+                stub.richieste.clear()
+                stub.scadi_sessioni()
+                sessione = business.GeopSession({"username": "studente", "password": "segreta"})
+
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for ciclo in range(cicli):
+                        if ciclo == cicli // 2:
+                            stub.scadi_sessioni()
+                        if modalita == "login a ciclo":
+                            sessione = business.GeopSession({"username": "studente", "password": "segreta"})
+                        sessione.calendario(date_info)
+                durata = time.perf_counter() - t0
+
+                print(f"{modalita:<14}{stub.richieste['login.asp']:>7}{sum(stub.richieste.values()):>16}{durata:>12.3f}")
+        finally:
+            business.LOGIN_URL, business.XHR_URL = url_originali
+
+
+def bench_geop(settimane: int, latenza: float, latenza_evento: float, paralleli_list: list):
+    """
+    Misura la lettura da GEOP di un intervallo lungo (di default un anno): un'unica richiesta contro
+    finestre settimanali e mensili scaricate in parallelo sulla stessa sessione.
+    Tutte le configurazioni devono restituire gli stessi eventi.
+    """
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_eventi_geop_grezzi(date_info)
+    credenziali = {"username": "studente", "password": "segreta"}
+
+    with stubs.GeopStub(eventi, latenza=latenza, latenza_evento=latenza_evento) as stub:
+        url_originali = business.LOGIN_URL, business.XHR_URL
+        business.LOGIN_URL, business.XHR_URL = stub.login_url, stub.xhr_url
+        try:
+            print(f"\n{settimane} settimane, {len(eventi)} eventi, latenza simulata {latenza * 1000:.0f} ms "
+                  f"+ {latenza_evento * 1000:.1f} ms per evento")
+            print(f"{'modalità':<22}{'richieste':>10}{'login':>7}{'tempo (s)':>12}{'eventi':>8}{'uguali':>8}")
+
+            configurazioni = [("intervallo unico", None, 1)] + [
+                (f"{finestra} x{paralleli}", finestra, paralleli)
+                for finestra in business.FINESTRE for paralleli in paralleli_list
+            ]
+            riferimento = None
+            for nome, finestra, paralleli in configurazioni:
+                stub.richieste.clear()
+                sessione = business.GeopSession(credenziali)
+
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if finestra is None:
+                        letti = sessione.calendario(date_info).json()
+                    else:
+                        letti = sessione.calendario_a_finestre(date_info, finestra, paralleli)
+                durata = time.perf_counter() - t0
+
+                ids = sorted(event["id"] for event in letti)
+                riferimento = riferimento or ids
+                print(f"{nome:<22}{stub.richieste['fullcalendar_events_alunno.asp']:>10}{stub.richieste['login.asp']:>7}"
+                      f"{durata:>12.3f}{len(letti):>8}{'sì' if ids == riferimento else 'NO':>8}")
+        finally:
+            business.LOGIN_URL, business.XHR_URL = url_originali
+
+
+@contextlib.contextmanager
+def stand_in(geop: "stubs.GeopStub", calendar: "stubs.CalendarStub", latenza_accesso: float = 0.0):
+    """
+    Indirizza business e calendarapi verso gli stand-in locali per la durata del blocco:
+    URL di GEOP, client Calendar (uno per thread, perché httplib2 non è thread-safe) e credenziali fittizie,
+    che impiegano `latenza_accesso` secondi come un rinnovo del token.
+    """
+    locale = threading.local()
+
+    def get_service(creds):
+        if not hasattr(locale, "service"):
+            # come le connessioni create da calendarapi, quella del client stub è registrata nelle tracce
+            locale.service = calendar.service()
+            traccia.http(locale.service._http)
+        return locale.service
+
+    originali = business.LOGIN_URL, business.XHR_URL, calendarapi.get_service, calendarapi.accesso
+    business.LOGIN_URL, business.XHR_URL = geop.login_url, geop.xhr_url
+    calendarapi.get_service = get_service
+    calendarapi.accesso = lambda *args, **kwargs: time.sleep(latenza_accesso)
+    try:
+        yield
+    finally:
+        business.LOGIN_URL, business.XHR_URL, calendarapi.get_service, calendarapi.accesso = originali
+        business._sessioni.clear()
+
+
+def bench_daemon(utenti: int, workers_list: list, latenza: float):
+    """
+    Misura il throughput del demone multi-utente (utenti sincronizzati al minuto) al variare del numero di worker.
+    Per ogni configurazione esegue due cicli: il primo crea tutti gli eventi, il secondo non trova modifiche.
+    """
+    date_info = intervallo_settimane(6)
+    eventi = genera_eventi_geop_grezzi(date_info)
+
+    print(f"\n{utenti} utenti, {len(eventi)} eventi ciascuno, latenza simulata {latenza * 1000:.0f} ms")
+    print(f"{'workers':>8}{'ciclo':>11}{'tempo (s)':>11}{'utenti/min':>12}{'riusciti':>10}")
+
+    for workers in workers_list:
+        with stubs.GeopStub(eventi, latenza=latenza) as geop, stubs.CalendarStub(latenza=latenza) as calendar, \
+                tempfile.TemporaryDirectory() as cartella, stand_in(geop, calendar):
+            profili = [
+                {"nome": f"studente{n}", "username": f"studente{n}", "password": "segreta",
+                 "cartella": os.path.join(cartella, f"studente{n}"), "calendar_id": f"cal{n}",
+                 "credentials": "credentials.json"}
+                for n in range(utenti)
+            ]
+
+            for ciclo in ("iniziale", "invariato"):
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    esiti = daemon.esegui_ciclo(profili, date_info, workers)
+                durata = time.perf_counter() - t0
+                riusciti = sum(1 for esito in esiti if esito["ok"])
+                print(f"{workers:>8}{ciclo:>11}{durata:>11.3f}{utenti / durata * 60:>12.1f}{riusciti:>10}")
+
+            # isolamento: ogni utente ha i propri eventi nel proprio calendario
+            assert all(len(calendar.eventi[p["calendar_id"]]) == len(eventi) for p in profili)
+
+
+
+def genera_orario(date_info: dict, lezioni_giorno: int, rng: random.Random) -> list:
+    """
+    Genera un orario GEOP sintetico nel formato grezzo di fullcalendar_events_alunno.asp:
+    `lezioni_giorno` lezioni da un'ora per giorno feriale nell'intervallo [start, end),
+    con materia, aula e docente scelti da `rng` (a parità di seme l'orario è sempre lo stesso).
+
+    Args:
+        date_info (dict): Dizionario con "start" e "end" in formato YYYY-MM-DD, "end" esclusivo.
+        lezioni_giorno (int): Lezioni per giorno feriale, al massimo `FASCE_ORARIE`.
+        rng (random.Random): Generatore casuale con seme fissato.
+
+    Returns:
+        list: Lista di eventi GEOP grezzi, con il dettaglio della lezione nel tooltip HTML.
+    """
+    if not 1 <= lezioni_giorno <= FASCE_ORARIE:
+        raise ValueError(f"lezioni_giorno deve essere compreso tra 1 e {FASCE_ORARIE}")
+
+    giorno = datetime.date.fromisoformat(date_info["start"])
+    ultimo = datetime.date.fromisoformat(date_info["end"])
+    eventi = []
+
+    while giorno < ultimo:
+        if giorno.weekday() < 5:
+            for fascia in sorted(rng.sample(range(FASCE_ORARIE), lezioni_giorno)):
+                eventi.append(lezione_sintetica(100000 + len(eventi), giorno, fascia, rng))
+        giorno += datetime.timedelta(days=1)
+
+    return eventi
+
+
+def lezione_sintetica(event_id: int, giorno: datetime.date, fascia: int, rng: random.Random) -> dict:
+    """
+    Una lezione GEOP grezza da un'ora nella fascia oraria indicata (0 = 8:40).
+    """
+    materia = rng.randint(1, 12)
+    inizio = datetime.datetime.combine(giorno, datetime.time(8, 40)) + datetime.timedelta(hours=fascia)
+    return {
+        "id": event_id,
+        "title": f"UFS{materia:02d} - Materia sintetica {materia}",
+        "start": inizio.isoformat(),
+        "end": (inizio + datetime.timedelta(hours=1)).isoformat(),
+        "ClasseEvento": "lezione",
+        "tooltip": (
+            f"Registro lezione da compilare<br>Materia: UFS{materia:02d} - Materia sintetica {materia}<br>"
+            f"Aula: Aula {rng.randint(1, 20)}<br>Corsi: Corso sintetico<br>Docente: Docente {materia}<br>"
+            f"Modalit&agrave;: - In presenza"
+        ),
+    }
+
+
+def applica_churn(eventi: list, churn: float, rng: random.Random, nuovi_id, date_info: dict) -> dict:
+    """
+    Simula le variazioni di orario tra due cicli: modifica, cancella o aggiunge `churn * len(eventi)` lezioni
+    (metà cambi di aula, un quarto cancellazioni, un quarto nuove lezioni in fasce libere).
+
+    Args:
+        eventi (list): Eventi GEOP grezzi, modificati sul posto.
+        churn (float): Frazione delle lezioni da variare.
+        rng (random.Random): Generatore casuale con seme fissato.
+        nuovi_id: Iteratore degli id da assegnare alle lezioni aggiunte.
+        date_info (dict): Intervallo dell'orario, per collocare le lezioni aggiunte.
+
+    Returns:
+        dict: Numero di lezioni "modificate", "cancellate" e "aggiunte".
+    """
+    conteggio = {"modificate": 0, "cancellate": 0, "aggiunte": 0}
+    inizio = datetime.date.fromisoformat(date_info["start"])
+    giorni = (datetime.date.fromisoformat(date_info["end"]) - inizio).days
+
+    for _ in range(round(len(eventi) * churn)):
+        operazione = rng.choice(("modificate", "modificate", "cancellate", "aggiunte"))
+
+        if operazione == "aggiunte":
+            occupate = {ev["start"] for ev in eventi}
+            giorno = inizio + datetime.timedelta(days=rng.randrange(giorni))
+            libere = [
+                fascia for fascia in range(FASCE_ORARIE)
+                if f"{giorno.isoformat()}T{8 + fascia:02d}:40:00" not in occupate
+            ]
+            if giorno.weekday() < 5 and libere:
+                eventi.append(lezione_sintetica(next(nuovi_id), giorno, rng.choice(libere), rng))
+                conteggio["aggiunte"] += 1
+                continue
+            # giorno festivo o pieno: la variazione diventa un cambio di aula
+            operazione = "modificate"
+
+        if not eventi:
+            break
+        indice = rng.randrange(len(eventi))
+        if operazione == "cancellate":
+            eventi.pop(indice)
+        else:
+            eventi[indice]["tooltip"] = re.sub(r"Aula: [^<]*", f"Aula: Aula {rng.randint(21, 40)}", eventi[indice]["tooltip"])
+        conteggio[operazione] += 1
+
+    return conteggio
+
+
+def esegui_e2e(settimane: int, lezioni_giorno: int, churn: float, cicli: int, latenza: float, rps: float, seed: int) -> dict:
+    """
+    Esegue la pipeline di `main.main()` contro gli stand-in di GEOP e Google Calendar (costruito dal documento
+    di discovery locale di `calendarapi.discovery_doc`): un ciclo iniziale che crea tutte le lezioni,
+    `cicli` cicli con il `churn` indicato e un ciclo finale senza variazioni.
+
+    Va eseguita in un processo dedicato: cambia la cartella corrente (main.py lavora in ".") e il picco
+    di RSS misurato è quello dell'intero processo.
+
+    Returns:
+        dict: Numero di eventi iniziali e, per ogni ciclo, tempo, richieste per endpoint, byte, picco di RSS
+              e coerenza tra l'orario GEOP e gli eventi presenti sullo stand-in di Google.
+    """
+    rng = random.Random(seed)
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_orario(date_info, lezioni_giorno, rng)
+    nuovi_id = itertools.count(100000 + len(eventi))
+    scheduler.configura(rps, rps)
+
+    # main.py legge le credenziali GEOP da user_login.py, che non fa parte del repository
+    user_login = types.ModuleType("user_login")
+    user_login.username = lambda: "studente"
+    user_login.password = lambda: "segreta"
+    sys.modules["user_login"] = user_login
+    import main
+
+    cartella_originale = os.getcwd()
+    weeks_range_originale = business.weeks_range
+    risultato = {"eventi": len(eventi), "cicli": []}
+
+    with tempfile.TemporaryDirectory() as cartella:
+        os.chdir(cartella)
+        # l'intervallo del benchmark al posto delle 6 settimane fisse di main.py
+        business.weeks_range = lambda *args, **kwargs: dict(date_info)
+        try:
+            with stubs.GeopStub(eventi, latenza=latenza) as geop, \
+                    stubs.CalendarStub(latenza=latenza, documento=calendarapi.discovery_doc()) as calendar, \
+                    stand_in(geop, calendar):
+                fasi = [("iniziale", None)] + [(f"churn {n + 1}", churn) for n in range(cicli)] + [("invariato", None)]
+                for nome, variazione in fasi:
+                    conteggio = applica_churn(eventi, variazione, rng, nuovi_id, date_info) if variazione else {}
+                    geop.azzera_contatori()
+                    calendar.azzera_contatori()
+
+                    t0 = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        main.main()
+                    durata = time.perf_counter() - t0
+
+                    sincronizzati = {
+                        ev.get("extendedProperties", {}).get("private", {}).get("geopId")
+                        for ev in calendar.eventi.get("primary", {}).values()
+                    }
+                    risultato["cicli"].append({
+                        "ciclo": nome,
+                        "variazioni": conteggio,
+                        "tempo": durata,
+                        "richieste": {
+                            **{f"geop {k}": v for k, v in geop.richieste.items()},
+                            **{f"google {k}": v for k, v in calendar.richieste.items()},
+                        },
+                        "byte": {
+                            "geop": geop.byte_ricevuti + geop.byte_inviati,
+                            "google": calendar.byte_ricevuti + calendar.byte_inviati,
+                        },
+                        "rss_kb": picco_rss_kb(),
+                        "coerente": sincronizzati == {str(ev["id"]) for ev in eventi},
+                    })
+        finally:
+            business.weeks_range = weeks_range_originale
+            os.chdir(cartella_originale)
+
+    return risultato
+
+
+def picco_rss_kb():
+    """
+    Picco di memoria residente del processo in kB, None dove non è disponibile.
+    """
+    if resource is None:
+        return None
+    picco = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux restituisce kB, macOS byte
+    return picco // 1024 if sys.platform == "darwin" else picco
+
+
+def aggrega_e2e(ripetizioni: list) -> list:
+    """
+    Riassume più esecuzioni di `esegui_e2e`: tempo e byte mediani, RSS massimo e richieste
+    (che a parità di seme devono coincidere tra le esecuzioni: altrimenti "stabile" è False).
+    """
+    riepilogo = []
+    for cicli in zip(*(esecuzione["cicli"] for esecuzione in ripetizioni)):
+        primo = cicli[0]
+        rss = [ciclo["rss_kb"] for ciclo in cicli if ciclo["rss_kb"] is not None]
+        riepilogo.append({
+            "ciclo": primo["ciclo"],
+            "variazioni": primo["variazioni"],
+            "tempo": statistics.median(ciclo["tempo"] for ciclo in cicli),
+            "tempo_min": min(ciclo["tempo"] for ciclo in cicli),
+            "tempo_max": max(ciclo["tempo"] for ciclo in cicli),
+            "richieste": primo["richieste"],
+            "byte": {k: statistics.median(ciclo["byte"][k] for ciclo in cicli) for k in primo["byte"]},
+            "rss_kb": max(rss) if rss else None,
+            "stabile": all(ciclo["richieste"] == primo["richieste"] for ciclo in cicli),
+            "coerente": all(ciclo["coerente"] for ciclo in cicli),
+        })
+    return riepilogo
+
+
+def confronta_e2e(riepilogo: list, riferimento: list, soglia: float) -> list:
+    """
+    Confronta il riepilogo con un risultato salvato in precedenza.
+    Le richieste devono essere al massimo quelle di riferimento (a parità di parametri sono deterministiche),
+    tempo, byte e RSS possono crescere al più della frazione `soglia`.
+
+    Returns:
+        list: Descrizioni delle regressioni trovate (vuota se non ce ne sono).
+    """
+    regressioni = []
+    for ciclo, base in zip(riepilogo, riferimento):
+        nome = ciclo["ciclo"]
+        for endpoint, volte in ciclo["richieste"].items():
+            if volte > base["richieste"].get(endpoint, 0):
+                regressioni.append(f"{nome}: {endpoint} {base['richieste'].get(endpoint, 0)} -> {volte} richieste")
+
+        misure = [("tempo (s)", ciclo["tempo"], base["tempo"]), ("RSS (kB)", ciclo["rss_kb"], base["rss_kb"])]
+        misure += [(f"byte {k}", v, base["byte"].get(k)) for k, v in ciclo["byte"].items()]
+        for misura, valore, precedente in misure:
+            if valore is not None and precedente and valore > precedente * (1 + soglia):
+                regressioni.append(f"{nome}: {misura} {precedente:.6g} -> {valore:.6g} (+{valore / precedente - 1:.0%})")
+
+    return regressioni
+
+
+def bench_e2e(parametri: dict, ripetizioni: int, salva: str = None, confronta: str = None,
+              soglia: float = SOGLIA_REGRESSIONE) -> bool:
+    """
+    Benchmark end-to-end ripetibile della pipeline di main.py: ogni ripetizione gira in un processo separato
+    (picco di RSS indipendente, nessuna cache condivisa) con lo stesso seme, quindi con lo stesso orario
+    e le stesse variazioni.
+
+    Args:
+        parametri (dict): Argomenti di `esegui_e2e`.
+        ripetizioni (int): Numero di processi da eseguire.
+        salva (str): File JSON in cui salvare il riepilogo, da usare come riferimento.
+        confronta (str): File JSON salvato in precedenza con cui confrontare il riepilogo.
+        soglia (float): Crescita tollerata di tempo, byte e RSS rispetto al riferimento.
+
+    Returns:
+        bool: False se il confronto ha trovato regressioni o se le esecuzioni non sono coerenti.
+    """
+    comando = [sys.executable, os.path.abspath(__file__), "e2e", "--processo"]
+    comando += [f"--{nome.replace('_', '-')}={valore}" for nome, valore in parametri.items()]
+
+    esecuzioni = []
+    for _ in range(ripetizioni):
+        processo = subprocess.run(comando, capture_output=True, text=True, check=True)
+        esecuzioni.append(json.loads(processo.stdout.splitlines()[-1]))
+    riepilogo = aggrega_e2e(esecuzioni)
+
+    print(f"\n{parametri['settimane']} settimane, {esecuzioni[0]['eventi']} lezioni, churn {parametri['churn']:.0%}, "
+          f"latenza simulata {parametri['latenza'] * 1000:.0f} ms, {ripetizioni} ripetizioni (seme {parametri['seed']})")
+    print(f"{'ciclo':<12}{'tempo (s)':>11}{'min-max':>15}{'GEOP':>6}{'Google':>8}{'kB GEOP':>9}{'kB Google':>11}"
+          f"{'RSS (MB)':>10}{'stabile':>9}{'coerente':>10}")
+    for ciclo in riepilogo:
+        richieste_geop = sum(v for k, v in ciclo["richieste"].items() if k.startswith("geop "))
+        richieste_google = sum(v for k, v in ciclo["richieste"].items() if k.startswith("google "))
+        rss = f"{ciclo['rss_kb'] / 1024:.1f}" if ciclo["rss_kb"] is not None else "-"
+        print(f"{ciclo['ciclo']:<12}{ciclo['tempo']:>11.3f}{ciclo['tempo_min']:>8.3f}-{ciclo['tempo_max']:.3f}"
+              f"{richieste_geop:>6}{richieste_google:>8}{ciclo['byte']['geop'] / 1024:>9.1f}"
+              f"{ciclo['byte']['google'] / 1024:>11.1f}{rss:>10}{'sì' if ciclo['stabile'] else 'NO':>9}"
+              f"{'sì' if ciclo['coerente'] else 'NO':>10}")
+
+    print("\nrichieste per endpoint:")
+    for ciclo in riepilogo:
+        dettaglio = ", ".join(f"{k}={v}" for k, v in sorted(ciclo["richieste"].items()))
+        variazioni = ", ".join(f"{k}={v}" for k, v in ciclo["variazioni"].items())
+        print(f"  {ciclo['ciclo']:<12}{dettaglio}" + (f"  [{variazioni}]" if variazioni else ""))
+
+    ok = all(ciclo["coerente"] and ciclo["stabile"] for ciclo in riepilogo)
+
+    if confronta:
+        riferimento = parser.read_json(confronta)
+        if riferimento["parametri"] != parametri:
+            print(f"\n{confronta} è stato ottenuto con parametri diversi, confronto non eseguito: {riferimento['parametri']}")
+            ok = False
+        else:
+            regressioni = confronta_e2e(riepilogo, riferimento["cicli"], soglia)
+            print(f"\nconfronto con {confronta} (soglia {soglia:.0%}): "
+                  + ("nessuna regressione" if not regressioni else f"{len(regressioni)} regressioni"))
+            for regressione in regressioni:
+                print(f"  {regressione}")
+            ok = ok and not regressioni
+
+    if salva:
+        with open(salva, "w", encoding="utf-8") as file:
+            json.dump({"parametri": parametri, "cicli": riepilogo}, file, indent=4, ensure_ascii=False)
+        print(f"\nRisultati salvati in {salva}")
+
+    return ok
+
+
+def bench_polling(settimane: int, lezioni_giorno: int, variazioni_giorno: int, seed: int):
+    """
+    Simula `settimane` settimane di cicli con l'intervallo fisso di 1800 s e con `polling.prossima_attesa`,
+    senza richieste reali: conta i cicli (richieste a GEOP) e misura il ritardo con cui vengono viste
+    le presenze, registrate entro 10 minuti dall'inizio e dalla fine di ogni lezione, e le altre variazioni
+    di orario, `variazioni_giorno` per giorno feriale tra le 8 e le 18.
+    """
+    rng = random.Random(seed)
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_orario(date_info, lezioni_giorno, rng)
+    inizio = datetime.datetime.fromisoformat(date_info["start"])
+    fine = datetime.datetime.fromisoformat(date_info["end"])
+
+    presenze = sorted(
+        datetime.datetime.fromisoformat(event[campo]) + datetime.timedelta(minutes=rng.uniform(0, 10))
+        for event in eventi for campo in ("start", "end")
+    )
+    altre = sorted(
+        inizio + datetime.timedelta(days=giorno, hours=rng.uniform(8, 18))
+        for giorno in range((fine - inizio).days) if (inizio + datetime.timedelta(days=giorno)).weekday() < 5
+        for _ in range(variazioni_giorno)
+    )
+
+    def simula(prossimo):
+        cicli, invariati, adesso = 0, 0, inizio
+        ritardi = {"presenze": [], "altre": []}
+        da_vedere = {"presenze": list(presenze), "altre": list(altre)}
+        while adesso < fine:
+            cicli += 1
+            viste = 0
+            for tipo, variazioni in da_vedere.items():
+                while variazioni and variazioni[0] <= adesso:
+                    ritardi[tipo].append((adesso - variazioni.pop(0)).total_seconds() / 60)
+                    viste += 1
+            invariati = 0 if viste else invariati + 1
+            adesso += datetime.timedelta(seconds=prossimo(adesso, invariati))
+        return cicli, ritardi
+
+    configurazioni = [
+        ("fisso 1800 s", lambda adesso, invariati: 1800),
+        ("adattivo", lambda adesso, invariati: polling.prossima_attesa(eventi, adesso, invariati, rng=rng)[0]),
+    ]
+
+    print(f"\n{settimane} settimane, {len(eventi)} lezioni, {len(presenze)} registrazioni di presenze, "
+          f"{len(altre)} altre variazioni (seme {seed})")
+    print(f"{'polling':<14}{'cicli':>7}{'cicli/sett.':>13}{'presenze medio':>16}{'p95':>7}{'altre medio':>13}{'p95':>7}  (minuti)")
+    for nome, prossimo in configurazioni:
+        cicli, ritardi = simula(prossimo)
+        colonne = ""
+        for tipo in ("presenze", "altre"):
+            valori = sorted(ritardi[tipo]) or [0.0]
+            colonne += f"{statistics.mean(valori):>{16 if tipo == 'presenze' else 13}.1f}{valori[int(len(valori) * 0.95)]:>7.1f}"
+        print(f"{nome:<14}{cicli:>7}{cicli / settimane:>13.1f}{colonne}")
+
+
+def bench_pipeline(settimane: int, lezioni_giorno: int, latenza: float, latenza_evento: float, latenza_accesso: float,
+                   seed: int):
+    """
+    Confronta la latenza di un ciclo di `daemon.sincronizza_utente` con la pipeline sequenziale e con quella
+    concorrente (credenziali, GEOP e Google in parallelo, batch inviati in parallelo), sugli stessi cicli:
+    primo avvio, sincronizzazione completa periodica con alcune variazioni, variazioni parziali e GEOP invariato.
+    """
+    cicli = ("primo avvio", "completa", "parziale", "invariato")
+    tempi = {}
+
+    for modalita, concorrente in (("sequenziale", False), ("concorrente", True)):
+        rng = random.Random(seed)
+        date_info = intervallo_settimane(settimane)
+        eventi = genera_orario(date_info, lezioni_giorno, rng)
+        nuovi_id = itertools.count(100000 + len(eventi))
+
+        with stubs.GeopStub(eventi, latenza=latenza, latenza_evento=latenza_evento) as geop, \
+                stubs.CalendarStub(latenza=latenza) as calendar, tempfile.TemporaryDirectory() as cartella, \
+                stand_in(geop, calendar, latenza_accesso):
+            scheduler.configura(1000, 1000)
+            profilo = {"nome": "studente", "username": "studente", "password": "segreta", "cartella": cartella,
+                       "calendar_id": "primary", "credentials": "credentials.json"}
+            snapshot_path = os.path.join(cartella, parser.GEOP_SNAPSHOT)
+
+            for ciclo in cicli:
+                if ciclo == "completa":
+                    # sincronizzazione completa periodica: l'ultima risale a più di INTERVALLO_SYNC_COMPLETA fa
+                    snapshot = parser.read_json(snapshot_path)
+                    snapshot["ultima_completa"] = 0
+                    parser.salva_snapshot(snapshot, snapshot_path)
+                if ciclo in ("completa", "parziale"):
+                    applica_churn(eventi, 0.05, rng, nuovi_id, date_info)
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    esito = daemon.sincronizza_utente(profilo, date_info, concorrente=concorrente)
+                assert esito["ok"], esito["errore"]
+                tempi[modalita, ciclo] = esito["durata"]
+
+        scheduler.configura()
+
+    print(f"\n{settimane} settimane, {len(eventi)} lezioni, latenza simulata {latenza * 1000:.0f} ms per richiesta "
+          f"+ {latenza_evento * 1000:.1f} ms per evento GEOP, credenziali {latenza_accesso * 1000:.0f} ms")
+    print(f"{'ciclo':<14}{'sequenziale (s)':>17}{'concorrente (s)':>17}{'guadagno':>10}")
+    for ciclo in cicli:
+        sequenziale, concorrente = tempi["sequenziale", ciclo], tempi["concorrente", ciclo]
+        print(f"{ciclo:<14}{sequenziale:>17.3f}{concorrente:>17.3f}{1 - concorrente / sequenziale:>10.0%}")
+
+
+# processo figlio di bench_avvio: indirizza business verso lo stand-in di GEOP ed esegue main.py --once,
+# senza importare altro (benchmark.py e stubs.py caricherebbero le librerie Google)
+_FIGLIO_AVVIO = """
+import json, runpy, sys
+import business
+business.LOGIN_URL, business.XHR_URL = sys.argv[1], sys.argv[2]
+main_path = sys.argv[3]
+sys.argv = [main_path, "--once", "--log", "errore"]
+try:
+    runpy.run_path(main_path, run_name="__main__")
+except SystemExit as uscita:
+    codice = uscita.code
+print(json.dumps({"codice": codice, "google": "googleapiclient" in sys.modules}))
+"""
+
+
+def bench_avvio(ripetizioni: int, latenza: float):
+    """
+    Misura il tempo di un'esecuzione di `main.py --once` in un processo nuovo, come da cron o da un timer
+    di systemd, con GEOP invariato dall'ultima sincronizzazione (sessione GEOP già salvata), e lo confronta
+    con l'interprete vuoto e con i soli import del main.py precedente, che caricava subito le librerie Google.
+    """
+    date_info = business.weeks_range(6)
+    eventi = genera_eventi_geop_grezzi(date_info)
+    radice = os.path.dirname(os.path.abspath(__file__))
+    ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (radice, os.environ.get("PYTHONPATH")))))
+
+    with stubs.GeopStub(eventi, latenza=latenza) as geop, stubs.CalendarStub(latenza=latenza) as calendar, \
+            tempfile.TemporaryDirectory() as cartella:
+        # main.py legge le credenziali GEOP da user_login.py, che non fa parte del repository
+        with open(os.path.join(cartella, "user_login.py"), "w", encoding="utf-8") as file:
+            file.write("def username():\n    return 'studente'\n\ndef password():\n    return 'segreta'\n")
+
+        # prima sincronizzazione, come quella che un'esecuzione precedente avrebbe lasciato in cartella
+        profilo = {"nome": "studente", "username": "studente", "password": "segreta", "cartella": cartella,
+                   "calendar_id": "primary", "credentials": "credentials.json"}
+        with stand_in(geop, calendar), contextlib.redirect_stdout(io.StringIO()):
+            assert daemon.sincronizza_utente(profilo, date_info)["ok"]
+
+        comandi = (
+            ("interprete vuoto", [sys.executable, "-c", "pass"]),
+            ("import precedenti", [sys.executable, "-c", "import business, calendarapi, daemon, polling"]),
+            ("main.py --once", [sys.executable, "-c", _FIGLIO_AVVIO, geop.login_url, geop.xhr_url,
+                                os.path.join(radice, "main.py")]),
+        )
+
+        print(f"\n{len(eventi)} lezioni, GEOP invariato, latenza simulata {latenza * 1000:.0f} ms, {ripetizioni} ripetizioni")
+        print(f"{'esecuzione':<20}{'mediana (s)':>13}{'min-max':>16}  note")
+        for nome, comando in comandi:
+            durate = []
+            for _ in range(ripetizioni):
+                t0 = time.perf_counter()
+                uscita = subprocess.run(comando, cwd=cartella, env=ambiente, capture_output=True, text=True)
+                durate.append(time.perf_counter() - t0)
+                if uscita.returncode:
+                    raise RuntimeError(f"{nome}: {uscita.stderr.strip()}")
+
+            nota = ""
+            if nome == "main.py --once":
+                esito = json.loads(uscita.stdout.strip().splitlines()[-1])
+                assert esito["codice"] == 0, esito
+                nota = f"librerie Google {'caricate' if esito['google'] else 'non caricate'}"
+            print(f"{nome:<20}{statistics.median(durate):>13.3f}{f'{min(durate):.3f}-{max(durate):.3f}':>16}  {nota}")
+
+
+def bench_dedicato(settimane: int, personali_per_giorno: int, latenza: float):
+    """
+    Confronta il volume letto da Google Calendar sincronizzando in "primary", pieno di eventi personali,
+    e nel calendario dedicato. Entrambe le configurazioni partono da una sincronizzazione in "primary";
+    la seconda passa poi al calendario dedicato (creazione e migrazione una tantum).
+    Cicli misurati, tutti con sincronizzazione completa: il primo dopo il passaggio, uno con il syncToken
+    scaduto (la copia locale si ricostruisce da zero) e una lettura completa dell'intervallo senza syncToken.
+    """
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_eventi_geop_grezzi(date_info)
+    personali = [ev for ev in genera_eventi_google(date_info, personali_per_giorno) if not ev["summary"].startswith("UFS")]
+    cicli = ("primo ciclo", "token scaduto", "lettura")
+    misure = {}
+
+    for modalita, dedicato in (("primary", False), ("dedicato", True)):
+        with stubs.GeopStub(eventi, latenza=latenza) as geop, stubs.CalendarStub(latenza=latenza) as calendar, \
+                tempfile.TemporaryDirectory() as cartella, stand_in(geop, calendar):
+            calendar.carica([dict(ev) for ev in personali])
+            profilo = {"nome": "studente", "username": "studente", "password": "segreta", "cartella": cartella,
+                       "calendar_id": "primary", "credentials": "credentials.json"}
+            snapshot_path = os.path.join(cartella, parser.GEOP_SNAPSHOT)
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert daemon.sincronizza_utente(profilo, date_info)["ok"]
+            profilo["calendario_dedicato"] = dedicato
+
+            for ciclo in cicli:
+                # sincronizzazione completa: l'ultima risale a più di INTERVALLO_SYNC_COMPLETA fa
+                snapshot = parser.read_json(snapshot_path)
+                snapshot["ultima_completa"] = 0
+                parser.salva_snapshot(snapshot, snapshot_path)
+                if ciclo == "token scaduto":
+                    calendar.scadi_sync_token()
+
+                calendar.azzera_contatori()
+                calendar.trasferiti = 0
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if ciclo == "lettura":
+                        calendar_id = statestore.calendario_dedicato(os.path.join(cartella, statestore.CALENDARIO_CONFIG))
+                        letti = calendarapi.read_calendar(None, date_info, calendar_id or "primary", dedicato)
+                        assert len(letti) == len(eventi)
+                    else:
+                        esito = daemon.sincronizza_utente(profilo, date_info)
+                        assert esito["ok"], esito["errore"]
+                misure[modalita, ciclo] = (calendar.trasferiti, (calendar.byte_inviati + calendar.byte_ricevuti) / 1024)
+
+            if dedicato:
+                # dopo la migrazione "primary" contiene solo gli eventi personali
+                assert len(calendar.eventi["primary"]) == len(personali)
+                assert len(calendar.eventi[calendar_id]) == len(eventi)
+
+    print(f"\n{settimane} settimane, {len(eventi)} lezioni, {len(personali)} eventi personali in primary, "
+          f"latenza simulata {latenza * 1000:.0f} ms (eventi trasferiti / kB)")
+    print(f"{'ciclo':<14}{'primary':>18}{'dedicato':>18}")
+    for ciclo in cicli:
+        colonne = [f"{misure[modalita, ciclo][0]} / {misure[modalita, ciclo][1]:.1f}" for modalita in ("primary", "dedicato")]
+        print(f"{ciclo:<14}" + "".join(f"{colonna:>18}" for colonna in colonne))
+
+
+def bench_ics(settimane: int, lezioni_giorno: int, churn: float, cicli: int, latenza: float, seed: int):
+    """
+    Confronta il costo di un ciclo con l'uscita su Google Calendar e con il feed iCalendar: un ciclo iniziale,
+    `cicli` cicli con il `churn` indicato e un ciclo senza variazioni, con lo stesso orario e le stesse variazioni.
+    Per il feed riporta i byte scritti su disco e verifica che un client con l'ETag dell'ultimo download
+    riceva 304 solo quando il feed non è cambiato.
+    """
+    date_info = intervallo_settimane(settimane)
+    fasi = ["iniziale"] + [f"churn {n + 1}" for n in range(cicli)] + ["invariato"]
+    misure = {}
+
+    for uscita in daemon.USCITE:
+        rng = random.Random(seed)
+        eventi = genera_orario(date_info, lezioni_giorno, rng)
+        nuovi_id = itertools.count(100000 + len(eventi))
+
+        with stubs.GeopStub(eventi, latenza=latenza) as geop, stubs.CalendarStub(latenza=latenza) as calendar, \
+                tempfile.TemporaryDirectory() as cartella, stand_in(geop, calendar):
+            profilo = {"nome": "studente", "username": "studente", "password": "segreta", "cartella": cartella,
+                       "calendar_id": "primary", "credentials": "credentials.json", "uscita": uscita}
+            feed_path = os.path.join(cartella, icsfeed.ICS_FEED)
+            server = icsfeed.avvia_server(0, {"/geop.ics": feed_path})
+            url = f"http://127.0.0.1:{server.server_address[1]}/geop.ics"
+            etag = None
+
+            try:
+                for fase in fasi:
+                    if fase.startswith("churn"):
+                        applica_churn(eventi, churn, rng, nuovi_id, date_info)
+                    calendar.azzera_contatori()
+                    versione = os.stat(feed_path).st_mtime_ns if os.path.exists(feed_path) else None
+
+                    t0 = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        esito = daemon.sincronizza_utente(profilo, date_info)
+                    durata = time.perf_counter() - t0
+                    assert esito["ok"], esito["errore"]
+
+                    if uscita == "google":
+                        misure[uscita, fase] = (durata, sum(calendar.richieste.values()),
+                                                calendar.byte_inviati + calendar.byte_ricevuti, "")
+                        continue
+
+                    scritti = os.path.getsize(feed_path) if os.stat(feed_path).st_mtime_ns != versione else 0
+                    richiesta = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+                    try:
+                        with urllib.request.urlopen(richiesta) as risposta:
+                            stato, etag = risposta.status, risposta.headers["ETag"]
+                    except urllib.error.HTTPError as errore:
+                        stato = errore.code
+                    assert (stato == 304) == (not scritti)
+                    misure[uscita, fase] = (durata, sum(calendar.richieste.values()), scritti, f"HTTP {stato}")
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    print(f"\n{settimane} settimane, {lezioni_giorno} lezioni al giorno, churn {churn:.0%}, "
+          f"latenza simulata {latenza * 1000:.0f} ms (byte: scambiati con Google / scritti nel feed)")
+    print(f"{'ciclo':<11}{'uscita':>8}{'tempo (s)':>11}{'richieste':>11}{'byte':>10}  client")
+    for fase in fasi:
+        for uscita in daemon.USCITE:
+            durata, richieste, byte, client = misure[uscita, fase]
+            print(f"{fase:<11}{uscita:>8}{durata:>11.3f}{richieste:>11}{byte:>10}  {client}")
+
+
+def ciclo_dizionari(calendar_path: str) -> int:
+    """
+    Lavoro per evento di un ciclo prima di eventi.py: calendar.json letto due volte (snapshot e sincronizzazione),
+    chiave, corpo Google e impronte ricalcolati a ogni passaggio, come facevano daemon e `sync_calendar`.
+    """
+    impronte = {str(ev.get("id")): parser.impronta_evento(ev) for ev in parser.read_json(calendar_path) if parser.chiave_evento(ev)}
+    calendar_dict = {str(ev.get("id")): ev for ev in parser.read_json(calendar_path) if parser.chiave_evento(ev)}
+    per_chiave = {parser.chiave_evento(ev): geop_id for geop_id, ev in calendar_dict.items()}
+    for ev in calendar_dict.values():
+        body = parser.format_event(ev)
+        # confronto con l'indice e, dopo la scrittura, registrazione
+        parser.impronta_body(body)
+        parser.impronta_body(body)
+    return len(impronte) + len(per_chiave)
+
+
+def ciclo_record(calendar_path: str) -> int:
+    """
+    Lo stesso lavoro con i record di eventi.py, letti una volta sola e con i valori derivati in cache.
+    """
+    eventi_geop = modello.leggi(calendar_path)
+    impronte = {ev.id: ev.impronta_geop for ev in eventi_geop}
+    per_chiave = {ev.chiave: ev.id for ev in eventi_geop}
+    for ev in eventi_geop:
+        ev.impronta
+        ev.impronta
+    return len(impronte) + len(per_chiave)
+
+
+def bench_modello(settimane: int, lezioni_giorno: int, utenti: int, ripetizioni: int, seed: int):
+    """
+    Confronta, per un orario sintetico, gli eventi elaborati come dizionari da calendar.json (indentato)
+    e come record `eventi.EventoGeop` da calendar.json e da calendar.bin: dimensione del file, tempo di lettura,
+    tempo del lavoro per evento di un ciclo completo e memoria occupata da `utenti` orari in memoria.
+    """
+    rng = random.Random(seed)
+    date_info = intervallo_settimane(settimane)
+    grezzi = genera_orario(date_info, lezioni_giorno, rng)
+
+    with tempfile.TemporaryDirectory() as cartella:
+        json_path = os.path.join(cartella, "calendar.json")
+        bin_path = os.path.join(cartella, modello.CALENDARIO_BINARIO)
+        parser.write_eventi(grezzi, json_path)
+        modello.scrivi(grezzi, bin_path)
+
+        configurazioni = (
+            ("dizionari, json", json_path, parser.read_json, ciclo_dizionari),
+            ("record, json", json_path, modello.leggi, ciclo_record),
+            ("record, bin", bin_path, modello.leggi, ciclo_record),
+        )
+
+        print(f"\n{settimane} settimane, {len(grezzi)} lezioni per utente, {utenti} utenti in memoria, "
+              f"mediana di {ripetizioni} ripetizioni")
+        print(f"{'modello':<18}{'file (kB)':>11}{'lettura (ms)':>14}{'ciclo (ms)':>12}{'memoria (kB)':>14}")
+
+        for nome, path, leggi, ciclo in configurazioni:
+            letture, cicli = [], []
+            for _ in range(ripetizioni):
+                t0 = time.perf_counter()
+                leggi(path)
+                letture.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                ciclo(path)
+                cicli.append(time.perf_counter() - t0)
+
+            tracemalloc.start()
+            orari = [leggi(path) for _ in range(utenti)]
+            memoria = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del orari
+
+            print(f"{nome:<18}{os.path.getsize(path) / 1024:>11.1f}{statistics.median(letture) * 1000:>14.2f}"
+                  f"{statistics.median(cicli) * 1000:>12.2f}{memoria / 1024:>14.0f}")
+
+
+def accesso_precedente(token_path: str) -> Credentials:
+    """
+    `calendarapi.accesso` prima del gestore in memoria: rilegge token.json a ogni ciclo, rinnova il token
+    in modo sincrono se è scaduto e riscrive il file.
+    """
+    creds = Credentials.from_authorized_user_file(token_path, calendarapi.SCOPES)
+    if not creds.valid:
+        creds.refresh(Request())
+        with open(token_path, "w") as token:
+            token.write(creds.to_json())
+    return creds
+
+
+def bench_credenziali(cicli: int, latenza: float, validita: float):
+    """
+    Misura quanto ogni ciclo attende le credenziali Google quando il token scade tra un ciclo e l'altro:
+    rilettura di token.json e rinnovo sincrono (comportamento precedente) contro `calendarapi.CredenzialiGoogle`,
+    che rinnova in background.
+
+    Per non attendere un'ora, lo stand-in OAuth emette token che restano validi per google-auth solo `validita`
+    secondi (oltre la sua soglia di scadenza anticipata) e i cicli distano `validita` + 0.5 secondi;
+    il rinnovo in background parte a metà della validità. Per questo il gestore in memoria rinnova più spesso
+    che in produzione, dove il token dura un'ora e i rinnovi per ciclo sono al più uno in entrambi i casi.
+    """
+    soglia = google_auth_helpers.REFRESH_THRESHOLD.total_seconds()
+    pausa = validita + 0.5
+    originali = calendarapi.RINNOVO_ANTICIPO, calendarapi.RINNOVO_RIPROVA, google_credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT
+    calendarapi.RINNOVO_ANTICIPO, calendarapi.RINNOVO_RIPROVA = soglia + validita / 2, validita / 4
+
+    print(f"\n{cicli} cicli a {pausa:.1f} s di distanza, token valido {validita:.1f} s, "
+          f"latenza simulata del rinnovo {latenza * 1000:.0f} ms")
+    print(f"{'modalità':<16}{'primo ciclo (s)':>17}{'successivi (s)':>16}{'rinnovi':>9}{'client costruiti':>18}")
+
+    try:
+        for modalita in ("rinnovo sincrono", "in memoria"):
+            with stubs.OAuthStub(durata=int(soglia + validita), latenza=latenza) as oauth, \
+                    tempfile.TemporaryDirectory() as cartella:
+                # from_authorized_user_file ignora il token_uri salvato e usa sempre quello di Google
+                google_credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT = oauth.token_uri
+                token_path = os.path.join(cartella, "token.json")
+                with open(token_path, "w", encoding="utf-8") as token:
+                    json.dump({"token": "scaduto", "refresh_token": "rt", "token_uri": oauth.token_uri,
+                               "client_id": "client", "client_secret": "segreto", "scopes": calendarapi.SCOPES,
+                               "expiry": "2000-01-01T00:00:00Z"}, token)
+
+                calendarapi.invalida_service()
+                attese, client = [], set()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for ciclo in range(cicli):
+                        if ciclo:
+                            time.sleep(pausa)
+                        t0 = time.perf_counter()
+                        if modalita == "rinnovo sincrono":
+                            creds = accesso_precedente(token_path)
+                        else:
+                            creds = calendarapi.accesso(token_path, interattivo=False)
+                        attese.append(time.perf_counter() - t0)
+                        client.add(id(calendarapi.get_service(creds)))
+                calendarapi.gestore_credenziali(token_path).chiudi()
+                calendarapi.invalida_service()
+
+                # il primo ciclo trova comunque il token scaduto: il rinnovo in background conta dai successivi
+                print(f"{modalita:<16}{attese[0]:>17.3f}{statistics.mean(attese[1:]):>16.3f}"
+                      f"{oauth.richieste['token']:>9}{len(client):>18}")
+    finally:
+        calendarapi.RINNOVO_ANTICIPO, calendarapi.RINNOVO_RIPROVA, google_credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT = originali
+
+
+def bench_push(settimane: int, cancellate: int, ritardo: float, ttl: float, latenza: float):
+    """
+    Misura quanto a lungo Google Calendar resta diverso da GEOP dopo che `cancellate` lezioni vengono eliminate
+    a mano da Google, con GEOP invariato: il ciclo di polling successivo non legge Google e non se ne accorge,
+    la sincronizzazione completa le ripara ma avviene al più una volta ogni `parser.INTERVALLO_SYNC_COMPLETA`,
+    con le notifiche push (`notifiche.RicevitoreNotifiche`) la riconciliazione parte `ritardo` secondi dopo
+    la prima notifica.
+
+    Verifica poi il rinnovo automatico con canali che durano `ttl` secondi, rinnovati a metà della durata:
+    dopo alcuni rinnovi resta aperto un solo canale e le modifiche vengono ancora riparate.
+    """
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_eventi_geop_grezzi(date_info)
+    rng = random.Random(1)
+    originali = notifiche.RINNOVO_CANALE_ANTICIPO, notifiche.RINNOVO_CANALE_RIPROVA
+    righe = []
+
+    with stubs.GeopStub(eventi, latenza=latenza) as geop, stubs.CalendarStub(latenza=latenza) as calendar, \
+            tempfile.TemporaryDirectory() as cartella, stand_in(geop, calendar):
+        profilo = {"nome": "studente", "username": "studente", "password": "segreta", "cartella": cartella,
+                   "calendar_id": "primary", "credentials": "credentials.json"}
+        snapshot_path = os.path.join(cartella, parser.GEOP_SNAPSHOT)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert daemon.sincronizza_utente(profilo, date_info)["ok"]
+        totale = len(calendar.eventi["primary"])
+
+        def cancella() -> float:
+            # lezioni eliminate dall'interfaccia di Google Calendar
+            for event_id in rng.sample(sorted(calendar.eventi["primary"]), cancellate):
+                calendar.modifica("primary", event_id)
+            calendar.azzera_contatori()
+            return time.perf_counter()
+
+        def riparate() -> int:
+            return cancellate - (totale - len(calendar.eventi["primary"]))
+
+        def richieste_google() -> int:
+            return sum(numero for nome, numero in calendar.richieste.items() if not nome.startswith("notifiche"))
+
+        def attendi_riparazione(t0: float, limite: float = 30.0) -> float:
+            while riparate() < cancellate and time.perf_counter() - t0 < limite:
+                time.sleep(0.005)
+            attesa = time.perf_counter() - t0
+            # le scritture della riconciliazione generano a loro volta notifiche: si attende che si esauriscano
+            time.sleep(ritardo * 2 + 0.5)
+            return attesa
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = cancella()
+            assert daemon.sincronizza_utente(profilo, date_info)["saltato"]
+            righe.append(("ciclo di polling", riparate(), time.perf_counter() - t0, richieste_google(), "-"))
+
+            snapshot = parser.read_json(snapshot_path)
+            snapshot["ultima_completa"] = 0
+            parser.salva_snapshot(snapshot, snapshot_path)
+            assert daemon.sincronizza_utente(profilo, date_info)["ok"]
+            righe.append(("sync completa", riparate(), time.perf_counter() - t0, richieste_google(), "-"))
+
+            ricevitore = notifiche.RicevitoreNotifiche("", ritardo=ritardo)
+            server = notifiche.avvia_server(0, ricevitore)
+            ricevitore.indirizzo = f"http://127.0.0.1:{server.server_address[1]}/notifiche"
+            try:
+                assert daemon.attiva_notifiche(ricevitore, profilo)
+                t0 = cancella()
+                attesa = attendi_riparazione(t0)
+                righe.append(("notifiche push", riparate(), attesa, richieste_google(), ricevitore.riconciliazioni))
+                ricevitore.chiudi()
+
+                # rinnovo: canali brevi, rinnovati a metà della durata
+                notifiche.RINNOVO_CANALE_ANTICIPO, notifiche.RINNOVO_CANALE_RIPROVA = ttl / 2, ttl / 4
+                ricevitore.durata = ttl
+                calendar.azzera_contatori()
+                assert daemon.attiva_notifiche(ricevitore, profilo)
+                time.sleep(ttl * 2)
+                aperti, rinnovi = len(calendar.canali), calendar.richieste["events.watch"] - 1
+                t0 = cancella()
+                attendi_riparazione(t0)
+                rinnovo_ok = riparate() == cancellate
+                ricevitore.chiudi()
+            finally:
+                notifiche.RINNOVO_CANALE_ANTICIPO, notifiche.RINNOVO_CANALE_RIPROVA = originali
+                server.shutdown()
+                server.server_close()
+
+    print(f"\n{settimane} settimane, {totale} lezioni, {cancellate} cancellate a mano su Google, GEOP invariato, "
+          f"latenza simulata {latenza * 1000:.0f} ms")
+    print(f"{'modalità':<18}{'riparate':>10}{'dopo (s)':>10}{'richieste Google':>18}{'riconciliazioni':>17}")
+    for modalita, numero, attesa, richieste, riconciliazioni in righe:
+        print(f"{modalita:<18}{f'{numero}/{cancellate}':>10}{attesa:>10.2f}{richieste:>18}{riconciliazioni!s:>17}")
+    print(f"(senza notifiche la sync completa avviene al più una volta ogni {parser.INTERVALLO_SYNC_COMPLETA // 3600} ore)")
+    print(f"rinnovo con canali da {ttl:.1f} s: {rinnovi} rinnovi, {aperti} canale aperto, "
+          f"modifiche successive {'riparate' if rinnovo_ok else 'NON riparate'}")
+
+
+def bench_traccia(settimane: int, cicli: int, latenza: float):
+    """
+    Misura il costo delle tracce di `traccia.py` su cicli con sincronizzazione completa (GEOP e Google letti):
+    tracce spente, span salvati a ogni ciclo (soglia 0) e span con cProfile su tutti i cicli.
+    Riporta poi, dall'ultima traccia salvata, le fasi più lunghe e i totali delle richieste HTTP per host.
+    """
+    date_info = intervallo_settimane(settimane)
+    eventi = genera_eventi_geop_grezzi(date_info)
+    modalita = (("spente", None, 0.0), ("span", 0.0, 0.0), ("span + cProfile", 0.0, 1.0))
+    righe = []
+
+    with stubs.GeopStub(eventi, latenza=latenza) as geop, stubs.CalendarStub(latenza=latenza) as calendar, \
+            tempfile.TemporaryDirectory() as cartella, stand_in(geop, calendar):
+        profilo = {"nome": "studente", "username": "studente", "password": "segreta",
+                   "cartella": os.path.join(cartella, "studente"), "calendar_id": "primary",
+                   "credentials": "credentials.json"}
+        snapshot_path = os.path.join(profilo["cartella"], parser.GEOP_SNAPSHOT)
+        tracce = os.path.join(cartella, "tracce")
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert daemon.sincronizza_utente(profilo, date_info)["ok"]
+
+        try:
+            for nome, soglia, frequenza in modalita:
+                traccia.configura(soglia, frequenza, tracce, massimo=cicli)
+                durate, salvate = [], None
+                for _ in range(cicli):
+                    snapshot = parser.read_json(snapshot_path)
+                    snapshot["ultima_completa"] = 0
+                    parser.salva_snapshot(snapshot, snapshot_path)
+                    t0 = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()), traccia.ciclo("bench") as tracciato:
+                        assert daemon.sincronizza_utente(profilo, date_info)["ok"]
+                    durate.append(time.perf_counter() - t0)
+                    salvate = tracciato.file if tracciato else None
+                file_salvati = len(os.listdir(tracce)) if os.path.isdir(tracce) else 0
+                righe.append((nome, statistics.median(durate), file_salvati))
+        finally:
+            traccia.configura()
+
+        with open(salvate, encoding="utf-8") as file:
+            salvata = json.load(file)
+
+    print(f"\n{settimane} settimane, {len(eventi)} eventi, {cicli} cicli con sincronizzazione completa, "
+          f"latenza simulata {latenza * 1000:.0f} ms")
+    print(f"{'tracce':<18}{'ciclo (s)':>11}{'costo':>9}{'file salvati':>14}")
+    for nome, durata, file_salvati in righe:
+        print(f"{nome:<18}{durata:>11.3f}{(durata / righe[0][1] - 1) * 100:>8.1f}%{file_salvati:>14}")
+
+    print("\nfasi dell'ultima traccia (s):")
+    for span in sorted(salvata["span"]["figli"], key=lambda span: -span["durata"])[:6]:
+        richieste = sum(1 for figlio in span["figli"] if figlio["nome"] == "http")
+        thread = span["attributi"].get("thread", "")
+        print(f"  {span['nome']:<22}{span['durata']:>8.3f}{richieste:>6} richieste  {thread}")
+    print("richieste HTTP per host:")
+    for host, voce in salvata["http"].items():
+        print(f"  {host:<22}{voce['richieste']:>5} richieste{voce['secondi']:>8.3f} s{voce['byte_ricevuti'] / 1024:>9.1f} kB")
+
+
+def bench_coordinatore(utenti: int, nodi_list: list, workers: int, latenza: float, morti: int, lease: float,
+                       rps: float = scheduler.RICHIESTE_AL_SECONDO):
+    """
+    Esegue i nodi del coordinatore (`coordinatore.esegui_nodo`, uno per thread, ciascuno con il proprio nome
+    e le proprie connessioni alla coda condivisa) finché ogni utente è stato sincronizzato una volta,
+    al variare del numero di nodi. Verifica che nessun utente sia sincronizzato da due nodi insieme e che
+    nessun calendario contenga duplicati.
+
+    I nodi veri sono processi separati, ognuno con i propri token bucket di `scheduler.py`: qui condividono
+    il processo, quindi la quota globale viene portata a `rps` per il numero di nodi.
+
+    Prima dell'avvio un nodo "morto" prende in lease `morti` lavori e non li completa mai: gli altri nodi
+    li riprendono alla scadenza del lease (`lease` secondi).
+    """
+    import coordinatore
+
+    date_info = intervallo_settimane(6)
+    eventi = genera_eventi_geop_grezzi(date_info)
+    originale = daemon.sincronizza_utente
+
+    print(f"\n{utenti} utenti, {len(eventi)} eventi ciascuno, {workers} workers per nodo, latenza simulata "
+          f"{latenza * 1000:.0f} ms, {rps:.0f} scritture/s per nodo, {morti} lavori bloccati da un nodo morto "
+          f"(lease {lease:.1f} s)")
+    print(f"{'nodi':>5}{'tempo (s)':>11}{'utenti/min':>12}{'ripresi dopo (s)':>18}{'utenti per nodo':>22}"
+          f"{'sovrapposizioni':>17}{'duplicati':>11}")
+
+    for nodi in nodi_list:
+        with stubs.GeopStub(eventi, latenza=latenza) as geop, stubs.CalendarStub(latenza=latenza) as calendar, \
+                tempfile.TemporaryDirectory() as cartella, stand_in(geop, calendar):
+            profili = [
+                {"nome": f"studente{n}", "username": f"studente{n}", "password": "segreta",
+                 "cartella": os.path.join(cartella, f"studente{n}"), "calendar_id": f"cal{n}",
+                 "credentials": "credentials.json"}
+                for n in range(utenti)
+            ]
+            profili_path = os.path.join(cartella, "users.json")
+            coda_path = os.path.join(cartella, coordinatore.CODA_LAVORI)
+            with open(profili_path, "w", encoding="utf-8") as file:
+                json.dump(profili, file)
+
+            with coordinatore.CodaLavori(coda_path) as coda:
+                coda.allinea([profilo["nome"] for profilo in profili])
+                bloccati = {lavoro["utente"] for lavoro in coda.prendi("morto", morti, durata=lease)}
+
+            # sincronizzazioni in corso per utente, per riconoscere due nodi sullo stesso utente
+            in_corso, sovrapposizioni, lock = {}, [0], threading.Lock()
+            fine_bloccati = {}
+
+            def sincronizza(profilo, date, **kwargs):
+                with lock:
+                    in_corso[profilo["nome"]] = in_corso.get(profilo["nome"], 0) + 1
+                    if in_corso[profilo["nome"]] > 1:
+                        sovrapposizioni[0] += 1
+                try:
+                    return originale(profilo, date, **kwargs)
+                finally:
+                    with lock:
+                        in_corso[profilo["nome"]] -= 1
+                        if profilo["nome"] in bloccati:
+                            fine_bloccati[profilo["nome"]] = time.perf_counter()
+
+            daemon.sincronizza_utente = sincronizza
+            scheduler.configura(al_secondo=rps * nodi)
+            arresto = threading.Event()
+            t0 = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    threads = [
+                        threading.Thread(target=coordinatore.esegui_nodo, args=(profili_path, coda_path),
+                                         kwargs={"nodo": f"nodo{k}", "workers": workers, "durata": lease,
+                                                 "arresto": arresto}, name=f"nodo{k}")
+                        for k in range(nodi)
+                    ]
+                    for thread in threads:
+                        thread.start()
+                    while time.perf_counter() - t0 < 120:
+                        with coordinatore.CodaLavori(coda_path) as coda:
+                            stato = coda.stato()
+                        if all(riga["ultima_fine"] is not None for riga in stato):
+                            break
+                        time.sleep(0.05)
+                    durata = time.perf_counter() - t0
+                    arresto.set()
+                    for thread in threads:
+                        thread.join()
+            finally:
+                daemon.sincronizza_utente = originale
+                scheduler.configura()
+
+            per_nodo = {}
+            for riga in stato:
+                per_nodo[riga["ultimo_nodo"]] = per_nodo.get(riga["ultimo_nodo"], 0) + 1
+            assert all(riga["ultimo_esito"] == "ok" for riga in stato), stato
+            duplicati = sum(len(calendar.eventi[profilo["calendar_id"]]) - len(eventi) for profilo in profili)
+            ripresi = max(fine_bloccati.values()) - t0 if fine_bloccati else 0.0
+            distribuzione = "/".join(str(per_nodo.get(f"nodo{k}", 0)) for k in range(nodi))
+            print(f"{nodi:>5}{durata:>11.2f}{utenti / durata * 60:>12.1f}{ripresi:>18.2f}{distribuzione:>22}"
+                  f"{sovrapposizioni[0]:>17}{duplicati:>11}")
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Benchmark offline contro stand-in locali")
+    sub = cli.add_subparsers(dest="bench", required=True)
+
+    read = sub.add_parser("read", help="lettura di Google Calendar: per giorno contro intervallo unico")
+    read.add_argument("--settimane", type=int, default=6)
+    read.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+
+    write = sub.add_parser("write", help="scritture su Google Calendar: seriali contro batch")
+    write.add_argument("--settimane", type=int, default=6)
+    write.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+
+    incrementale = sub.add_parser("incrementale", help="lettura di Google Calendar: completa contro syncToken")
+    incrementale.add_argument("--settimane", type=int, default=6)
+    incrementale.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+    incrementale.add_argument("--cicli", type=int, default=4)
+
+    quota = sub.add_parser("quota", help="scritture oltre la quota di Google: nessuna gestione, backoff, token bucket")
+    quota.add_argument("--settimane", type=int, default=20)
+    quota.add_argument("--quota", type=int, default=20, help="scritture al secondo accettate dallo stub")
+    quota.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+
+    parsing = sub.add_parser("parser", help="elaborazione della risposta GEOP: eventi/s e picco di memoria")
+    parsing.add_argument("--settimane", type=int, default=52)
+    parsing.add_argument("--ripetizioni", type=int, default=20, help="ripetizioni di ogni misura di tempo")
+
+    byte = sub.add_parser("byte", help="byte per sincronizzazione: risorse complete contro risposte parziali e gzip")
+    byte.add_argument("--settimane", type=int, default=6)
+    byte.add_argument("--latenza", type=float, default=0.0, help="latenza simulata per richiesta, in secondi")
+    byte.add_argument("--modifiche", type=int, default=5, help="lezioni modificate su GEOP nel secondo ciclo")
+
+    sessione = sub.add_parser("sessione", help="sessione GEOP: login a ogni ciclo contro sessione riutilizzata")
+    sessione.add_argument("--cicli", type=int, default=10)
+    sessione.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+
+    geop = sub.add_parser("geop", help="lettura da GEOP: intervallo unico contro finestre in parallelo")
+    geop.add_argument("--settimane", type=int, default=52)
+    geop.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+    geop.add_argument("--latenza-evento", type=float, default=0.002, help="costo simulato per evento restituito, in secondi")
+    geop.add_argument("--paralleli", type=lambda v: [int(n) for n in v.split(",")], default=[1, 4, 8],
+                      help="elenco di configurazioni separate da virgola, es. 1,4,8")
+
+    demone = sub.add_parser("daemon", help="demone multi-utente: throughput al variare dei worker")
+    demone.add_argument("--utenti", type=int, default=20)
+    demone.add_argument("--workers", type=lambda v: [int(n) for n in v.split(",")], default=[1, 4, 8],
+                        help="elenco di configurazioni separate da virgola, es. 1,4,8")
+    demone.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+
+    e2e = sub.add_parser("e2e", help="pipeline completa di main.py contro gli stand-in: tempo, richieste, byte e RSS")
+    e2e.add_argument("--settimane", type=int, default=6)
+    e2e.add_argument("--lezioni-giorno", type=int, default=4, help=f"lezioni per giorno feriale (1-{FASCE_ORARIE})")
+    e2e.add_argument("--churn", type=float, default=0.05, help="frazione delle lezioni variate a ogni ciclo")
+    e2e.add_argument("--cicli", type=int, default=3, help="cicli con variazioni tra quello iniziale e quello invariato")
+    e2e.add_argument("--latenza", type=float, default=0.01, help="latenza simulata per richiesta, in secondi")
+    e2e.add_argument("--rps", type=float, default=1000.0,
+                     help="scritture al secondo verso Google; alta per misurare il codice e non il ritmo delle scritture")
+    e2e.add_argument("--seed", type=int, default=1, help="seme dell'orario e delle variazioni")
+    e2e.add_argument("--ripetizioni", type=int, default=3, help="esecuzioni, ognuna in un processo separato")
+    e2e.add_argument("--salva", default=None, help="file JSON in cui salvare i risultati, da usare come riferimento")
+    e2e.add_argument("--confronta", default=None, help="file JSON di riferimento: esce con codice 1 se trova regressioni")
+    e2e.add_argument("--soglia", type=float, default=SOGLIA_REGRESSIONE,
+                     help="crescita tollerata di tempo, byte e RSS rispetto al riferimento (0.2 = 20%%)")
+    e2e.add_argument("--processo", action="store_true", help=argparse.SUPPRESS)
+
+    polling_cli = sub.add_parser("polling", help="frequenza dei cicli: intervallo fisso contro adattivo (simulazione)")
+    polling_cli.add_argument("--settimane", type=int, default=6)
+    polling_cli.add_argument("--lezioni-giorno", type=int, default=2, help=f"lezioni per giorno feriale (1-{FASCE_ORARIE})")
+    polling_cli.add_argument("--variazioni-giorno", type=int, default=2, help="variazioni di orario per giorno feriale")
+    polling_cli.add_argument("--seed", type=int, default=1)
+
+    pipeline = sub.add_parser("pipeline", help="latenza di un ciclo: pipeline sequenziale contro concorrente")
+    pipeline.add_argument("--settimane", type=int, default=6)
+    pipeline.add_argument("--lezioni-giorno", type=int, default=4, help=f"lezioni per giorno feriale (1-{FASCE_ORARIE})")
+    pipeline.add_argument("--latenza", type=float, default=0.1, help="latenza simulata per richiesta, in secondi")
+    pipeline.add_argument("--latenza-evento", type=float, default=0.002, help="costo simulato per evento GEOP, in secondi")
+    pipeline.add_argument("--latenza-accesso", type=float, default=0.2, help="durata simulata del rinnovo delle credenziali")
+    pipeline.add_argument("--seed", type=int, default=1)
+
+    avvio = sub.add_parser("avvio", help="main.py --once in un processo nuovo con GEOP invariato: tempo di avvio")
+    avvio.add_argument("--ripetizioni", type=int, default=5)
+    avvio.add_argument("--latenza", type=float, default=0.0, help="latenza simulata per richiesta, in secondi")
+
+    dedicato = sub.add_parser("dedicato", help="volume letto da Google: primary con eventi personali contro calendario dedicato")
+    dedicato.add_argument("--settimane", type=int, default=6)
+    dedicato.add_argument("--personali-giorno", type=int, default=10, help="eventi personali per giorno in primary")
+    dedicato.add_argument("--latenza", type=float, default=0.0, help="latenza simulata per richiesta, in secondi")
+
+    credenziali = sub.add_parser("credenziali", help="attesa delle credenziali Google: rinnovo sincrono contro in memoria")
+    credenziali.add_argument("--cicli", type=int, default=5)
+    credenziali.add_argument("--latenza", type=float, default=0.2, help="durata simulata del rinnovo del token, in secondi")
+    credenziali.add_argument("--validita", type=float, default=2.0, help="validità simulata del token, in secondi")
+
+    ics = sub.add_parser("ics", help="costo di un ciclo: uscita su Google Calendar contro feed iCalendar")
+    ics.add_argument("--settimane", type=int, default=6)
+    ics.add_argument("--lezioni-giorno", type=int, default=6)
+    ics.add_argument("--churn", type=float, default=0.05, help="frazione delle lezioni variata a ogni ciclo")
+    ics.add_argument("--cicli", type=int, default=2, help="cicli con variazioni")
+    ics.add_argument("--latenza", type=float, default=0.02, help="latenza simulata per richiesta, in secondi")
+    ics.add_argument("--seed", type=int, default=1)
+
+    modello_cli = sub.add_parser("modello", help="eventi elaborati: dizionari da calendar.json contro record e calendar.bin")
+    modello_cli.add_argument("--settimane", type=int, default=52)
+    modello_cli.add_argument("--lezioni-giorno", type=int, default=6)
+    modello_cli.add_argument("--utenti", type=int, default=50, help="orari tenuti in memoria per misurarne l'occupazione")
+    modello_cli.add_argument("--ripetizioni", type=int, default=5)
+    modello_cli.add_argument("--seed", type=int, default=1)
+
+    push = sub.add_parser("push", help="modifiche manuali su Google: polling contro notifiche push (events.watch)")
+    push.add_argument("--settimane", type=int, default=6)
+    push.add_argument("--cancellate", type=int, default=5, help="lezioni cancellate a mano su Google")
+    push.add_argument("--ritardo", type=float, default=notifiche.RITARDO_NOTIFICHE,
+                      help="secondi di attesa dopo la prima notifica prima di riconciliare")
+    push.add_argument("--ttl", type=float, default=2.0, help="durata dei canali nella verifica del rinnovo, in secondi")
+    push.add_argument("--latenza", type=float, default=0.02, help="latenza simulata per richiesta, in secondi")
+
+    traccia_cli = sub.add_parser("traccia", help="costo delle tracce dei cicli: spente, span, span con cProfile")
+    traccia_cli.add_argument("--settimane", type=int, default=6)
+    traccia_cli.add_argument("--cicli", type=int, default=5)
+    traccia_cli.add_argument("--latenza", type=float, default=0.0, help="latenza simulata per richiesta, in secondi")
+
+    coordinatore_cli = sub.add_parser("coordinatore", help="più nodi sulla coda condivisa: throughput, lease e ripresa")
+    coordinatore_cli.add_argument("--utenti", type=int, default=12)
+    coordinatore_cli.add_argument("--nodi", type=int, nargs="+", default=[1, 2, 4])
+    coordinatore_cli.add_argument("--workers", type=int, default=2, help="sincronizzazioni contemporanee per nodo")
+    coordinatore_cli.add_argument("--latenza", type=float, default=0.05, help="latenza simulata per richiesta, in secondi")
+    coordinatore_cli.add_argument("--morti", type=int, default=2, help="lavori lasciati in lease da un nodo morto")
+    coordinatore_cli.add_argument("--lease", type=float, default=3.0, help="durata dei lease, in secondi")
+    coordinatore_cli.add_argument("--rps", type=float, default=scheduler.RICHIESTE_AL_SECONDO,
+                                  help="quota di scrittura di ciascun nodo")
+
+    args = cli.parse_args()
+    if args.bench == "read":
+        bench_read(args.settimane, args.latenza)
+    elif args.bench == "write":
+        bench_write(args.settimane, args.latenza)
+    elif args.bench == "incrementale":
+        bench_incrementale(args.settimane, args.latenza, args.cicli)
+    elif args.bench == "quota":
+        bench_quota(args.settimane, args.quota, args.latenza)
+    elif args.bench == "parser":
+        bench_parser(args.settimane, args.ripetizioni)
+    elif args.bench == "byte":
+        bench_byte(args.settimane, args.latenza, args.modifiche)
+    elif args.bench == "sessione":
+        bench_sessione(args.cicli, args.latenza)
+    elif args.bench == "geop":
+        bench_geop(args.settimane, args.latenza, args.latenza_evento, args.paralleli)
+    elif args.bench == "daemon":
+        bench_daemon(args.utenti, args.workers, args.latenza)
+    elif args.bench == "pipeline":
+        bench_pipeline(args.settimane, args.lezioni_giorno, args.latenza, args.latenza_evento, args.latenza_accesso, args.seed)
+    elif args.bench == "avvio":
+        bench_avvio(args.ripetizioni, args.latenza)
+    elif args.bench == "dedicato":
+        bench_dedicato(args.settimane, args.personali_giorno, args.latenza)
+    elif args.bench == "credenziali":
+        bench_credenziali(args.cicli, args.latenza, args.validita)
+    elif args.bench == "ics":
+        bench_ics(args.settimane, args.lezioni_giorno, args.churn, args.cicli, args.latenza, args.seed)
+    elif args.bench == "modello":
+        bench_modello(args.settimane, args.lezioni_giorno, args.utenti, args.ripetizioni, args.seed)
+    elif args.bench == "push":
+        bench_push(args.settimane, args.cancellate, args.ritardo, args.ttl, args.latenza)
+    elif args.bench == "traccia":
+        bench_traccia(args.settimane, args.cicli, args.latenza)
+    elif args.bench == "coordinatore":
+        bench_coordinatore(args.utenti, args.nodi, args.workers, args.latenza, args.morti, args.lease, args.rps)
+    elif args.bench == "polling":
+        bench_polling(args.settimane, args.lezioni_giorno, args.variazioni_giorno, args.seed)
+    elif args.bench == "e2e":
+        parametri = {
+            "settimane": args.settimane, "lezioni_giorno": args.lezioni_giorno, "churn": args.churn,
+            "cicli": args.cicli, "latenza": args.latenza, "rps": args.rps, "seed": args.seed,
+        }
+        if args.processo:
+            # esecuzione singola avviata da bench_e2e: il risultato è l'ultima riga dell'output
+            print(json.dumps(esegui_e2e(**parametri)))
+        elif not bench_e2e(parametri, args.ripetizioni, args.salva, args.confronta, args.soglia):
+            sys.exit(1)
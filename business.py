@@ -1,14 +1,263 @@
 # https://tls.peet.ws/api/all tls fingerprint test
+import eventi as modello
+import metrics
 import parser
 import requests
+import traccia
+import concurrent.futures
+import contextlib
 import datetime
+import itertools
+import json
+import os
+import threading
 # import logging
 
 
-def get_calendar(login_payload: dict, date: dict) -> requests.Response:
+LOGIN_URL = "https://itsar.registrodiclasse.it/geopcfp2/update/login.asp"
+XHR_URL = "https://itsar.registrodiclasse.it/geopcfp2/json/fullcalendar_events_alunno.asp"
+
+# cookie della sessione GEOP autenticata, per riutilizzarla anche dopo un riavvio
+GEOP_COOKIES = "geop_cookies.json"
+
+# lettura a finestre: ampiezze supportate e richieste contemporanee predefinite
+FINESTRE = ("settimana", "mese")
+PARALLELI_GEOP = 4
+
+
+class GeopSession:
+    """
+    Sessione GEOP autenticata e riutilizzabile tra i cicli di sincronizzazione.
+
+    Il login viene eseguito solo se non ci sono cookie validi o se GEOP risponde con la pagina
+    di login invece del JSON del calendario (sessione scaduta). I cookie restano in memoria
+    e, se `cookie_path` è indicato, vengono salvati su disco dopo ogni login.
+
+    Attributes:
+        logins (int): Numero di login eseguiti da questa sessione.
+        richieste (int): Numero di richieste al calendario eseguite.
+    """
+
+    def __init__(self, login_payload: dict, cookie_path: str = None):
+        self.login_payload = login_payload
+        self.cookie_path = cookie_path
+        self.session = traccia.sessione(requests.Session())
+        self.logins = 0
+        self.richieste = 0
+        self._lock = threading.Lock()
+        self._contatori_lock = threading.Lock()
+        self._carica_cookie()
+
+    def login(self, logins_visti: int = None):
+        """
+        Esegue il login su GEOP e salva i cookie della sessione.
+
+        Args:
+            logins_visti (int): Valore di `logins` osservato prima di scoprire che la sessione era scaduta.
+                                Se nel frattempo un altro thread ha già rifatto il login, non se ne esegue un altro.
+
+        Raises:
+            RuntimeError: Se la richiesta di login fallisce.
+        """
+        with self._lock:
+            if logins_visti is not None and self.logins != logins_visti:
+                return
+
+            self.session.cookies.clear()
+
+            # post invia dati all'api - non serve l'oggetto che restituisce
+            with metrics.fase("geop_login"):
+                login_status = self.session.post(LOGIN_URL, data=self.login_payload)
+            metrics.conta("chiamate_api_total", servizio="geop", metodo="login")
+            self.logins += 1
+
+            # nel caso che GEOP dovesse fallire
+            if login_status.status_code != 200:
+                raise RuntimeError(f"L'URL {LOGIN_URL} ha risposto con codice di errore: {login_status.status_code}")
+
+            self._salva_cookie()
+
+    def calendario(self, date: dict) -> requests.Response:
+        """
+        Richiede il calendario per l'intervallo indicato, riautenticandosi solo se la sessione è scaduta.
+
+        Raises:
+            RuntimeError: Se il login o la richiesta del calendario falliscono.
+        """
+        def richiedi():
+            response = self._post_calendario(date)
+            return response, _risposta_json(response)
+
+        return self._con_sessione(richiedi)
+
+    def calendario_stream(self, date: dict):
+        """
+        Come `calendario`, ma legge la risposta in streaming e la decodifica con `parser.iter_eventi`:
+        gli eventi vengono restituiti uno alla volta senza caricare l'intera risposta in memoria.
+        Per riconoscere la pagina di login (sessione scaduta) basta il primo blocco della risposta.
+
+        La connessione resta occupata finché il generatore non è esaurito o chiuso (`close()`): un chiamante
+        che potrebbe non leggerlo fino in fondo deve chiuderlo, ad esempio con `contextlib.closing`.
+
+        Returns:
+            Generatore di eventi GEOP grezzi.
+
+        Raises:
+            RuntimeError: Se il login o la richiesta del calendario falliscono.
+        """
+        def richiedi():
+            response = self._post_calendario(date, stream=True)
+            blocchi = response.iter_content(parser.BLOCCO_STREAM)
+            primo = b""
+            for blocco in blocchi:
+                primo += blocco
+                if primo.strip():
+                    break
+            response.blocchi = itertools.chain([primo], blocchi)
+            valida = primo.lstrip()[:1] in (b"[", b"{")
+            if not valida:
+                response.close()
+            return response, valida
+
+        response = self._con_sessione(richiedi)
+
+        def eventi():
+            with response:
+                yield from parser.iter_eventi(response.blocchi)
+
+        return eventi()
+
+    def _con_sessione(self, richiedi) -> requests.Response:
+        """
+        Esegue `richiedi` (che restituisce la risposta e se contiene il JSON del calendario),
+        con login iniziale se mancano i cookie e un nuovo login se la sessione è scaduta.
+        """
+        logins_visti = self.logins
+        if not self.session.cookies:
+            self.login(logins_visti)
+            logins_visti = self.logins
+
+        response, valida = richiedi()
+
+        if response.status_code == 200 and not valida:
+            metrics.log("Sessione GEOP scaduta, nuovo login.")
+            self.login(logins_visti)
+            response, valida = richiedi()
+
+        # nel caso che le credenziali fossero sbagliate
+        if response.status_code != 200 or not valida:
+            # una risposta in streaming non letta terrebbe occupata la connessione del pool
+            response.close()
+            raise RuntimeError(
+                f"L'URL {XHR_URL} ha risposto con codice di errore: {response.status_code}\n"
+                "Controlla la correttezza delle credenziali"
+            )
+
+        return response
+
+    def calendario_a_finestre(self, date: dict, finestra: str = "settimana", paralleli: int = PARALLELI_GEOP) -> list:
+        """
+        Richiede il calendario dividendo l'intervallo in finestre (vedi `dividi_intervallo`) scaricate
+        in parallelo sulla stessa sessione autenticata. Gli eventi vengono uniti e deduplicati per id.
+
+        Args:
+            date (dict): Intervallo "start"/"end" (YYYY-MM-DD, "end" esclusivo).
+            finestra (str): "settimana" o "mese".
+            paralleli (int): Numero massimo di richieste contemporanee.
+
+        Returns:
+            list: Eventi GEOP grezzi (come restituiti dall'endpoint), ordinati per inizio.
+
+        Raises:
+            RuntimeError: Se il login o la richiesta di una finestra falliscono.
+        """
+        finestre = dividi_intervallo(date, finestra)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, paralleli), thread_name_prefix="geop") as pool:
+            risposte = list(pool.map(lambda intervallo: list(self.calendario_stream(intervallo)), finestre))
+
+        # un evento a cavallo di due finestre può essere restituito da entrambe
+        eventi = {}
+        for risposta in risposte:
+            for event in risposta:
+                eventi.setdefault(event.get("id"), event)
+
+        return sorted(eventi.values(), key=lambda event: event.get("start", ""))
+
+    def _post_calendario(self, date: dict, stream: bool = False) -> requests.Response:
+        response = self.session.post(XHR_URL, data=date, stream=stream)
+        metrics.conta("chiamate_api_total", servizio="geop", metodo="calendario")
+        with self._contatori_lock:
+            self.richieste += 1
+        response.encoding = 'utf-8'
+        return response
+
+    def _carica_cookie(self):
+        if not self.cookie_path or not os.path.exists(self.cookie_path):
+            return
+        try:
+            with open(self.cookie_path, "r", encoding="utf-8") as file:
+                for cookie in json.load(file):
+                    self.session.cookies.set(**cookie)
+        except (OSError, ValueError, TypeError):
+            # file corrotto: si riparte con un login
+            self.session.cookies.clear()
+
+    def _salva_cookie(self):
+        if not self.cookie_path:
+            return
+        cookies = [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+            for c in self.session.cookies
+        ]
+        temporaneo = f"{self.cookie_path}.tmp"
+        with open(temporaneo, "w", encoding="utf-8") as file:
+            json.dump(cookies, file)
+        os.replace(temporaneo, self.cookie_path)
+
+
+# sessioni GEOP per utente, riutilizzate dai cicli successivi dello stesso processo
+_sessioni = {}
+_sessioni_lock = threading.Lock()
+
+
+def sessione_geop(login_payload: dict, cookie_path: str = GEOP_COOKIES) -> GeopSession:
+    """
+    Restituisce la sessione GEOP dell'utente, creandola al primo utilizzo.
+
+    Args:
+        login_payload (dict): Credenziali GEOP con le chiavi "username" e "password".
+        cookie_path (str): File in cui salvare i cookie della sessione (None per tenerli solo in memoria).
+
+    Returns:
+        GeopSession: Sessione condivisa per quell'utente.
+    """
+    with _sessioni_lock:
+        sessione = _sessioni.get(login_payload["username"])
+        if sessione is None or sessione.login_payload != login_payload:
+            sessione = GeopSession(login_payload, cookie_path)
+            _sessioni[login_payload["username"]] = sessione
+        return sessione
+
+
+def _risposta_json(response: requests.Response) -> bool:
+    """
+    GEOP risponde con Content-Type text/html anche al JSON: se la sessione è scaduta
+    restituisce invece la pagina di login, quindi si controlla l'inizio del corpo.
+    """
+    return response.text.lstrip()[:1] in ("[", "{")
+
+
+def get_calendar(login_payload: dict, date: dict, calendar_path: str = "calendar.json", cookie_path: str = GEOP_COOKIES) -> int:
     """
     Interroga l'API di GEOP per ottenere il calendario dell'utente in un intervallo di date.
 
+    La sessione autenticata viene riutilizzata tra una chiamata e l'altra (vedi `GeopSession`):
+    il login avviene solo al primo utilizzo o quando la sessione è scaduta.
+    La risposta viene letta in streaming: ogni evento è decodificato, elaborato e scritto
+    in calendar.json man mano che arriva (vedi `GeopSession.calendario_stream`).
+    Con un `calendar_path` che termina in ".bin" gli eventi vengono salvati nel formato binario di `eventi.salva`.
+
     Args:
         login_payload (dict): Dizionario con le credenziali per accedere a GEOP.\n
                             Deve contenere le chiavi "username" e "password".
@@ -16,9 +265,12 @@ def get_calendar(login_payload: dict, date: dict) -> requests.Response:
         date (dict): Dizionario contenente le date di inizio "start" e fine "end" in formato YYYY-MM-DD.\n
                     L'endpoint interpreta "end" come *esclusivo*: l'ultimo giorno è quello precedente.
 
+        calendar_path (str): File in cui salvare gli eventi elaborati.
+
+        cookie_path (str): File in cui salvare i cookie della sessione GEOP.
+
     Returns:
-        requests.Response: Oggetto Response con il calendario richiesto.\n
-        La risposta viene salvata nel file calendar.json.
+        int: Numero di eventi elaborati e salvati nel file calendar.json.
 
     Raises:
         RuntimeError: Se la richiesta di login o l'accesso al calendario falliscono.
@@ -26,55 +278,115 @@ def get_calendar(login_payload: dict, date: dict) -> requests.Response:
     Example:
         login_payload = {"username": "utente", "password": "password123"}\n
         date_range = {"start": "2025-03-24", "end": "2025-03-31"}\n
-        response = get_calendar(login_payload, date_range)\n
-        print(response.json())  # Stampa il calendario in formato JSON   
+        salvati = get_calendar(login_payload, date_range)\n
+        print(parser.read_json("calendar.json"))  # Stampa il calendario elaborato
     """
+    sessione = sessione_geop(login_payload, cookie_path)
+    # con lo streaming geop_fetch arriva al primo blocco della risposta: il resto del download
+    # avviene insieme alla decodifica ed è contato in parse
+    with metrics.fase("geop_fetch"):
+        eventi = sessione.calendario_stream(date)
 
-    login_url = "https://itsar.registrodiclasse.it/geopcfp2/update/login.asp"
-    xhr_url = "https://itsar.registrodiclasse.it/geopcfp2/json/fullcalendar_events_alunno.asp"
+    metrics.log(f"Login GEOP eseguiti: {sessione.logins} su {sessione.richieste} richieste al calendario")
 
-    session = requests.Session()
+    # chiuso anche se la scrittura fallisce a metà, per liberare subito la connessione
+    with metrics.fase("parse"), contextlib.closing(eventi):
+        return modello.scrivi(eventi, calendar_path)
 
-    # post invia dati all'api - non serve l'oggetto che restituisce
-    login_status = session.post(login_url, data=login_payload) 
 
-    # nel caso che GEOP dovesse fallire
-    if login_status.status_code != 200:
-        raise RuntimeError(f"L'URL {login_url} ha risposto con codice di errore: {login_status.status_code}")
+def get_calendar_a_finestre(login_payload: dict, date: dict, calendar_path: str = "calendar.json", cookie_path: str = GEOP_COOKIES,
+                            finestra: str = "settimana", paralleli: int = PARALLELI_GEOP) -> list:
+    """
+    Come `get_calendar`, ma per intervalli lunghi (es. un anno accademico): invece di un'unica risposta
+    molto grande, l'intervallo viene diviso in finestre settimanali o mensili scaricate in parallelo
+    con la sessione GEOP condivisa (vedi `GeopSession.calendario_a_finestre`).
 
-    response = session.post(xhr_url, data = date)
-    print(response.headers.get("Content-Type")) #: text/html.
-    response.encoding = 'utf-8' 
+    Args:
+        login_payload (dict): Dizionario con le credenziali per accedere a GEOP.
+        date (dict): Intervallo "start"/"end" in formato YYYY-MM-DD, "end" esclusivo.
+        calendar_path (str): File in cui salvare gli eventi elaborati.
+        cookie_path (str): File in cui salvare i cookie della sessione GEOP.
+        finestra (str): Ampiezza delle finestre, "settimana" o "mese".
+        paralleli (int): Numero massimo di richieste contemporanee a GEOP.
 
-    # nel caso che le credenziali fossero sbagliate
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"L'URL {xhr_url} ha risposto con codice di errore: {response.status_code}\n"
-            "Controlla la correttezza delle credenziali"
-        )
-    
-    parser.write_json(response)
+    Returns:
+        list: Eventi GEOP grezzi, deduplicati per id. Gli eventi elaborati vengono salvati in calendar.json.
+
+    Raises:
+        RuntimeError: Se la richiesta di login o l'accesso al calendario falliscono.
+        ValueError: Se `finestra` non è supportata.
+    """
+    sessione = sessione_geop(login_payload, cookie_path)
+    with metrics.fase("geop_fetch"):
+        eventi = sessione.calendario_a_finestre(date, finestra, paralleli)
+
+    metrics.log(f"Login GEOP eseguiti: {sessione.logins} su {sessione.richieste} richieste al calendario")
+
+    with metrics.fase("parse"):
+        modello.scrivi(eventi, calendar_path)
+
+    return eventi
+
+
+def dividi_intervallo(date: dict, finestra: str = "settimana") -> list:
+    """
+    Divide un intervallo [start, end) in finestre consecutive e disgiunte, con la stessa semantica
+    di "end" esclusivo dell'endpoint GEOP: la fine di una finestra è l'inizio della successiva.
+
+    Le finestre settimanali durano 7 giorni a partire da "start"; quelle mensili terminano
+    al primo giorno del mese successivo. L'ultima finestra è troncata a "end".
+
+    Args:
+        date (dict): Intervallo "start"/"end" in formato YYYY-MM-DD.
+        finestra (str): "settimana" o "mese".
 
-    return response
+    Returns:
+        list: Lista di dizionari "start"/"end", vuota se l'intervallo è vuoto.
 
+    Raises:
+        ValueError: Se `finestra` non è supportata.
 
-def weeks_range(n_weeks: int) -> dict:
+    Example:
+        dividi_intervallo({"start": "2025-03-24", "end": "2025-04-10"}, "mese")\n
+        # [{"start": "2025-03-24", "end": "2025-04-01"}, {"start": "2025-04-01", "end": "2025-04-10"}]
+    """
+    if finestra not in FINESTRE:
+        raise ValueError(f"finestra deve essere una tra: {', '.join(FINESTRE)}")
+
+    inizio = datetime.date.fromisoformat(date["start"])
+    fine = datetime.date.fromisoformat(date["end"])
+    finestre = []
+
+    while inizio < fine:
+        if finestra == "settimana":
+            successivo = inizio + datetime.timedelta(weeks=1)
+        else:
+            successivo = (inizio.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+        finestre.append({"start": inizio.isoformat(), "end": min(successivo, fine).isoformat()})
+        inizio = successivo
+
+    return finestre
+
+
+def weeks_range(n_weeks: int, max_end: str = None) -> dict:
     """
     Calcola un intervallo di date basato sulla settimana corrente e un numero di settimane.
 
     Args:
         n_weeks (int): Numero di settimane da aggiungere alla data di inizio.
+        max_end (str): Data massima di fine (YYYY-MM-DD), ad esempio la fine dell'anno accademico.
+                       Se None l'intervallo non viene troncato.
 
     Returns:
         dict: Dizionario contenente le date di inizio "start" e fine "end" in formato YYYY-MM-DD.\n
             "start" è il lunedì della settimana corrente,\n 
-            "end" è n_weeks dopo "start".
+            "end" è n_weeks dopo "start" (o max_end, se precedente).
 
     Raises:
         ValueError: Se viene passato in n_weeks un valore non intero o positivo.
     """
     date_format = '%Y-%m-%d'
-    max_end_date = datetime.datetime.strptime("2026-08-04", date_format).date() # aggiornato la data di scansione massima
     
     if not isinstance(n_weeks, int) or n_weeks <= 0:
         raise ValueError("n_weeks deve essere un numero intero positivo.")
@@ -85,7 +397,9 @@ def weeks_range(n_weeks: int) -> dict:
     start_date = today - datetime.timedelta(days=today.weekday())
     min_end_date = start_date + datetime.timedelta(weeks=n_weeks)
     
-    end_date = min(min_end_date, max_end_date)
+    end_date = min_end_date
+    if max_end:
+        end_date = min(end_date, datetime.datetime.strptime(max_end, date_format).date())
 
     # formatta le date come stringhe nel formato YYYY-MM-DD
     start_str = start_date.strftime(date_format)
@@ -95,6 +409,4 @@ def weeks_range(n_weeks: int) -> dict:
         'start': start_str,
         'end': end_str,
     }
-    return date_range
-
-# maybe funzione per il login
\ No newline at end of file
+    return date_range
\ No newline at end of file
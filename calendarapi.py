@@ -1,66 +1,374 @@
 # api google calendar qui
 # richiesto tzdata per il database dei fusi orari
+import concurrent.futures
 import datetime
+import json
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError # pip install tzdata
 import os.path
+import threading
+import time
+import weakref
 
+import diffengine
+import eventi
+import metrics
 import parser
+import scheduler
+import statestore
+import traccia
 
+import httplib2
+import requests
+from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
 
+# prefissi del summary che identificano gli eventi creati a partire da GEOP
+PREFISSI_GEOP = ("UFS", "UFT", "PW", "Extra Orario", "Extraorario", "SIMULAZIONE ESAME FINALE")
 
-def accesso() -> Credentials:
+# documento di discovery dell'API Calendar salvato in locale: il client si costruisce senza rete
+DISCOVERY_CACHE = "calendar_v3_discovery.json"
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/calendar/v3/rest"
+
+# copia locale degli eventi Google con il syncToken per la lettura incrementale
+GOOGLE_MIRROR = "google_events.json"
+
+# parametri di events.list comuni alla lettura completa e alle letture con syncToken: Google chiede di ripeterli
+# (senza singleEvents il delta restituirebbe gli eventi ricorrenti come serie invece che come singole istanze)
+PARAMETRI_INCREMENTALI = {"singleEvents": True}
+
+# risposte parziali (parametro fields): Google restituisce solo i campi usati dalla sincronizzazione
+# (quelli confrontati da diffengine, più id/etag/status) invece della risorsa completa
+RISPOSTE_PARZIALI = True
+CAMPI_EVENTO = "id,etag,status,summary,location,description,colorId,start,end,reminders,extendedProperties"
+CAMPI_LIST = f"nextPageToken,nextSyncToken,items({CAMPI_EVENTO})"
+# dopo una scrittura servono solo id ed etag per l'indice e htmlLink per il log
+CAMPI_SCRITTURA = "id,etag,htmlLink"
+
+# eventi per pagina di events.list (massimo consentito dall'API, il predefinito è 250)
+MAX_RESULTS = 2500
+
+# calendario secondario dedicato agli eventi GEOP (profilo "calendario_dedicato"): contiene solo eventi
+# gestiti da questo programma, quindi si legge l'intero intervallo senza filtrare per prefisso e fascia oraria.
+# La descrizione lo distingue da un calendario omonimo creato a mano dall'utente.
+CALENDARIO_DEDICATO = "GEOP"
+DESCRIZIONE_DEDICATO = "Lezioni sincronizzate da GEOP. Gli eventi aggiunti a mano in questo calendario vengono eliminati."
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+# rinnovo in background delle credenziali in memoria: RINNOVO_ANTICIPO secondi prima della scadenza (più della
+# soglia oltre cui google-auth considera il token già scaduto, 3 minuti e 45 secondi), e non più spesso
+# di RINNOVO_RIPROVA secondi (anche dopo un rinnovo non riuscito per un errore di rete)
+RINNOVO_ANTICIPO = 300
+RINNOVO_RIPROVA = 60
+
+# client costruiti per processo: chiave delle credenziali -> (oggetto Credentials usato, service)
+_services = {}
+_services_lock = threading.Lock()
+# credenziali di ogni client costruito da get_service, per le connessioni dei thread del pool (`_http_thread`):
+# restano finché il client è in uso, anche se nel frattempo è stato scartato da `invalida_service`
+_credenziali_client = weakref.WeakKeyDictionary()
+_discovery_doc = None
+
+
+def accesso(token_path: str = "token.json", credentials_path: str = "credentials.json", interattivo: bool = True) -> Credentials:
     """
     La funzione gestisce l'autenticazione con l'API di Google Calendar.
 
-    Cerca le credenziali salvate in "token.json": 
-    se sono valide le utilizza, 
-    se sono scadute prova a rinnovarle, 
-    altrimenti avvia il flusso di login per ottenere nuove credenziali, le salva e le restituisce.
+    Restituisce le credenziali dell'utente di "token.json", tenute in memoria da `CredenzialiGoogle`
+    e rinnovate in background prima della scadenza:
+    il file viene letto solo la prima volta (o se è stato riscritto da un altro processo),
+    se il token è scaduto viene rinnovato,
+    se manca o non è rinnovabile avvia il flusso di login (solo con `interattivo`), salva le credenziali e le restituisce.
+
+    Args:
+        token_path (str): File dei token di accesso dell'utente.
+        credentials_path (str): File delle credenziali OAuth dell'applicazione.
+        interattivo (bool): Se False (es. nel demone) non apre il browser per il login, ma solleva un errore.
 
     Returns:
         Credentials: Oggetto Credentials di google.oauth2.credentials da usare nelle funzioni di chiamata API.
+
+    Raises:
+        RuntimeError: Se serve un nuovo login ma `interattivo` è False.
+    """
+    return gestore_credenziali(token_path, credentials_path).credenziali(interattivo)
+
+
+class CredenzialiGoogle:
+    """
+    Credenziali Google di un utente, tenute in memoria e condivise da tutti i cicli e i thread del processo.
+
+    Un thread in background rinnova il token di accesso `RINNOVO_ANTICIPO` secondi prima della scadenza,
+    così le chiamate all'API non attendono il round-trip OAuth. Il rinnovo modifica lo stesso oggetto
+    Credentials usato dai client già costruiti, che leggono il token a ogni richiesta.
+    token.json viene riscritto, in modo atomico, solo quando il token è cambiato (rinnovo, nuovo login
+    o rinnovo eseguito dal client HTTP dopo un 401).
+
+    Il login con il browser (`InstalledAppFlow.run_local_server`) avviene solo su richiesta esplicita
+    (`interattivo=True`), mai dal thread di rinnovo né dal demone.
+
+    Attributes:
+        rinnovi (int): Rinnovi del token eseguiti, in background o al momento della richiesta.
+    """
+
+    def __init__(self, token_path: str = "token.json", credentials_path: str = "credentials.json"):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.rinnovi = 0
+        self._creds = None
+        self._token_salvato = None
+        self._versione_file = None
+        self._timer = None
+        self._lock = threading.Lock()
+        # una sola sessione per tutti i rinnovi: la connessione verso l'endpoint OAuth resta aperta tra un rinnovo e l'altro
+        self._sessione = traccia.sessione(requests.Session())
+
+    def credenziali(self, interattivo: bool = False) -> Credentials:
+        """
+        Restituisce credenziali valide. Il rinnovo avviene qui solo se quello in background non è bastato
+        (es. processo sospeso o rinnovo fallito).
+
+        Raises:
+            RuntimeError: Se serve un nuovo login ma `interattivo` è False.
+        """
+        with self._lock:
+            if self._creds is None or self._versione_file != self._versione_su_disco():
+                self._carica()
+
+            if not self._creds or not self._creds.valid:
+                if not (self._creds and self._creds.refresh_token and self._rinnova()):
+                    if not interattivo:
+                        raise RuntimeError(
+                            f"Token Google mancante o non rinnovabile in {self.token_path}: "
+                            "eseguire il primo login in modo interattivo"
+                        )
+                    flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
+                    self._creds = flow.run_local_server(port=0)
+
+            self._salva_se_cambiato()
+            self._pianifica()
+            return self._creds
+
+    def chiudi(self):
+        """
+        Ferma il rinnovo in background e chiude la sessione HTTP dei rinnovi.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._sessione.close()
+
+    def _versione_su_disco(self):
+        try:
+            return os.stat(self.token_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _carica(self):
+        # The file token.json stores the user's access and refresh tokens, and is
+        # created automatically when the authorization flow completes for the first time.
+        self._versione_file = self._versione_su_disco()
+        if self._versione_file is None:
+            self._creds = None
+            return
+        self._creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+        self._token_salvato = self._creds.token
+
+    def _rinnova(self) -> bool:
+        """
+        Rinnova il token di accesso. Restituisce False se Google rifiuta il refresh token (revocato o scaduto);
+        gli errori di rete vengono propagati.
+        """
+        try:
+            self._creds.refresh(Request(self._sessione))
+        except RefreshError as error:
+            metrics.log(f"Rinnovo delle credenziali Google rifiutato ({self.token_path}): {error}", "errore")
+            return False
+        self.rinnovi += 1
+        metrics.conta("chiamate_api_total", servizio="google", metodo="oauth.token")
+        return True
+
+    def _salva_se_cambiato(self):
+        if self._creds is None or self._creds.token == self._token_salvato:
+            return
+        # scrittura atomica: un processo che legge token.json non trova mai un file a metà
+        temporaneo = f"{self.token_path}.tmp"
+        with open(temporaneo, "w", encoding="utf-8") as token:
+            token.write(self._creds.to_json())
+        os.replace(temporaneo, self.token_path)
+        self._token_salvato = self._creds.token
+        self._versione_file = self._versione_su_disco()
+
+    def _pianifica(self, minimo: float = 0.0):
+        """
+        Programma il prossimo rinnovo in background `RINNOVO_ANTICIPO` secondi prima della scadenza,
+        ma non prima di `minimo` secondi. Va chiamata con il lock acquisito.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._creds is None or self._creds.expiry is None or not self._creds.refresh_token:
+            return
+
+        # google-auth esprime la scadenza in UTC senza fuso orario
+        adesso = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        attesa = (self._creds.expiry - adesso).total_seconds() - RINNOVO_ANTICIPO
+        self._timer = threading.Timer(max(minimo, attesa), self._rinnovo_programmato)
+        self._timer.daemon = True
+        self._timer.name = "rinnovo-credenziali"
+        self._timer.start()
+
+    def _rinnovo_programmato(self):
+        with self._lock:
+            # timer sostituito da una pianificazione più recente mentre attendeva il lock
+            if self._timer is not threading.current_thread():
+                return
+            self._timer = None
+            try:
+                rinnovato = self._rinnova()
+                self._salva_se_cambiato()
+            except Exception as error:
+                metrics.log(f"Rinnovo delle credenziali Google non riuscito ({self.token_path}): {error}", "errore")
+                rinnovato = None
+
+            # refresh token rifiutato: nessun nuovo tentativo, serve un login interattivo.
+            # Dopo un errore di rete si riprova tra RINNOVO_RIPROVA secondi (intanto la richiesta successiva
+            # rinnova da sé se serve); lo stesso minimo evita rinnovi a raffica con token più brevi di RINNOVO_ANTICIPO.
+            if rinnovato is not False:
+                self._pianifica(minimo=RINNOVO_RIPROVA)
+
+
+# credenziali per file token.json, condivise dai cicli e dai thread del processo
+_credenziali = {}
+_credenziali_lock = threading.Lock()
+
+
+def gestore_credenziali(token_path: str = "token.json", credentials_path: str = "credentials.json") -> CredenzialiGoogle:
+    """
+    Restituisce il gestore delle credenziali di un file token.json, creandolo al primo utilizzo.
+    """
+    chiave = os.path.abspath(token_path)
+    with _credenziali_lock:
+        gestore = _credenziali.get(chiave)
+        if gestore is None:
+            gestore = CredenzialiGoogle(token_path, credentials_path)
+            _credenziali[chiave] = gestore
+        return gestore
+
+
+def discovery_doc() -> str:
+    """
+    Restituisce il documento di discovery dell'API Calendar v3, letto una sola volta per processo.
+
+    L'ordine di ricerca è: la cache locale `DISCOVERY_CACHE`, il documento statico incluso
+    in googleapiclient e, solo se mancano entrambi, il download da `DISCOVERY_URL`.
+    Se la cache locale non esiste viene creata, così le esecuzioni successive non dipendono dalla rete.
+
+    Returns:
+        str: Documento di discovery in formato JSON.
+    """
+    global _discovery_doc
+
+    if _discovery_doc is not None:
+        return _discovery_doc
+
+    if os.path.exists(DISCOVERY_CACHE):
+        with open(DISCOVERY_CACHE, "r", encoding="utf-8") as cache:
+            _discovery_doc = cache.read()
+        return _discovery_doc
+
+    doc = get_static_doc("calendar", "v3")
+    if doc is None:
+        risposta, contenuto = traccia.http(httplib2.Http()).request(DISCOVERY_URL)
+        if risposta.status != 200:
+            raise RuntimeError(f"L'URL {DISCOVERY_URL} ha risposto con codice di errore: {risposta.status}")
+        doc = contenuto.decode("utf-8")
+
+    # scrittura atomica: un processo concorrente non legge mai un file a metà
+    temporaneo = f"{DISCOVERY_CACHE}.tmp"
+    with open(temporaneo, "w", encoding="utf-8") as cache:
+        cache.write(doc)
+    os.replace(temporaneo, DISCOVERY_CACHE)
+
+    _discovery_doc = doc
+    return _discovery_doc
+
+
+def get_service(creds: Credentials):
+    """
+    Restituisce il client dell'API di Google Calendar per le credenziali indicate.
+
+    Il client viene costruito una volta sola per ogni account e riutilizzato da tutte le operazioni
+    e dai cicli successivi di main.py, insieme alla sua connessione HTTP (keep-alive).
+    I rinnovi del token non richiedono un nuovo client (AuthorizedHttp legge il token a ogni richiesta);
+    viene ricostruito solo se le credenziali sono un oggetto diverso (es. token.json riletto).
+
+    Args:
+        creds (Credentials): Credenziali per accedere all'API di Google Calendar.
+
+    Returns:
+        Resource: Client googleapiclient per l'API Calendar v3.
     """
-    # If modifying these scopes, delete the file token.json.
-    SCOPES = ['https://www.googleapis.com/auth/calendar']
-
-    creds = None
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            # raise exceptions.RefreshError per token scaduto
+    chiave = (creds.client_id, creds.refresh_token)
+
+    with _services_lock:
+        usate, service = _services.get(chiave, (None, None))
+        if service is None or usate is not creds:
+            http = AuthorizedHttp(creds, http=traccia.http(httplib2.Http()))
+            with traccia.span("discovery_build"):
+                service = build_from_document(discovery_doc(), http=http)
+            _services[chiave] = (creds, service)
+            _credenziali_client[service] = creds
+
+    return service
+
+
+def invalida_service(creds: Credentials = None):
+    """
+    Scarta il client associato alle credenziali indicate (o tutti i client se creds è None).
+    Il client verrà ricostruito alla prossima chiamata di `get_service`.
+    """
+    with _services_lock:
+        if creds is None:
+            _services.clear()
         else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                "credentials.json", SCOPES
-            )
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-    
-    return creds
+            _services.pop((creds.client_id, creds.refresh_token), None)
+
+
+def campi(maschera: str) -> dict:
+    """
+    Parametro `fields` da passare a una chiamata dell'API, vuoto se le risposte parziali sono disattivate.
+
+    Example:
+        service.events().list(calendarId="primary", **campi(CAMPI_LIST))
+    """
+    return {"fields": maschera} if RISPOSTE_PARZIALI else {}
 
 
-def read_calendar(creds: Credentials, date_info: dict) -> list: 
+def read_calendar(creds: Credentials, date_info: dict, calendar_id: str = "primary", dedicato: bool = False) -> list: 
     """
     Legge gli eventi da Google Calendar per un intervallo di date specificato, 
     escludendo i weekend e filtrando solo gli eventi il cui summary inizia con "UFS" o "UFT".
     Update: deve leggere eventi "PW" e "Extra Orario".
 
+    L'intero intervallo viene letto con un'unica query timeMin/timeMax (seguendo nextPageToken),
+    il filtro sui giorni feriali e sulla fascia 08:40-17:40 viene applicato lato client.
+    Con il calendario dedicato non c'è alcun filtro: si leggono tutti gli eventi dei giorni dell'intervallo.
+
     Args:
         creds (Credentials): Credenziali per accedere all'API di Google Calendar.
         date_info (dict): Dizionario contenente le date di inizio "start" e fine "end" in formato YYYY-MM-DD 
                           che definiscono l'intervallo di ricerca degli eventi.
+        calendar_id (str): Calendario da leggere.
+        dedicato (bool): True se `calendar_id` è il calendario dedicato (vedi `prepara_calendario_dedicato`).
 
     Returns:
         list: Lista di eventi (sotto forma di dizionari) che soddisfano il filtro richiesto.
@@ -69,95 +377,325 @@ def read_calendar(creds: Credentials, date_info: dict) -> list:
     try:
         local_tz = ZoneInfo("Europe/Rome")
     except ZoneInfoNotFoundError:
-        print(f"Fuso orario non trovato. Assicurati che il database tzdata sia installato e accessibile ('pip install tzdata')")
+        metrics.log("Fuso orario non trovato. Assicurati che il database tzdata sia installato e accessibile ('pip install tzdata')", "errore")
         # exit("Impossibile determinare il fuso orario")
 
     try:
-        service = build("calendar", "v3", credentials=creds)
+        service = get_service(creds)
         all_events = []
 
         # estrai le date di inizio e fine
-        start_date = datetime.datetime.fromisoformat(date_info["start"])
-        end_date = datetime.datetime.fromisoformat(date_info["end"])
-
-        current_date = start_date
-
-        # itera attraverso ogni giorno nell'intervallo
-        while current_date <= end_date:
-            # salta i weekend (Saturday = 5, Sunday = 6)
-            if current_date.weekday() >= 5:
-                current_date += datetime.timedelta(days=1)
-                continue
-
-            # definisci l'intervallo di tempo per il giorno corrente
-            start_of_day_local = datetime.datetime(current_date.year, current_date.month, current_date.day, 8, 40, 0, tzinfo=local_tz)
-            end_of_day_local = datetime.datetime(current_date.year, current_date.month, current_date.day, 17, 40, 0, tzinfo=local_tz)
-
-            # converti in UTC usando il metodo standard astimezone
-            start_of_day_utc = start_of_day_local.astimezone(datetime.timezone.utc).isoformat()
-            end_of_day_utc = end_of_day_local.astimezone(datetime.timezone.utc).isoformat()
-
-            # i print finiscono nei log
-            # gli orari sono corretti, interroga l'api in UTC
-            print(f"Recupero eventi dal {start_of_day_utc} al {end_of_day_utc}")
-
-            # ottiene gli eventi da Calendar
+        start_date = datetime.date.fromisoformat(date_info["start"])
+        end_date = datetime.date.fromisoformat(date_info["end"])
+
+        # l'intervallo va dalle 08:40 del primo giorno alle 17:40 dell'ultimo (giorni interi con il calendario
+        # dedicato), interrogato in UTC
+        time_min, time_max = (
+            limite.astimezone(datetime.timezone.utc).isoformat()
+            for limite in limiti_lettura(start_date, end_date, local_tz, dedicato)
+        )
+
+        # i print finiscono nei log
+        metrics.log(f"Recupero eventi dal {time_min} al {time_max}")
+
+        page_token = None
+        while True:
+            # ottiene una pagina di eventi da Calendar
             events_result = (
                 service.events()
                 .list(
-                    calendarId="primary",
-                    timeMin=start_of_day_utc,
-                    timeMax=end_of_day_utc,
+                    calendarId=calendar_id,
+                    timeMin=time_min,
+                    timeMax=time_max,
                     singleEvents=True,
                     orderBy="startTime",
+                    pageToken=page_token,
+                    maxResults=MAX_RESULTS,
+                    **campi(CAMPI_LIST),
                 )
                 .execute()
             )
-            events = events_result.get("items", [])
+            metrics.conta("chiamate_api_total", servizio="google", metodo="events.list")
 
             # filtra solo gli eventi che iniziano con "UFS" o "UFT" # update legge anche "PW" e "Extra Orario"
-            filtered_events = [event for event in events if event.get("summary", "").startswith(("UFS", "UFT", "PW", "Extra Orario", "Extraorario", "SIMULAZIONE ESAME FINALE"))]
-
-            if filtered_events:
-                all_events.extend(filtered_events)
+            # e che cadono nella fascia oraria di un giorno feriale
+            all_events.extend(
+                event for event in events_result.get("items", [])
+                if dedicato or evento_geop(event, start_date, end_date, local_tz)
+            )
 
-            # incrementa la data per il giorno successivo
-            current_date += datetime.timedelta(days=1)
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                break
 
         if not all_events: # evitabile, logging
-            print("Nessun evento trovato nell'intervallo di date specificato.")  
+            metrics.log("Nessun evento trovato nell'intervallo di date specificato.")
             return []
 
         for event in all_events: # evitabile, logging
             start = event["start"].get("dateTime", event["start"].get("date"))
-            print(start, event["summary"])
+            metrics.log(f"{start} {event.get('summary', '')}", "evento")
 
         return all_events
 
     except HttpError as error:
-        print(f"Si è verificato un errore durante la lettura: {error}")
+        metrics.log(f"Si è verificato un errore durante la lettura: {error}", "errore")
 
 
-def add_calendar(creds: Credentials, event: dict): # aggiunge singolarmente perché gestisco i loop meglio se ci sono condizioni
+def read_calendar_incrementale(creds: Credentials, date_info: dict, mirror_path: str = GOOGLE_MIRROR, calendar_id: str = "primary",
+                               dedicato: bool = False) -> list:
     """
-    Aggiunge un singolo evento a Google Calendar.
+    Come `read_calendar`, ma legge da Google solo le modifiche avvenute dall'ultima lettura.
+
+    Al primo avvio esegue una lettura completa a partire dall'inizio dell'intervallo e salva
+    gli eventi con il nextSyncToken restituito in `mirror_path`. Nei cicli successivi chiede
+    a Google solo il delta tramite syncToken e lo applica alla copia locale: se non è cambiato
+    nulla la lettura costa una sola richiesta quasi vuota.
+    Se Google risponde 410 Gone (token scaduto), l'intervallo inizia prima di quello salvato
+    o la copia locale è di un altro calendario, questa viene scartata e si esegue di nuovo la lettura completa.
 
     Args:
-        creds (Credentials): Credenziali per l'accesso all'API di Google Calendar.
-        event (dict): Dizionario contenente i dati dell'evento da aggiungere.\n 
-                    Il dizionario verrà formattato tramite `parser.format_event`.
+        creds (Credentials): Credenziali per accedere all'API di Google Calendar.
+        date_info (dict): Dizionario contenente le date di inizio "start" e fine "end" in formato YYYY-MM-DD.
+        mirror_path (str): File in cui conservare la copia locale degli eventi e il syncToken.
+        calendar_id (str): Calendario da leggere.
+        dedicato (bool): True se `calendar_id` è il calendario dedicato.
+
+    Returns:
+        list: Lista di eventi che soddisfano lo stesso filtro di `read_calendar`, ordinati per inizio.
     """
+    try:
+        local_tz = ZoneInfo("Europe/Rome")
+    except ZoneInfoNotFoundError:
+        metrics.log("Fuso orario non trovato. Assicurati che il database tzdata sia installato e accessibile ('pip install tzdata')", "errore")
 
     try:
-        service = build("calendar", "v3", credentials=creds)
+        service = get_service(creds)
+
+        start_date = datetime.date.fromisoformat(date_info["start"])
+        end_date = datetime.date.fromisoformat(date_info["end"])
+        time_min = limiti_lettura(start_date, end_date, local_tz, dedicato)[0].astimezone(datetime.timezone.utc).isoformat()
+
+        mirror = carica_mirror(mirror_path, calendar_id)
+        delta = None
+
+        # l'intervallo avanza solo in avanti: se inizia prima della copia locale questa non basta
+        if mirror["syncToken"] and mirror["timeMin"] <= time_min:
+            try:
+                delta, sync_token = _list_eventi(service, calendar_id, syncToken=mirror["syncToken"],
+                                                 **PARAMETRI_INCREMENTALI)
+                metrics.log(f"Lettura incrementale: {len(delta)} eventi modificati su Google Calendar")
+            except HttpError as error:
+                if error.resp.status != 410:
+                    raise
+                metrics.log("Il syncToken di Google Calendar è scaduto (410 Gone): rileggo l'intero intervallo")
+
+        if delta is None:
+            # lettura completa: senza timeMax, così gli eventi futuri restano nella copia locale
+            mirror = {"calendarId": calendar_id, "syncToken": None, "timeMin": time_min, "events": {}}
+            delta, sync_token = _list_eventi(service, calendar_id, timeMin=time_min, **PARAMETRI_INCREMENTALI)
+            metrics.log(f"Lettura completa: {len(delta)} eventi dal {time_min}")
+
+        for event in delta:
+            if event.get("status") == "cancelled":
+                mirror["events"].pop(event["id"], None)
+            else:
+                mirror["events"][event["id"]] = event
 
-        event = parser.format_event(event)
-        evento = service.events().insert(calendarId = "primary", body = event).execute()
+        mirror["syncToken"] = sync_token
+        mirror["timeMin"] = time_min
+        salva_mirror(mirror, mirror_path, local_tz)
 
-        print(f"Evento creato: {evento.get("htmlLink")}")
+        all_events = [
+            event for event in mirror["events"].values()
+            if (in_intervallo if dedicato else evento_geop)(event, start_date, end_date, local_tz)
+        ]
+        all_events.sort(key=lambda event: event_datetime(event["start"], local_tz))
+        return all_events
 
     except HttpError as error:
-        print(f"Errore durante il caricamento dell'evento: {error}")
+        metrics.log(f"Si è verificato un errore durante la lettura incrementale: {error}", "errore")
+
+
+def _list_eventi(service, calendar_id: str, **params) -> tuple:
+    """
+    Esegue events.list seguendo nextPageToken fino all'ultima pagina, con pagine da `MAX_RESULTS`
+    eventi e la maschera `CAMPI_LIST`.
+
+    Returns:
+        tuple: (lista degli eventi, nextSyncToken dell'ultima pagina).
+    """
+    items = []
+    page_token = None
+
+    while True:
+        events_result = service.events().list(
+            calendarId=calendar_id, pageToken=page_token, maxResults=MAX_RESULTS, **campi(CAMPI_LIST), **params
+        ).execute()
+        metrics.conta("chiamate_api_total", servizio="google", metodo="events.list")
+        items.extend(events_result.get("items", []))
+
+        page_token = events_result.get("nextPageToken")
+        if not page_token:
+            return items, events_result.get("nextSyncToken")
+
+
+def carica_mirror(mirror_path: str = GOOGLE_MIRROR, calendar_id: str = "primary") -> dict:
+    """
+    Legge la copia locale degli eventi Google. Se il file manca, è illeggibile o appartiene a un altro
+    calendario (es. dopo il passaggio al calendario dedicato) restituisce una copia vuota, che forza una lettura completa.
+
+    Returns:
+        dict: Dizionario con le chiavi "calendarId", "syncToken", "timeMin" ed "events" (id -> evento).
+    """
+    try:
+        mirror = parser.read_json(mirror_path)
+        if {"calendarId", "syncToken", "timeMin", "events"} <= mirror.keys() and mirror["calendarId"] == calendar_id:
+            return mirror
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {"calendarId": calendar_id, "syncToken": None, "timeMin": "", "events": {}}
+
+
+def salva_mirror(mirror: dict, mirror_path: str, local_tz: ZoneInfo):
+    """
+    Scrive la copia locale in modo atomico, scartando gli eventi terminati prima di "timeMin":
+    l'intervallo non torna indietro, quindi non serviranno più.
+    """
+    time_min = datetime.datetime.fromisoformat(mirror["timeMin"])
+    mirror["events"] = {
+        event_id: event for event_id, event in mirror["events"].items()
+        if event_datetime(event["end"], local_tz) > time_min
+    }
+
+    temporaneo = f"{mirror_path}.tmp"
+    with open(temporaneo, "w", encoding="utf-8") as file:
+        json.dump(mirror, file, ensure_ascii=False)
+    os.replace(temporaneo, mirror_path)
+
+
+def fascia_oraria(giorno: datetime.date, local_tz: ZoneInfo) -> tuple:
+    """
+    Restituisce l'inizio (08:40) e la fine (17:40) della fascia oraria delle lezioni di un giorno.
+
+    Args:
+        giorno (datetime.date): Giorno di cui calcolare la fascia.
+        local_tz (ZoneInfo): Fuso orario locale.
+
+    Returns:
+        tuple: Coppia (inizio, fine) di datetime con fuso orario.
+    """
+    inizio = datetime.datetime(giorno.year, giorno.month, giorno.day, 8, 40, 0, tzinfo=local_tz)
+    fine = datetime.datetime(giorno.year, giorno.month, giorno.day, 17, 40, 0, tzinfo=local_tz)
+    return inizio, fine
+
+
+def event_datetime(edge: dict, local_tz: ZoneInfo) -> datetime.datetime:
+    """
+    Converte il campo "start" o "end" di un evento Google in un datetime con fuso orario.
+    Gli eventi di un giorno intero ("date") partono dalla mezzanotte locale.
+
+    Args:
+        edge (dict): Campo "start" o "end" dell'evento.
+        local_tz (ZoneInfo): Fuso orario locale.
+
+    Returns:
+        datetime.datetime: Istante dell'evento con fuso orario.
+    """
+    if "dateTime" in edge:
+        value = datetime.datetime.fromisoformat(edge["dateTime"])
+        return value if value.tzinfo else value.replace(tzinfo=local_tz)
+
+    giorno = datetime.date.fromisoformat(edge["date"])
+    return datetime.datetime(giorno.year, giorno.month, giorno.day, tzinfo=local_tz)
+
+
+def in_fascia_feriale(event: dict, start_date: datetime.date, end_date: datetime.date, local_tz: ZoneInfo) -> bool:
+    """
+    Verifica se un evento si sovrappone alla fascia 08:40-17:40 di almeno un giorno feriale dell'intervallo,
+    con la stessa semantica di timeMin/timeMax dell'API (fine evento > inizio fascia, inizio evento < fine fascia).
+
+    Args:
+        event (dict): Evento di Google Calendar.
+        start_date (datetime.date): Primo giorno dell'intervallo.
+        end_date (datetime.date): Ultimo giorno dell'intervallo (incluso).
+        local_tz (ZoneInfo): Fuso orario locale.
+
+    Returns:
+        bool: True se l'evento cade in una fascia feriale dell'intervallo.
+    """
+    return istanti_in_fascia(event_datetime(event["start"], local_tz), event_datetime(event["end"], local_tz),
+                             start_date, end_date, local_tz)
+
+
+def istanti_in_fascia(ev_start: datetime.datetime, ev_end: datetime.datetime, start_date: datetime.date,
+                      end_date: datetime.date, local_tz: ZoneInfo) -> bool:
+    """
+    Come `in_fascia_feriale`, per inizio e fine già convertiti (es. `eventi.EventoGeop.istanti`).
+    """
+    giorno = max(start_date, ev_start.astimezone(local_tz).date())
+    ultimo = min(end_date, ev_end.astimezone(local_tz).date())
+
+    while giorno <= ultimo:
+        # salta i weekend (Saturday = 5, Sunday = 6)
+        if giorno.weekday() < 5:
+            inizio, fine = fascia_oraria(giorno, local_tz)
+            if ev_start < fine and ev_end > inizio:
+                return True
+        giorno += datetime.timedelta(days=1)
+
+    return False
+
+
+def in_intervallo(event: dict, start_date: datetime.date, end_date: datetime.date, local_tz: ZoneInfo) -> bool:
+    """
+    Verifica se un evento si sovrappone ai giorni interi dell'intervallo, weekend compresi:
+    è il filtro del calendario dedicato, dove ogni evento appartiene a GEOP.
+    """
+    return istanti_in_intervallo(event_datetime(event["start"], local_tz), event_datetime(event["end"], local_tz),
+                                 start_date, end_date, local_tz)
+
+
+def istanti_in_intervallo(ev_start: datetime.datetime, ev_end: datetime.datetime, start_date: datetime.date,
+                          end_date: datetime.date, local_tz: ZoneInfo) -> bool:
+    """
+    Come `in_intervallo`, per inizio e fine già convertiti.
+    """
+    inizio, fine = limiti_lettura(start_date, end_date, local_tz, dedicato=True)
+    return ev_start < fine and ev_end > inizio
+
+
+def evento_geop(event: dict, start_date: datetime.date, end_date: datetime.date, local_tz: ZoneInfo) -> bool:
+    """
+    Verifica se un evento di un calendario condiviso con eventi personali (es. "primary") è un evento GEOP
+    dell'intervallo: summary con uno dei `PREFISSI_GEOP` e sovrapposizione con una fascia feriale.
+    """
+    return event.get("summary", "").startswith(PREFISSI_GEOP) and in_fascia_feriale(event, start_date, end_date, local_tz)
+
+
+def limiti_lettura(start_date: datetime.date, end_date: datetime.date, local_tz: ZoneInfo, dedicato: bool = False) -> tuple:
+    """
+    Restituisce timeMin e timeMax (con fuso orario) della lettura di Google Calendar: dalle 08:40 del primo giorno
+    alle 17:40 dell'ultimo o, con il calendario dedicato, dalla mezzanotte del primo giorno a quella dopo l'ultimo.
+    """
+    if not dedicato:
+        return fascia_oraria(start_date, local_tz)[0], fascia_oraria(end_date, local_tz)[1]
+    inizio = datetime.datetime(start_date.year, start_date.month, start_date.day, tzinfo=local_tz)
+    giorno_dopo = end_date + datetime.timedelta(days=1)
+    return inizio, datetime.datetime(giorno_dopo.year, giorno_dopo.month, giorno_dopo.day, tzinfo=local_tz)
+
+
+def add_calendar(creds: Credentials, event: dict): # aggiunge singolarmente perché gestisco i loop meglio se ci sono condizioni
+    """
+    Aggiunge un singolo evento a Google Calendar.
+
+    Args:
+        creds (Credentials): Credenziali per l'accesso all'API di Google Calendar.
+        event (dict): Dizionario contenente i dati dell'evento da aggiungere.\n 
+                    Il dizionario verrà formattato tramite `parser.format_event`.
+    """
+    service = get_service(creds)
+    esegui_mutazione(mutazione_add(service, event))
 
 
 def delete_calendar(creds: Credentials, event): # rimuove singolarmente
@@ -169,16 +707,8 @@ def delete_calendar(creds: Credentials, event): # rimuove singolarmente
         event (dict): Dizionario contenente i dettagli dell'evento da eliminare, 
                     incluso l'ID dell'evento.
     """
-    try:
-        service = build("calendar", "v3", credentials=creds)
-
-        evento = event.get('id')
-        service.events().delete(calendarId='primary', eventId=evento).execute()
-
-        print(f"Evento eliminato dal calendario: {event.get('summary', 'Senza titolo')} - {event['start'].get('dateTime', event['start'].get('date'))}")
-
-    except HttpError as error:
-        print(f"Errore durante l'eliminazione dell'evento '{event.get('summary', 'Senza titolo')}': {error}")
+    service = get_service(creds)
+    esegui_mutazione(mutazione_delete(service, event))
 
 
 def update_calendar(creds: Credentials, old_event: dict, new_event: dict): # aggiorna singolarmente
@@ -191,129 +721,787 @@ def update_calendar(creds: Credentials, old_event: dict, new_event: dict): # agg
         new_event (dict): Dizionario contenente i nuovi dati dell'evento che verrà utilizzato per l'aggiornamento.\n
                         Il dizionario verrà formattato tramite `parser.format_event`.
     """
-    try:
-        service = build("calendar", "v3", credentials=creds)
+    service = get_service(creds)
+    esegui_mutazione(mutazione_update(service, old_event, new_event))
+
+
+# numero massimo di richieste per singola chiamata batch consigliato per l'API Calendar
+MAX_BATCH = 50
+
+# richieste batch inviate contemporaneamente da una sincronizzazione (le quote restano quelle di scheduler)
+SCRITTURE_PARALLELE = 4
+
+# messaggi di log per operazione: (esito positivo, descrizione in caso di errore)
+_DESCRIZIONI = {
+    "insert": ("Evento creato", "il caricamento dell'evento"),
+    "update": ("Evento aggiornato dal calendario", "l'aggiornamento dell'evento"),
+    "patch": ("Evento aggiornato dal calendario", "l'aggiornamento dell'evento"),
+    "delete": ("Evento eliminato dal calendario", "l'eliminazione dell'evento"),
+    "move": ("Evento spostato nel calendario dedicato", "lo spostamento dell'evento"),
+}
+
+
+
+def mutazione_add(service, event: dict, calendar_id: str = "primary") -> dict:
+    """
+    Prepara (senza eseguirla) la richiesta di inserimento di un evento GEOP.
+
+    Args:
+        service: Client dell'API di Google Calendar.
+        event (dict | eventi.EventoGeop): Evento di calendar.json, formattato tramite `parser.format_event`
+                        (per un record, il corpo già calcolato).
+        calendar_id (str): Calendario di destinazione.
+
+    Returns:
+        dict: Mutazione con le chiavi "operazione", "richiesta" e "descrizione".
+    """
+    body = event.body if isinstance(event, eventi.EventoGeop) else parser.format_event(event)
+    return {
+        "operazione": "insert",
+        "richiesta": service.events().insert(calendarId=calendar_id, body=body, **campi(CAMPI_SCRITTURA)),
+        "descrizione": f"{body['summary']} - {body['start']['dateTime']}",
+    }
+
+
+def mutazione_delete(service, event: dict, calendar_id: str = "primary") -> dict:
+    """
+    Prepara (senza eseguirla) la richiesta di eliminazione di un evento Google.
+
+    Args:
+        service: Client dell'API di Google Calendar.
+        event (dict): Evento di Google Calendar, incluso l'ID.
+        calendar_id (str): Calendario che contiene l'evento.
+
+    Returns:
+        dict: Mutazione con le chiavi "operazione", "richiesta" e "descrizione".
+    """
+    return {
+        "operazione": "delete",
+        # events.delete risponde 204 senza corpo: non c'è nulla da ridurre con fields
+        "richiesta": service.events().delete(calendarId=calendar_id, eventId=event.get("id")),
+        "descrizione": f"{event.get('summary', 'Senza titolo')} - {event['start'].get('dateTime', event['start'].get('date'))}",
+    }
+
+
+def mutazione_update(service, old_event: dict, new_event: dict, calendar_id: str = "primary") -> dict:
+    """
+    Prepara (senza eseguirla) la richiesta di aggiornamento di un evento Google con i dati GEOP.
+
+    Args:
+        service: Client dell'API di Google Calendar.
+        old_event (dict): Evento di Google Calendar da aggiornare, incluso l'ID.
+        new_event (dict): Evento di calendar.json, formattato tramite `parser.format_event`.
+        calendar_id (str): Calendario che contiene l'evento.
+
+    Returns:
+        dict: Mutazione con le chiavi "operazione", "richiesta" e "descrizione".
+    """
+    return {
+        "operazione": "update",
+        "richiesta": service.events().update(
+            calendarId=calendar_id, eventId=old_event.get("id"), body=parser.format_event(new_event), **campi(CAMPI_SCRITTURA)
+        ),
+        "descrizione": f"{old_event.get('summary', 'Senza titolo')} - {old_event['start'].get('dateTime', old_event['start'].get('date'))}",
+    }
+
+
+def mutazione_patch(service, old_event: dict, patch: dict, calendar_id: str = "primary") -> dict:
+    """
+    Prepara (senza eseguirla) la richiesta events.patch che modifica solo i campi indicati.
+
+    Args:
+        service: Client dell'API di Google Calendar.
+        old_event (dict): Evento di Google Calendar da aggiornare, incluso l'ID.
+        patch (dict): Campi da modificare, calcolati da `diffengine.differenze`.
+        calendar_id (str): Calendario che contiene l'evento.
+
+    Returns:
+        dict: Mutazione con le chiavi "operazione", "richiesta" e "descrizione".
+    """
+    return {
+        "operazione": "patch",
+        "richiesta": service.events().patch(
+            calendarId=calendar_id, eventId=old_event.get("id"), body=patch, **campi(CAMPI_SCRITTURA)
+        ),
+        "descrizione": f"{old_event.get('summary', 'Senza titolo')} - {old_event['start'].get('dateTime', old_event['start'].get('date'))}",
+    }
+
+
+def mutazione_move(service, event: dict, origine: str, destinazione: str) -> dict:
+    """
+    Prepara (senza eseguirla) la richiesta events.move che sposta un evento in un altro calendario
+    conservandone id, dati e tag geopId.
+
+    Args:
+        service: Client dell'API di Google Calendar.
+        event (dict): Evento di Google Calendar, incluso l'ID.
+        origine (str): Calendario che contiene l'evento.
+        destinazione (str): Calendario di destinazione.
+
+    Returns:
+        dict: Mutazione con le chiavi "operazione", "richiesta" e "descrizione".
+    """
+    return {
+        "operazione": "move",
+        "richiesta": service.events().move(
+            calendarId=origine, eventId=event.get("id"), destination=destinazione, **campi(CAMPI_SCRITTURA)
+        ),
+        "descrizione": f"{event.get('summary', 'Senza titolo')} - {event['start'].get('dateTime', event['start'].get('date'))}",
+    }
+
+
+def _esito_mutazione(mutazione: dict, risposta, errore, stats: dict):
+    """
+    Registra e stampa l'esito di una singola mutazione, sia eseguita da sola sia all'interno di un batch.
+    Se la mutazione ha la chiave "dopo" (funzione), questa viene chiamata con la risposta in caso di successo.
+    """
+    operazione = mutazione["operazione"]
+
+    # un evento già eliminato su Google (404/410) è il risultato voluto da una delete; per una move significa
+    # che l'evento è già stato spostato (migrazione interrotta) o eliminato, e la sincronizzazione lo ricreerà
+    gia_eliminato = (operazione in ("delete", "move") and isinstance(errore, HttpError) and errore.resp.status in (404, 410))
+
+    if errore is not None and not gia_eliminato:
+        stats["errori"] += 1
+        metrics.conta("modifiche_total", operazione=operazione, esito="errore")
+        metrics.log(f"Errore durante {_DESCRIZIONI[operazione][1]} '{mutazione['descrizione']}': {errore}", "errore")
+        return
+
+    stats["ok"] += 1
+    metrics.conta("modifiche_total", operazione=operazione, esito="ok")
+    if mutazione.get("dopo"):
+        mutazione["dopo"](risposta or {})
+
+    if operazione == "insert":
+        metrics.log(f"Evento creato: {risposta.get('htmlLink')}", "evento")
+    else:
+        metrics.log(f"{_DESCRIZIONI[operazione][0]}: {mutazione['descrizione']}", "evento")
+
+
+def esegui_mutazione(mutazione: dict, utente: str = None, tentativi: int = scheduler.TENTATIVI) -> dict:
+    """
+    Esegue subito una singola mutazione con una richiesta HTTP dedicata, rispettando le quote di
+    `scheduler` e ripetendola con backoff esponenziale se Google la limita (403 rateLimitExceeded, 429, 5xx).
+
+    Args:
+        mutazione (dict): Mutazione preparata da `mutazione_add`, `mutazione_update` o `mutazione_delete`.
+        utente (str): Utente a cui addebitare la richiesta nella quota per utente.
+        tentativi (int): Numero massimo di ripetizioni dopo il primo invio.
+
+    Returns:
+        dict: Statistiche con le chiavi "ok", "errori" e "riprovate".
+    """
+    stats = {"ok": 0, "errori": 0, "riprovate": 0}
+    for tentativo in range(tentativi + 1):
+        scheduler.acquisisci(1, utente)
+        metrics.conta("chiamate_api_total", servizio="google", metodo=f"events.{mutazione['operazione']}")
+        try:
+            risposta = mutazione["richiesta"].execute()
+            _esito_mutazione(mutazione, risposta, None, stats)
+            break
+        except HttpError as error:
+            if tentativo == tentativi or not scheduler.da_riprovare(error):
+                _esito_mutazione(mutazione, None, error, stats)
+                break
+            attesa = scheduler.attesa_backoff(tentativo)
+            metrics.log(f"Google ha limitato la richiesta '{mutazione['descrizione']}', nuovo tentativo tra {attesa:.1f} s.")
+            stats["riprovate"] += 1
+            time.sleep(attesa)
+    return stats
+
+
+def esegui_batch(service, mutazioni: list, dimensione: int = MAX_BATCH, utente: str = None,
+                 tentativi: int = scheduler.TENTATIVI, paralleli: int = 1) -> dict:
+    """
+    Invia le mutazioni a Google Calendar raggruppate in richieste batch da al massimo `dimensione` elementi,
+    fino a `paralleli` richieste batch contemporaneamente.
+
+    Ogni sotto-richiesta ha la propria callback: un errore su un evento non blocca gli altri.
+    Prima di ogni batch si attendono i gettoni di `scheduler` (una sotto-richiesta vale una richiesta);
+    le sotto-richieste limitate da Google vengono raccolte e reinviate con backoff esponenziale e jitter.
+    Quelle ancora limitate dopo `tentativi` ripetizioni non sono errori: vengono restituite in "rinviate"
+    perché il chiamante le riproponga al ciclo successivo.
+
+    Gli esiti (e le funzioni "dopo" delle mutazioni) sono elaborati nel thread chiamante, nell'ordine
+    delle mutazioni, anche quando i batch viaggiano in parallelo: l'indice SQLite non va usato da altri thread.
+
+    Args:
+        service: Client dell'API di Google Calendar.
+        mutazioni (list): Lista di mutazioni da inviare.
+        dimensione (int): Numero massimo di sotto-richieste per batch.
+        utente (str): Utente a cui addebitare le richieste nella quota per utente.
+        tentativi (int): Numero massimo di ripetizioni delle sotto-richieste limitate.
+        paralleli (int): Numero massimo di richieste batch in volo contemporaneamente.
+
+    Returns:
+        dict: Statistiche con le chiavi "mutazioni", "richieste_http", "risparmiate", "ok", "errori",
+              "riprovate" e "rinviate" (lista delle mutazioni non inviate).
+    """
+    stats = {"mutazioni": len(mutazioni), "richieste_http": 0, "risparmiate": 0, "ok": 0, "errori": 0,
+             "riprovate": 0, "rinviate": []}
+    da_inviare = list(mutazioni)
+
+    for tentativo in range(tentativi + 1):
+        limitate = []
+        blocchi = [da_inviare[inizio:inizio + dimensione] for inizio in range(0, len(da_inviare), dimensione)]
+
+        if paralleli > 1 and len(blocchi) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=paralleli, thread_name_prefix="batch") as pool:
+                inviati = list(pool.map(lambda blocco: _invia_blocco(service, blocco, utente, _http_thread(service)), blocchi))
+        else:
+            inviati = [_invia_blocco(service, blocco, utente) for blocco in blocchi]
+
+        for blocco, (esiti, errore_batch) in zip(blocchi, inviati):
+            stats["richieste_http"] += 1
+            if errore_batch is not None:
+                # errore dell'intera richiesta batch: nessuna sotto-richiesta è stata applicata
+                if scheduler.da_riprovare(errore_batch):
+                    limitate.extend(blocco)
+                else:
+                    stats["errori"] += len(blocco)
+                    for mutazione in blocco:
+                        metrics.conta("modifiche_total", operazione=mutazione["operazione"], esito="errore")
+                    metrics.log(f"Errore durante l'invio del batch di {len(blocco)} modifiche: {errore_batch}", "errore")
+                continue
+
+            for mutazione, risposta, errore in esiti:
+                if errore is not None and scheduler.da_riprovare(errore):
+                    limitate.append(mutazione)
+                else:
+                    _esito_mutazione(mutazione, risposta, errore, stats)
+
+        if not limitate or tentativo == tentativi:
+            break
+
+        attesa = scheduler.attesa_backoff(tentativo)
+        metrics.log(f"Google ha limitato {len(limitate)} modifiche, nuovo tentativo tra {attesa:.1f} s.")
+        stats["riprovate"] += len(limitate)
+        time.sleep(attesa)
+        da_inviare = limitate
+
+    stats["rinviate"] = limitate
+    for mutazione in limitate:
+        metrics.conta("modifiche_total", operazione=mutazione["operazione"], esito="rinviata")
+    stats["risparmiate"] = max(0, stats["mutazioni"] - stats["richieste_http"])
+    return stats
+
 
-        event_id = old_event.get('id')
-        new_event = parser.format_event(new_event)
+def _invia_blocco(service, blocco: list, utente: str, http=None) -> tuple:
+    """
+    Invia un blocco di mutazioni in un'unica richiesta batch, dopo aver atteso i gettoni di `scheduler`.
+
+    Returns:
+        tuple: (lista di terne (mutazione, risposta, errore) nell'ordine del blocco,
+                HttpError dell'intera richiesta batch o None).
+    """
+    esiti = [None] * len(blocco)
 
-        service.events().update(calendarId='primary', eventId=event_id, body=new_event).execute()
+    def callback(request_id, risposta, errore):
+        indice = int(request_id)
+        esiti[indice] = (blocco[indice], risposta, errore)
 
-        print(f"Evento aggiorato dal calendario: {old_event.get('summary', 'Senza titolo')} - {old_event['start'].get('dateTime', old_event['start'].get('date'))}")
+    batch = service.new_batch_http_request(callback=callback)
+    for indice, mutazione in enumerate(blocco):
+        batch.add(mutazione["richiesta"], request_id=str(indice))
 
+    scheduler.acquisisci(len(blocco), utente)
+    metrics.conta("chiamate_api_total", servizio="google", metodo="batch")
+    for mutazione in blocco:
+        metrics.conta("chiamate_api_total", servizio="google", metodo=f"events.{mutazione['operazione']}")
+    try:
+        batch.execute(http=http)
     except HttpError as error:
-        print(f"Errore durante l'aggiornamento dell'evento '{old_event.get('summary', 'Senza titolo')}': {error}")
+        return [], error
+
+    return [esito for esito in esiti if esito is not None], None
 
 
-def sync_calendar(creds: Credentials, date_info: dict):
+_http_locale = threading.local()
+
+
+def _http_thread(service):
+    """
+    Connessione HTTP del thread corrente per le richieste batch di `service`: httplib2 non è thread-safe,
+    quindi ogni thread del pool ne usa una propria, con le stesse credenziali del client.
+    """
+    connessioni = getattr(_http_locale, "connessioni", None)
+    if connessioni is None:
+        connessioni = _http_locale.connessioni = {}
+
+    http = connessioni.get(id(service))
+    if http is None:
+        with _services_lock:
+            creds = _credenziali_client.get(service)
+        # un client non costruito da get_service (es. gli stand-in dei benchmark) non ha credenziali
+        http = traccia.http(httplib2.Http())
+        if creds is not None:
+            http = AuthorizedHttp(creds, http=http)
+        connessioni[id(service)] = http
+    return http
+
+
+def chiave_google(event: dict, local_tz: ZoneInfo) -> tuple:
+    """
+    Restituisce la chiave (prefisso del summary, inizio in ora locale) di un evento Google, nello stesso
+    formato di `parser.chiave_evento`. Serve solo a riconoscere gli eventi creati prima dell'indice locale.
+    L'inizio viene convertito nel fuso locale, quindi funziona con qualunque offset (anche "Z" o negativo).
+    """
+    prefix = event.get("summary", "").split(" - ")[0].strip()
+    inizio = event_datetime(event["start"], local_tz).astimezone(local_tz).replace(tzinfo=None)
+    return (prefix, inizio.isoformat())
+
+
+def sync_calendar(creds: Credentials, date_info: dict, incrementale: bool = True, chiavi: set = None,
+                  calendar_path: str = "calendar.json", mirror_path: str = GOOGLE_MIRROR, calendar_id: str = "primary",
+                  state_path: str = statestore.STATE_DB, utente: str = None, google_events: list = None,
+                  paralleli: int = None, dedicato: bool = False, eventi_geop: list = None) -> bool:
     """
     Sincronizza gli eventi tra il file calendar.json e il calendario Google per l'intervallo di date specificato.
 
+    Gli eventi GEOP sono record `eventi.EventoGeop`: corpo Google, impronta e chiave si calcolano una volta
+    per evento, inizio e fine sono già convertiti.
+
+    Ogni evento GEOP è associato al suo evento Google tramite l'indice locale `statestore.StateStore`
+    (id GEOP -> id Google, etag e impronta del corpo inviato) e il tag extendedProperties.private.geopId.
+
     Se un evento presente su Google Calendar non è presente in calendar.json, viene eliminato.
     Se un evento presente in calendar.json non è presente su Google Calendar, viene aggiunto.
+    Se un evento esiste in entrambi, il corpo calcolato da `parser.format_event` viene confrontato campo per campo
+    (`diffengine.differenze`) con l'evento letto da Google o, se Google non viene letto, con l'ultimo corpo inviato:
+    con events.patch vengono inviati solo i campi cambiati e gli eventi già allineati non vengono scritti.
 
-    Inoltre:
-      - Se nel file JSON la chiave "tooltip" è passata da "Registro lezione..." a "PRESENTE" o "ASSENTE"
-        e nell'evento Google Calendar la "description" inizia con "Registro lezione da compilare", l'evento viene aggiornato.
-      - Se il valore di "Aula" nel JSON differisce dalla "location" in Google Calendar, l'evento viene aggiornato.
+    Gli eventi senza tag (creati prima dell'indice) sono riconosciuti da prefisso del summary e inizio.
+    Con il calendario dedicato (`dedicato`) ogni evento dell'intervallo appartiene a GEOP: quelli senza
+    corrispondenza in calendar.json vengono eliminati qualunque sia il titolo.
+
+    Con una sincronizzazione parziale (`chiavi`) e un indice già popolato, l'indice è considerato affidabile
+    e Google non viene letto affatto.
+
+    Le modifiche vengono prima raccolte in una lista di mutazioni e poi inviate con `esegui_batch`, che rispetta
+    le quote di `scheduler`. Le modifiche che Google continua a limitare vengono salvate nella coda dell'indice
+    e riproposte al ciclo successivo: non sono errori e non vanno perse.
     
     Args:
         creds (Credentials): Credenziali per accedere all'API di Google Calendar.
         date_info (dict): Dizionario contenente le date di inizio "start" e fine "end" 
                         dell'intervallo da sincronizzare in formato YYYY-MM-DD.
+        incrementale (bool): Se True legge Google Calendar con `read_calendar_incrementale` (solo le modifiche),
+                        altrimenti rilegge l'intero intervallo con `read_calendar`.
+        chiavi (set): Se indicato, riconcilia solo gli eventi con questi id GEOP,
+                        cioè quelli aggiunti, modificati o rimossi su GEOP secondo `parser.confronta_snapshot`.
+        calendar_path (str): File con gli eventi GEOP elaborati (calendar.json o calendar.bin).
+        mirror_path (str): File della copia locale usata dalla lettura incrementale.
+        calendar_id (str): Calendario Google da sincronizzare.
+        state_path (str): Database SQLite dell'indice locale.
+        utente (str): Utente a cui addebitare le scritture nella quota per utente (calendar_id se None).
+        google_events (list): Eventi Google già letti con `lettura_google` (es. in parallelo alla lettura di GEOP);
+                        se None e la lettura serve, vengono letti qui. Ignorati se Google non va letto.
+        paralleli (int): Richieste batch inviate contemporaneamente (`SCRITTURE_PARALLELE` se None).
+        dedicato (bool): True se `calendar_id` è il calendario dedicato (vedi `prepara_calendario_dedicato`).
+        eventi_geop (list): Record già letti da `calendar_path` (`eventi.leggi`); se None vengono letti qui.
+
+    Returns:
+        bool: True se la sincronizzazione è terminata senza errori (le modifiche rinviate non sono errori).
     """
     try:
-        # legge gli eventi in calendar.json e li organizza in un dizionario
-        # la chiave del dizionario è una tupla composta da (prefisso, start), che permette di identificare univocamente ogni evento.
-        calendar_events = parser.read_json("calendar.json")
-        calendar_dict = {}
-
-        for ev in calendar_events:
-            materia = ev.get("Materia", "")
-
-            if materia:
-                # ottiene il prefisso dall'attributo "Materia" (es: "UFS02")
-                prefix = materia.split(" - ")[0].strip()
-                # ottiene l'orario di inizio dell'evento (es: "2025-03-25T08:40:00")
-                start = ev.get("start")                  
-                # salva l'evento nel dizionario con la chiave (prefix, start)
-                calendar_dict[(prefix, start)] = ev
+        local_tz = ZoneInfo("Europe/Rome")
+        service = get_service(creds)
+        mutazioni = []
+        statistiche_campi = diffengine.StatisticheCampi()
+
+        # legge gli eventi in calendar.json e li organizza per id GEOP
+        if eventi_geop is None:
+            eventi_geop = eventi.leggi(calendar_path)
+        calendar_dict = {ev.id: ev for ev in eventi_geop}
+
+        with statestore.StateStore(state_path) as store:
+            # gli eventi iniziati prima dell'intervallo non vengono più sincronizzati
+            store.pota(calendar_id, date_info["start"])
+            indice = store.eventi(calendar_id)
+
+            # modifiche rinviate dai cicli precedenti: i loro eventi vanno riconciliati anche se GEOP non è cambiato
+            coda = store.coda(calendar_id)
+            if coda:
+                metrics.log(f"{len(coda)} modifiche rinviate dal ciclo precedente da riprovare.")
+                if chiavi is not None:
+                    chiavi = set(chiavi) | {voce["chiave"] for voce in coda if not voce["chiave"].startswith("google:")}
+
+            def registra(geop_id, ev, google_id=None):
+                def dopo(risposta):
+                    store.registra(calendar_id, geop_id, risposta.get("id", google_id), risposta.get("etag"),
+                                   ev.impronta, ev.body["summary"], ev.start, json.dumps(ev.body, ensure_ascii=False))
+                return dopo
+
+            def rimuovi(geop_id):
+                return lambda risposta: store.rimuovi(calendar_id, geop_id)
+
+            leggi_google = chiavi is None or not indice
+
+            # evento Google ricostruito dall'indice, per quando Google non viene letto:
+            # per questi eventi non si possono confrontare i campi letti da Google
+            dall_indice = set()
+
+            def da_indice(riga):
+                dall_indice.add(riga["geop_id"])
+                return {"id": riga["google_id"], "summary": riga["summary"], "start": {"dateTime": riga["start"]}}
+
+            if leggi_google:
+                if google_events is None:
+                    google_events = lettura_google(creds, date_info, incrementale, mirror_path, calendar_id, dedicato)
+                google_per_geop, da_eliminare = _associa_eventi_google(google_events, calendar_dict, indice, local_tz)
+                da_controllare = calendar_dict.keys()
+
+                start_date = datetime.date.fromisoformat(date_info["start"])
+                end_date = datetime.date.fromisoformat(date_info["end"])
+
+                for geop_id in indice.keys() - google_per_geop.keys():
+                    ev = calendar_dict.get(geop_id)
+                    if ev is None:
+                        continue
+                    # la lettura vede solo la fascia 08:40-17:40 dei giorni feriali (i giorni interi con il
+                    # calendario dedicato): fuori da lì vale l'indice
+                    visibile = istanti_in_intervallo if dedicato else istanti_in_fascia
+                    if not visibile(*ev.istanti, start_date, end_date, local_tz):
+                        google_per_geop[geop_id] = da_indice(indice[geop_id])
+                    else:
+                        # l'evento Google non esiste più (es. eliminato a mano): verrà ricreato
+                        store.rimuovi(calendar_id, geop_id)
+                        del indice[geop_id]
+            else:
+                # indice affidabile: l'esistenza su Google si deduce dall'indice, nessuna lettura
+                google_per_geop = {geop_id: da_indice(riga) for geop_id, riga in indice.items()}
+                da_controllare = chiavi
+                da_eliminare = [
+                    (geop_id, google_per_geop[geop_id]) for geop_id in chiavi
+                    if geop_id not in calendar_dict and geop_id in google_per_geop
+                    and date_info["start"] <= (indice[geop_id]["start"] or "") < date_info["end"]
+                ]
+
+            # riconciliazione: confronto e preparazione delle mutazioni, senza richieste a Google
+            inizio_riconciliazione = time.perf_counter()
+
+            for geop_id in da_controllare:
+                ev = calendar_dict.get(geop_id)
+                if ev is None:
+                    continue
+
+                body = ev.body
+                event = google_per_geop.get(geop_id)
+
+                if event is None:
+                    # evento presente nel JSON ma non su Google Calendar: va aggiunto
+                    metrics.log(f"Evento {ev.title or geop_id} presente in calendar.json ma mancante su Google Calendar; verrà aggiunto.", "evento")
+                    mutazione = mutazione_add(service, ev, calendar_id)
+                    mutazione["chiave"] = geop_id
+                    mutazione["dopo"] = registra(geop_id, ev)
+                    mutazioni.append(mutazione)
+                    continue
+
+                riga = indice.get(geop_id)
+
+                if geop_id not in dall_indice:
+                    # confronto con l'evento letto da Google: copre tooltip, aula, docente, argomento,
+                    # colore, orari e il tag geopId degli eventi creati prima dell'indice
+                    patch = diffengine.differenze(body, event, local_tz)
+                elif riga["impronta"] == ev.impronta:
+                    patch = {}
+                elif riga["body"]:
+                    # indice affidabile: confronto con l'ultimo corpo inviato
+                    patch = diffengine.differenze(body, json.loads(riga["body"]), local_tz)
+                else:
+                    # riga senza corpo salvato (indice precedente): si invia tutto
+                    patch = body
+
+                if patch:
+                    statistiche_campi.registra(patch)
+                    metrics.log(f"{event.get('summary', '')} con start {ev.start} necessita aggiornamento: {', '.join(patch)}.", "evento")
+                    mutazione = mutazione_patch(service, event, patch, calendar_id)
+                    mutazione["chiave"] = geop_id
+                    mutazione["dopo"] = registra(geop_id, ev, event["id"])
+                    mutazioni.append(mutazione)
+                elif riga is None or riga["google_id"] != event["id"] or riga["impronta"] != ev.impronta:
+                    # già allineato su Google: basta aggiornare l'indice, nessuna scrittura
+                    registra(geop_id, ev, event["id"])({"etag": event.get("etag")})
+
+            for geop_id, event in da_eliminare:
+                # se l'evento è presente in Google Calendar, ma non nel file JSON, allora va eliminato
+                metrics.log(f"{event.get('summary', '')} con start {event['start'].get('dateTime', event['start'].get('date'))} non è presente in calendar.json e verrà eliminato.", "evento")
+                mutazione = mutazione_delete(service, event, calendar_id)
+                mutazione["chiave"] = geop_id if geop_id is not None else f"google:{event['id']}"
+                if geop_id is not None:
+                    mutazione["dopo"] = rimuovi(geop_id)
+                mutazioni.append(mutazione)
+
+            # eventi Google senza id GEOP (es. duplicati) la cui eliminazione era stata rinviata:
+            # una sincronizzazione parziale non li ritroverebbe
+            gia_presenti = {mutazione["chiave"] for mutazione in mutazioni}
+            for voce in coda:
+                if voce["chiave"].startswith("google:") and voce["chiave"] not in gia_presenti:
+                    mutazione = mutazione_delete(service, {"id": voce["chiave"].removeprefix("google:"), "start": {}}, calendar_id)
+                    mutazione["chiave"] = voce["chiave"]
+                    mutazione["descrizione"] = voce["descrizione"]
+                    mutazioni.append(mutazione)
+
+            metrics.registra_tempo("riconciliazione", time.perf_counter() - inizio_riconciliazione)
+
+            errori = 0
+            rinviate = []
+            if mutazioni:
+                with metrics.fase("scrittura"):
+                    stats = esegui_batch(service, mutazioni, utente=utente or calendar_id,
+                                         paralleli=SCRITTURE_PARALLELE if paralleli is None else paralleli)
+                errori = stats["errori"]
+                rinviate = stats["rinviate"]
+                metrics.log(
+                    f"Modifiche inviate: {stats['mutazioni']} ({stats['ok']} riuscite, {stats['errori']} errori, "
+                    f"{len(rinviate)} rinviate) in {stats['richieste_http']} richieste HTTP "
+                    f"({stats['risparmiate']} risparmiate, {stats['riprovate']} ripetute per i limiti di Google)."
+                )
+                metrics.log(f"Campi aggiornati: {statistiche_campi}")
+
+            # la coda contiene solo ciò che Google ha limitato anche dopo i tentativi di questo ciclo
+            for mutazione in rinviate:
+                store.accoda(calendar_id, mutazione["chiave"], mutazione["operazione"], mutazione["descrizione"])
+            store.svuota_coda(calendar_id, {mutazione["chiave"] for mutazione in rinviate})
+            if rinviate:
+                metrics.log(f"{len(rinviate)} modifiche rinviate al prossimo ciclo per i limiti di Google.")
+
+        metrics.log("Sincronizzazione del calendario completata per l'intervallo specificato.")
+        return errori == 0
+
+    except Exception as error:
+        metrics.log(f"Errore durante la sincronizzazione del calendario: {error}", "errore")
+        return False
+
+
+def lettura_google(creds: Credentials, date_info: dict, incrementale: bool = True, mirror_path: str = GOOGLE_MIRROR,
+                   calendar_id: str = "primary", dedicato: bool = False) -> list:
+    """
+    Legge gli eventi GEOP presenti su Google Calendar nell'intervallo, con `read_calendar_incrementale`
+    o `read_calendar`. Non dipende dai dati GEOP: può essere eseguita in parallelo alla lettura di GEOP
+    e passata a `sync_calendar` con `google_events`.
 
+    Returns:
+        list: Eventi Google già filtrati per prefisso e fascia oraria (solo per intervallo con il calendario dedicato).
+
+    Raises:
+        RuntimeError: Se la lettura di Google Calendar non è riuscita.
+    """
+    with metrics.fase("google_read"):
         # legge gli eventi dal calendario Google (sono già filtrati per UFS/UFT) # aggiunta PW e Extra Orario
-        google_events = read_calendar(creds, date_info)
-        google_set = set()
-
-        for event in google_events:
-            # ottiene il prefisso dallo summary (es: "UFS02")
-            summary = event.get("summary", "")
-            prefix = summary.split(" - ")[0].strip()
-            # ottiene la data di inizio dell'evento (considera sia "dateTime" che "date")
-            g_start = event["start"].get("dateTime", event["start"].get("date"))
-
-            # normalizza la data eliminando eventuale parte del fuso orario dopo il simbolo "T"
-            if "T" in g_start:
-                g_start_normalized = g_start.split("+")[0]
-            else:
-                g_start_normalized = g_start
+        if incrementale:
+            google_events = read_calendar_incrementale(creds, date_info, mirror_path, calendar_id, dedicato)
+        else:
+            google_events = read_calendar(creds, date_info, calendar_id, dedicato)
 
-            # aggiunge la chiave (prefisso, start normalizzato) all'insieme degli eventi di Google
-            google_set.add((prefix, g_start_normalized))
+    if google_events is None:
+        raise RuntimeError("lettura di Google Calendar non riuscita")
+    return google_events
 
-        # gestione degli eventi esistenti su Google Calendar
-        for event in google_events:
-            summary = event.get("summary", "")
-            prefix = summary.split(" - ")[0].strip()
-            g_start = event["start"].get("dateTime", event["start"].get("date"))
 
-            if "T" in g_start:
-                g_start_normalized = g_start.split("+")[0]
-            else:
-                g_start_normalized = g_start
+def _associa_eventi_google(google_events, calendar_dict, indice, local_tz) -> tuple:
+    """
+    Associa gli eventi Google dell'intervallo agli eventi GEOP: prima con il tag geopId,
+    poi con l'id Google salvato nell'indice e, per gli eventi creati prima dell'indice, con la chiave
+    (prefisso, inizio). Gli eventi Google senza corrispondenza, o duplicati, vanno eliminati.
 
-            key = (prefix, g_start_normalized)
+    Returns:
+        tuple: (id GEOP -> evento Google, lista di coppie (id GEOP o None, evento Google) da eliminare).
+    """
+    per_google_id = {riga["google_id"]: geop_id for geop_id, riga in indice.items()}
+    per_chiave = {ev.chiave: geop_id for geop_id, ev in calendar_dict.items()}
 
-            if key in calendar_dict:
-                # se l'evento esiste nel JSON, ottiene il corrispondente evento dal file
-                json_event = calendar_dict[key]
-                # formatta l'evento dal JSON per ottenere i campi aggiornati
-                formatted_event = parser.format_event(json_event)
+    google_per_geop = {}
+    da_eliminare = []
 
-                # controlla se occorre aggiornare l'evento in base al tooltip
-                tooltip_json = json_event.get("tooltip", "")
-                description_google = event.get("description", "")
-                update_tooltip = (tooltip_json in ["PRESENTE", "ASSENTE"] and 
-                                  description_google.startswith("Registro lezione da compilare"))
+    for event in google_events:
+        geop_id = event.get("extendedProperties", {}).get("private", {}).get("geopId")
+        if geop_id is None:
+            geop_id = per_google_id.get(event["id"])
+        if geop_id is None:
+            geop_id = per_chiave.get(chiave_google(event, local_tz))
 
-                # controlla se occorre aggiornare l'evento in base alla location
-                location_json = formatted_event.get("location", "")
-                location_google = event.get("location", "")
-                update_location = (location_json != location_google)
+        if geop_id not in calendar_dict:
+            # non più presente su GEOP
+            da_eliminare.append((geop_id if geop_id in indice else None, event))
+            continue
 
-                if update_tooltip or update_location:
-                    print(f"{summary} con start {g_start} necessita aggiornamento (tooltip o aula modificati).")
-                    update_calendar(creds, event, json_event)
+        precedente = google_per_geop.get(geop_id)
+        if precedente is not None:
+            # copia duplicata dello stesso evento: si tiene quella registrata nell'indice
+            if geop_id in indice and event["id"] == indice[geop_id]["google_id"]:
+                precedente, event = event, precedente
+            da_eliminare.append((None, event))
+            event = precedente
 
-            else:
-                # se l'evento è presente in Google Calendar, ma non nel file JSON, allora va eliminato
-                print(f"{summary} con start {g_start} non è presente in calendar.json e verrà eliminato.")
-                delete_calendar(creds, event)
+        google_per_geop[geop_id] = event
 
-        # aggiunge gli eventi che sono presenti nel JSON ma non su Google Calendar
-        for key, ev in calendar_dict.items():
-            if key not in google_set:
-                print(f"Evento {ev.get('title', key)} presente in calendar.json ma mancante su Google Calendar; verrà aggiunto.")
-                add_calendar(creds, ev)
+    return google_per_geop, da_eliminare
 
-        print("Sincronizzazione del calendario completata per l'intervallo specificato.")
 
-    except Exception as error:
-        print(f"Errore durante la sincronizzazione del calendario: {error}")
+def prepara_calendario_dedicato(creds: Credentials, origine: str = "primary", config_path: str = statestore.CALENDARIO_CONFIG,
+                                state_path: str = statestore.STATE_DB, utente: str = None) -> str:
+    """
+    Crea il calendario dedicato agli eventi GEOP (o ritrova quello creato in precedenza) e vi sposta una volta
+    sola, con events.move, gli eventi GEOP del calendario di origine: quelli dell'indice locale e quelli con il
+    tag geopId, anche fuori dall'intervallo sincronizzato. Gli eventi senza tag restano nel calendario di origine
+    anche se il titolo inizia con un prefisso GEOP: potrebbero essere eventi personali.
+
+    L'id del calendario viene salvato in `config_path` (vedi `statestore.calendario_dedicato`) appena creato,
+    così un'interruzione non crea un secondo calendario; la migrazione risulta conclusa solo quando tutti
+    gli spostamenti sono riusciti, altrimenti riprende alla chiamata successiva.
+
+    Args:
+        creds (Credentials): Credenziali per accedere all'API di Google Calendar.
+        origine (str): Calendario da cui spostare gli eventi (il calendar_id usato finora).
+        config_path (str): File con l'id del calendario dedicato e lo stato della migrazione.
+        state_path (str): Database SQLite dell'indice locale.
+        utente (str): Utente a cui addebitare gli spostamenti nella quota per utente.
+
+    Returns:
+        str: Id del calendario dedicato.
+
+    Raises:
+        RuntimeError: Se alcuni eventi non sono stati spostati (la migrazione verrà ripresa).
+    """
+    service = get_service(creds)
+    config = statestore.leggi_calendario_dedicato(config_path)
+
+    calendar_id = config.get("id")
+    if calendar_id and config.get("migrato"):
+        return calendar_id
+
+    if not calendar_id:
+        calendar_id = _trova_o_crea_calendario(service)
+        statestore.salva_calendario_dedicato({"id": calendar_id, "origine": origine, "migrato": False}, config_path)
+
+    # una migrazione interrotta riprende dal calendario di origine registrato
+    origine = config.get("origine", origine)
+    _migra_eventi(service, origine, calendar_id, state_path, utente)
+    statestore.salva_calendario_dedicato({"id": calendar_id, "origine": origine, "migrato": True}, config_path)
+    return calendar_id
+
+
+def _trova_o_crea_calendario(service) -> str:
+    """
+    Cerca tra i calendari dell'utente quello dedicato (stesso summary e stessa descrizione) e, se non esiste, lo crea.
+    """
+    page_token = None
+    while True:
+        risposta = service.calendarList().list(
+            minAccessRole="owner", pageToken=page_token, **campi("nextPageToken,items(id,summary,description)")
+        ).execute()
+        metrics.conta("chiamate_api_total", servizio="google", metodo="calendarList.list")
+        for calendario in risposta.get("items", []):
+            if calendario.get("summary") == CALENDARIO_DEDICATO and calendario.get("description") == DESCRIZIONE_DEDICATO:
+                metrics.log(f"Trovato il calendario dedicato {CALENDARIO_DEDICATO} ({calendario['id']}).")
+                return calendario["id"]
+        page_token = risposta.get("nextPageToken")
+        if not page_token:
+            break
+
+    calendario = service.calendars().insert(
+        body={"summary": CALENDARIO_DEDICATO, "description": DESCRIZIONE_DEDICATO, "timeZone": "Europe/Rome"},
+        **campi("id"),
+    ).execute()
+    metrics.conta("chiamate_api_total", servizio="google", metodo="calendars.insert")
+    metrics.log(f"Creato il calendario dedicato {CALENDARIO_DEDICATO} ({calendario['id']}).")
+    return calendario["id"]
+
+
+def _migra_eventi(service, origine: str, destinazione: str, state_path: str, utente: str):
+    """
+    Sposta gli eventi GEOP da `origine` a `destinazione` e aggiorna di conseguenza l'indice e la coda.
+    """
+    with statestore.StateStore(state_path) as store:
+        indice = store.eventi(origine)
+        per_google_id = {riga["google_id"]: geop_id for geop_id, riga in indice.items()}
+
+        # lettura unica dell'intero calendario di origine: il tag non si può cercare per sola presenza
+        eventi, _ = _list_eventi(service, origine)
+
+        def sposta(geop_id):
+            return lambda risposta: store.sposta(origine, destinazione, geop_id, risposta.get("etag"))
+
+        mutazioni = []
+        for event in eventi:
+            geop_id = event.get("extendedProperties", {}).get("private", {}).get("geopId")
+            if geop_id is None:
+                geop_id = per_google_id.get(event["id"])
+            if geop_id is None:
+                continue
+            mutazione = mutazione_move(service, event, origine, destinazione)
+            mutazione["chiave"] = geop_id
+            if geop_id in indice and indice[geop_id]["google_id"] == event["id"]:
+                mutazione["dopo"] = sposta(geop_id)
+            mutazioni.append(mutazione)
+
+        if mutazioni:
+            stats = esegui_batch(service, mutazioni, utente=utente or destinazione, paralleli=SCRITTURE_PARALLELE)
+            if stats["errori"] or stats["rinviate"]:
+                raise RuntimeError(
+                    f"migrazione nel calendario dedicato incompleta: {stats['errori']} errori, "
+                    f"{len(stats['rinviate'])} spostamenti rinviati"
+                )
+
+        # righe dell'indice senza evento nel calendario di origine (già spostato o eliminato a mano):
+        # la sincronizzazione nel calendario dedicato ricreerà gli eventi mancanti
+        for geop_id in indice:
+            store.sposta(origine, destinazione, geop_id)
+
+        # le modifiche rinviate riguardano ora il calendario dedicato; le eliminazioni di eventi senza id GEOP
+        # si riferiscono a eventi rimasti nel calendario di origine e vengono abbandonate
+        for voce in store.coda(origine):
+            if not voce["chiave"].startswith("google:"):
+                store.accoda(destinazione, voce["chiave"], voce["operazione"], voce["descrizione"])
+        store.svuota_coda(origine)
+
+    metrics.log(f"Migrazione conclusa: {len(mutazioni)} eventi GEOP spostati da {origine} al calendario dedicato.")
+
+
+def apri_canale(creds: Credentials, calendar_id: str, id_canale: str, token: str, indirizzo: str, durata: int) -> dict:
+    """
+    Apre un canale di notifica (events.watch): Google invierà una POST a `indirizzo` a ogni modifica degli eventi
+    del calendario, con `id_canale` e `token` nelle intestazioni (vedi `notifiche.RicevitoreNotifiche`).
+
+    Args:
+        creds (Credentials): Credenziali per accedere all'API di Google Calendar.
+        calendar_id (str): Calendario da osservare.
+        id_canale (str): Id univoco scelto dal client (es. un UUID).
+        token (str): Valore segreto ripetuto da Google in ogni notifica.
+        indirizzo (str): URL HTTPS pubblico che riceve le notifiche.
+        durata (int): Durata richiesta in secondi (Google può concederne una più breve).
+
+    Returns:
+        dict: Risorsa channel con "id", "resourceId" ed "expiration" (millisecondi dall'epoch, come stringa).
+    """
+    service = get_service(creds)
+    canale = service.events().watch(
+        calendarId=calendar_id,
+        body={"id": id_canale, "type": "web_hook", "address": indirizzo, "token": token, "params": {"ttl": str(int(durata))}},
+    ).execute()
+    metrics.conta("chiamate_api_total", servizio="google", metodo="events.watch")
+    return canale
+
+
+def chiudi_canale(creds: Credentials, id_canale: str, resource_id: str):
+    """
+    Chiude un canale di notifica (channels.stop). Un canale già chiuso o scaduto non è un errore.
+    """
+    service = get_service(creds)
+    try:
+        service.channels().stop(body={"id": id_canale, "resourceId": resource_id}).execute()
+    except HttpError as error:
+        if error.resp.status != 404:
+            raise
+    finally:
+        metrics.conta("chiamate_api_total", servizio="google", metodo="channels.stop")
 
 
 # !!!!! TEST !!!!!
 def get_available_colors(creds):
     try:
-        service = build("calendar", "v3", credentials=creds)
+        service = get_service(creds)
         colors = service.colors().get().execute()
         print(colors['event'])
         return colors['event']
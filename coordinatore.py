@@ -0,0 +1,360 @@
+# coordinamento di più nodi del demone (processi sulla stessa macchina o su host diversi): una coda condivisa
+# in SQLite con un lavoro per utente, lease a tempo rinnovati da un heartbeat e scadenze calcolate da polling.py
+import concurrent.futures
+import contextlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import business
+import daemon
+import eventi
+import metrics
+import polling
+
+CODA_LAVORI = "coordinatore.db"
+
+# un lavoro preso da un nodo resta suo per DURATA_LEASE secondi, rinnovati ogni HEARTBEAT secondi finché
+# la sincronizzazione è in corso: un nodo morto (o bloccato) perde i suoi lavori entro DURATA_LEASE secondi
+DURATA_LEASE = 300
+HEARTBEAT = 60
+
+# attesa massima tra due controlli della coda quando non ci sono lavori scaduti (o non ci sono worker liberi)
+# e minima, perché un lavoro già scaduto ma non preso non faccia girare il ciclo a vuoto sulla coda condivisa
+ATTESA_MASSIMA = 30
+ATTESA_MINIMA = 1.0
+
+
+class CodaLavori:
+    """
+    Coda condivisa dei lavori di sincronizzazione, una riga per utente con:
+        - prossimo:     istante (epoch) da cui il lavoro va eseguito
+        - nodo:         nodo che ha il lavoro in lease, NULL se libero
+        - scadenza:     fine del lease; dopo questo istante il lavoro può essere preso da un altro nodo
+        - token:        incrementato a ogni assegnazione: un nodo che ha perso il lease non può più completare il lavoro
+        - invariati / fallimenti: cicli consecutivi senza modifiche o falliti, per `polling.prossima_attesa`
+        - ultimo_nodo / ultimo_esito / ultima_fine: ultima esecuzione, per i log e la diagnosi
+
+    Ogni operazione è una transazione `BEGIN IMMEDIATE`: due nodi non possono prendere lo stesso lavoro.
+    Il database usa il journal predefinito (non WAL), che funziona anche su un filesystem condiviso tra host
+    purché supporti i lock POSIX; gli orologi dei nodi vanno sincronizzati (NTP), con scarti molto inferiori al lease.
+
+    Una connessione non va condivisa tra thread: ogni thread apre la propria con `with CodaLavori(path)`.
+
+    Example:
+        with CodaLavori("coordinatore.db") as coda:\n
+            lavori = coda.prendi("nodo1", 2)
+    """
+
+    def __init__(self, path: str = CODA_LAVORI, timeout: float = 30.0):
+        self.path = path
+        # isolation_level=None: le transazioni si aprono esplicitamente con BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS lavori (
+                utente       TEXT PRIMARY KEY,
+                prossimo     REAL NOT NULL,
+                nodo         TEXT,
+                scadenza     REAL,
+                token        INTEGER NOT NULL DEFAULT 0,
+                invariati    INTEGER NOT NULL DEFAULT 0,
+                fallimenti   INTEGER NOT NULL DEFAULT 0,
+                ultimo_nodo  TEXT,
+                ultimo_esito TEXT,
+                ultima_fine  REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS lavori_prossimo ON lavori (prossimo)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    @contextlib.contextmanager
+    def _transazione(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def allinea(self, utenti: list, adesso: float = None) -> tuple:
+        """
+        Allinea la coda ai profili: aggiunge gli utenti nuovi (da eseguire subito) e rimuove quelli che non ci sono più,
+        se non sono in lease.
+
+        Returns:
+            tuple: (utenti aggiunti, utenti rimossi).
+        """
+        adesso = time.time() if adesso is None else adesso
+        with self._transazione():
+            presenti = {riga["utente"] for riga in self._conn.execute("SELECT utente FROM lavori")}
+            nuovi = [utente for utente in utenti if utente not in presenti]
+            self._conn.executemany("INSERT INTO lavori (utente, prossimo) VALUES (?, ?)", [(u, adesso) for u in nuovi])
+            rimossi = 0
+            for utente in presenti - set(utenti):
+                rimossi += self._conn.execute(
+                    "DELETE FROM lavori WHERE utente = ? AND (nodo IS NULL OR scadenza < ?)", (utente, adesso)
+                ).rowcount
+        return len(nuovi), rimossi
+
+    def prendi(self, nodo: str, quanti: int = 1, durata: float = DURATA_LEASE, adesso: float = None) -> list:
+        """
+        Assegna al nodo fino a `quanti` lavori scaduti, liberi o con il lease scaduto (nodo morto), a partire da quello
+        in attesa da più tempo.
+
+        Returns:
+            list: Lavori presi, dizionari con "utente", "token", "invariati", "fallimenti" e "precedente"
+                  (il nodo che aveva il lease scaduto, None se il lavoro era libero).
+        """
+        if quanti <= 0:
+            return []
+        adesso = time.time() if adesso is None else adesso
+        with self._transazione():
+            righe = self._conn.execute(
+                """
+                SELECT utente, token, invariati, fallimenti, nodo FROM lavori
+                WHERE prossimo <= ? AND (nodo IS NULL OR scadenza < ?)
+                ORDER BY prossimo, utente LIMIT ?
+                """,
+                (adesso, adesso, quanti),
+            ).fetchall()
+            lavori = []
+            for riga in righe:
+                self._conn.execute(
+                    "UPDATE lavori SET nodo = ?, scadenza = ?, token = token + 1 WHERE utente = ?",
+                    (nodo, adesso + durata, riga["utente"]),
+                )
+                lavori.append({"utente": riga["utente"], "token": riga["token"] + 1, "invariati": riga["invariati"],
+                               "fallimenti": riga["fallimenti"], "precedente": riga["nodo"]})
+        return lavori
+
+    def rinnova(self, nodo: str, lavori: list, durata: float = DURATA_LEASE, adesso: float = None) -> list:
+        """
+        Heartbeat: prolunga il lease dei lavori del nodo.
+
+        Returns:
+            list: Utenti il cui lease è stato perso (scaduto e preso da un altro nodo).
+        """
+        adesso = time.time() if adesso is None else adesso
+        persi = []
+        with self._transazione():
+            for lavoro in lavori:
+                aggiornati = self._conn.execute(
+                    "UPDATE lavori SET scadenza = ? WHERE utente = ? AND nodo = ? AND token = ?",
+                    (adesso + durata, lavoro["utente"], nodo, lavoro["token"]),
+                ).rowcount
+                if not aggiornati:
+                    persi.append(lavoro["utente"])
+        return persi
+
+    def completa(self, nodo: str, lavoro: dict, esito: str, prossimo: float, invariati: int, fallimenti: int) -> bool:
+        """
+        Libera il lavoro e ne fissa la prossima esecuzione.
+
+        Returns:
+            bool: False se il nodo aveva perso il lease (il lavoro appartiene ormai a un altro nodo e non viene toccato).
+        """
+        with self._transazione():
+            return bool(self._conn.execute(
+                """
+                UPDATE lavori SET nodo = NULL, scadenza = NULL, prossimo = ?, invariati = ?, fallimenti = ?,
+                                  ultimo_nodo = ?, ultimo_esito = ?, ultima_fine = ?
+                WHERE utente = ? AND nodo = ? AND token = ?
+                """,
+                (prossimo, invariati, fallimenti, nodo, esito, time.time(), lavoro["utente"], nodo, lavoro["token"]),
+            ).rowcount)
+
+    def rilascia(self, nodo: str) -> int:
+        """
+        Libera tutti i lavori del nodo senza cambiarne la scadenza (es. all'arresto): gli altri nodi li prendono subito.
+
+        Returns:
+            int: Lavori rilasciati.
+        """
+        with self._transazione():
+            return self._conn.execute("UPDATE lavori SET nodo = NULL, scadenza = NULL WHERE nodo = ?", (nodo,)).rowcount
+
+    def prossima_scadenza(self, adesso: float = None):
+        """
+        Restituisce l'istante (epoch) in cui il prossimo lavoro diventerà eseguibile, None se la coda è vuota.
+        """
+        adesso = time.time() if adesso is None else adesso
+        riga = self._conn.execute(
+            "SELECT MIN(CASE WHEN nodo IS NULL OR scadenza < ? THEN prossimo ELSE MAX(prossimo, scadenza) END) "
+            "FROM lavori",
+            (adesso,),
+        ).fetchone()
+        return riga[0]
+
+    def stato(self) -> list:
+        """
+        Restituisce tutte le righe della coda, ordinate per prossima esecuzione.
+        """
+        return [dict(riga) for riga in self._conn.execute("SELECT * FROM lavori ORDER BY prossimo, utente")]
+
+
+def nome_nodo() -> str:
+    """
+    Nome predefinito del nodo: host e pid, unico anche con più nodi sulla stessa macchina.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _eventi_polling(calendar_path: str) -> list:
+    # polling.prossima_attesa usa solo "start" ed "end"; senza file valgono solo gli orari della settimana
+    try:
+        return [{"start": evento.start, "end": evento.end} for evento in eventi.leggi(calendar_path)]
+    except (OSError, ValueError):
+        return []
+
+
+def esegui_lavoro(coda_path: str, nodo: str, profilo: dict, lavoro: dict, date: dict, concorrente: bool = None) -> dict:
+    """
+    Sincronizza l'utente di un lavoro preso dalla coda e lo completa, con la prossima esecuzione calcolata
+    da `polling.prossima_attesa` sugli orari delle sue lezioni (come `main.py`).
+
+    Returns:
+        dict: Esito di `daemon.sincronizza_utente`, con in più "completato" (False se il lease era stato perso).
+    """
+    if lavoro["precedente"]:
+        metrics.log(f"[{profilo['nome']}] Lavoro ripreso dal nodo {lavoro['precedente']} (lease scaduto).")
+    esito = daemon.sincronizza_utente(profilo, date, concorrente=concorrente)
+
+    invariati, fallimenti = lavoro["invariati"], lavoro["fallimenti"]
+    if esito["ok"]:
+        invariati, fallimenti = (invariati + 1 if esito["saltato"] else 0), 0
+    else:
+        fallimenti += 1
+    calendar_path = os.path.join(profilo["cartella"], profilo.get("calendario", "calendar.json"))
+    attesa, _ = polling.prossima_attesa(_eventi_polling(calendar_path), invariati=invariati, fallimenti=fallimenti)
+
+    with CodaLavori(coda_path) as coda:
+        esito["completato"] = coda.completa(
+            nodo, lavoro, "saltato" if esito["saltato"] else "ok" if esito["ok"] else "errore",
+            time.time() + attesa, invariati, fallimenti,
+        )
+    if not esito["completato"]:
+        metrics.log(f"[{profilo['nome']}] Lease perso durante la sincronizzazione: esito scartato.", "errore")
+    metrics.conta("lavori_total", esito="perso" if not esito["completato"] else "ok" if esito["ok"] else "errore")
+    return esito
+
+
+def esegui_nodo(profili_path: str, coda_path: str = CODA_LAVORI, nodo: str = None, workers: int = 4,
+                settimane: int = 6, fine: str = None, durata: float = DURATA_LEASE, heartbeat: float = HEARTBEAT,
+                arresto: threading.Event = None, feeds: dict = None, concorrente: bool = None, metriche_file: str = None):
+    """
+    Ciclo di un nodo: allinea la coda ai profili, prende dalla coda fino a `workers` lavori scaduti alla volta
+    e li sincronizza in parallelo, rinnovandone il lease ogni `heartbeat` secondi finché sono in corso.
+
+    I nodi si dividono gli utenti senza configurazione: ciascuno prende solo quanti lavori può eseguire subito,
+    in ordine di scadenza, quindi la capacità cresce aggiungendo nodi. Se un nodo muore i suoi lavori tornano
+    disponibili alla scadenza del lease; all'arresto regolare (`arresto`) vengono rilasciati subito.
+    Tutti i nodi devono leggere gli stessi profili; se le cartelle degli utenti non sono condivise, il nodo che
+    riprende un utente ricostruisce l'indice dai tag geopId degli eventi Google, senza creare duplicati.
+
+    Args:
+        profili_path (str): File JSON dei profili (vedi `daemon.carica_profili`).
+        coda_path (str): Database SQLite della coda, condiviso da tutti i nodi.
+        nodo (str): Nome univoco del nodo; se None host e pid (`nome_nodo`).
+        workers (int): Sincronizzazioni contemporanee di questo nodo.
+        settimane (int): Settimane da sincronizzare a partire dal lunedì corrente.
+        fine (str): Data massima di fine (YYYY-MM-DD).
+        durata (float): Durata dei lease, in secondi.
+        heartbeat (float): Intervallo di rinnovo dei lease, in secondi (molto minore di `durata`).
+        arresto (threading.Event): Se impostato, il nodo termina i lavori in corso, li rilascia ed esce.
+        feeds (dict): Dizionario del server di `icsfeed.avvia_server`, aggiornato con i feed dei profili.
+        concorrente (bool): Pipeline concorrente o sequenziale (vedi `daemon.sincronizza_utente`).
+        metriche_file (str): File .prom riscritto a ogni controllo della coda.
+    """
+    nodo = nodo or nome_nodo()
+    arresto = arresto or threading.Event()
+    # almeno tre battiti per lease: un heartbeat in ritardo non basta a perdere i lavori
+    heartbeat = min(heartbeat, durata / 3)
+    in_corso = {}  # future -> lavoro
+    in_corso_lock = threading.Lock()
+
+    def battito():
+        while not arresto.wait(heartbeat):
+            with in_corso_lock:
+                lavori = list(in_corso.values())
+            if not lavori:
+                continue
+            try:
+                with CodaLavori(coda_path) as coda:
+                    for utente in coda.rinnova(nodo, lavori, durata):
+                        metrics.log(f"[{utente}] Lease perso: un altro nodo ha preso il lavoro.", "errore")
+            except sqlite3.Error as error:
+                metrics.log(f"Heartbeat del nodo {nodo} non riuscito: {error}", "errore")
+
+    # lavori rimasti a un nodo con lo stesso nome terminato senza rilasciarli
+    with CodaLavori(coda_path) as coda:
+        coda.rilascia(nodo)
+    metrics.log(f"Nodo {nodo} avviato sulla coda {coda_path} ({workers} workers).")
+    threading.Thread(target=battito, daemon=True, name="heartbeat").start()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync") as pool:
+        try:
+            while not arresto.is_set():
+                attesa = ATTESA_MASSIMA
+                try:
+                    profili = {profilo["nome"]: profilo for profilo in daemon.carica_profili(profili_path)}
+                    if feeds is not None:
+                        nuovi = daemon.percorsi_feed(list(profili.values()))
+                        feeds.clear()
+                        feeds.update(nuovi)
+                    with in_corso_lock:
+                        liberi = workers - len(in_corso)
+                    with CodaLavori(coda_path) as coda:
+                        coda.allinea(list(profili))
+                        lavori = coda.prendi(nodo, liberi, durata)
+                        # utenti presenti nella coda ma non (ancora) nei profili letti da questo nodo
+                        for lavoro in [lavoro for lavoro in lavori if lavoro["utente"] not in profili]:
+                            coda.completa(nodo, lavoro, "sconosciuto", time.time(), lavoro["invariati"], lavoro["fallimenti"])
+                            lavori.remove(lavoro)
+                        prossimo = coda.prossima_scadenza()
+
+                    date = business.weeks_range(settimane, fine)
+                    for lavoro in lavori:
+                        futuro = pool.submit(esegui_lavoro, coda_path, nodo, profili[lavoro["utente"]], lavoro, date,
+                                             concorrente)
+                        with in_corso_lock:
+                            in_corso[futuro] = lavoro
+                            liberi = workers - len(in_corso)
+                    # con tutti i worker occupati la prossima scadenza non conta: si attende che un lavoro termini
+                    if liberi > 0 and prossimo is not None:
+                        attesa = min(attesa, max(ATTESA_MINIMA, prossimo - time.time()))
+                except Exception as error:
+                    metrics.log(f"Errore del nodo {nodo}: {error}", "errore")
+
+                if metriche_file:
+                    metrics.scrivi_textfile(metriche_file)
+
+                # si riprova alla prossima scadenza, o appena un lavoro termina e libera un worker
+                with in_corso_lock:
+                    attivi = list(in_corso)
+                if attivi:
+                    concurrent.futures.wait(attivi, timeout=attesa, return_when=concurrent.futures.FIRST_COMPLETED)
+                else:
+                    arresto.wait(attesa)
+                with in_corso_lock:
+                    for futuro in [futuro for futuro in in_corso if futuro.done()]:
+                        del in_corso[futuro]
+        finally:
+            arresto.set()
+            concurrent.futures.wait(list(in_corso))
+            with CodaLavori(coda_path) as coda:
+                rilasciati = coda.rilascia(nodo)
+            metrics.log(f"Nodo {nodo} arrestato ({rilasciati} lavori rilasciati).")
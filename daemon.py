@@ -0,0 +1,500 @@
+# demone multi-utente: sincronizza più studenti in parallelo con un pool di thread limitato
+# uso: python daemon.py [--profili users.json] [--workers 4] [--intervallo 1800] [--settimane 6] [--fine YYYY-MM-DD]
+#                       [--log info] [--metriche-porta 9464] [--metriche-file geop.prom] [--sequenziale] [--ics-porta 8765]
+#                       [--push-url https://esempio.it/geop/notifiche] [--push-porta 8766]
+#                       [--coda coordinatore.db] [--nodo nome] [--lease 300]
+import argparse
+import concurrent.futures
+import os
+import threading
+import time
+from urllib.parse import quote
+
+import business
+import eventi
+import icsfeed
+import metrics
+import notifiche
+import parser
+import statestore
+
+PROFILI = "users.json"
+
+# credenziali, lettura di GEOP e lettura di Google in parallelo invece che in sequenza (vedi sincronizza_utente)
+PIPELINE_CONCORRENTE = True
+
+# destinazioni degli eventi: Google Calendar o un feed iCalendar locale (icsfeed.py)
+USCITE = ("google", "ics")
+
+# un lock per cartella utente: il ciclo e le riconciliazioni avviate dalle notifiche non lavorano insieme sugli stessi file
+_lock_utenti = {}
+_lock_utenti_lock = threading.Lock()
+
+
+def carica_profili(profili_path: str = PROFILI) -> list:
+    """
+    Legge i profili degli utenti da sincronizzare.
+
+    Il file è una lista JSON di oggetti con le chiavi:
+        - "nome" (str):                     Nome dell'utente, usato nei log
+        - "username" / "password" (str):    Credenziali GEOP
+        - "cartella" (str):                 Cartella dei file dell'utente (calendar.bin, token.json, ...)
+        - "calendar_id" (str, opzionale):   Calendario Google di destinazione, "primary" se assente
+        - "calendario_dedicato" (bool, opzionale): Se true gli eventi vanno in un calendario secondario "GEOP"
+                                            creato al primo ciclo, dove vengono spostati quelli di calendar_id
+        - "credentials" (str, opzionale):   File delle credenziali OAuth, "credentials.json" se assente
+        - "calendario" (str, opzionale):    File degli eventi elaborati nella cartella: "calendar.bin" (predefinito,
+                                            formato binario compatto di eventi.py) o "calendar.json" (leggibile)
+        - "uscita" (str, opzionale):        "google" (predefinita) o "ics" per scrivere un feed iCalendar
+                                            nella cartella invece di usare le API di Google
+        - "finestra" (str, opzionale):      "settimana" o "mese" per leggere GEOP a finestre in parallelo
+                                            (utile per intervalli lunghi), assente per un'unica richiesta
+        - "paralleli_geop" (int, opzionale): Richieste GEOP contemporanee nella lettura a finestre
+
+    Args:
+        profili_path (str): File JSON dei profili.
+
+    Returns:
+        list: Lista dei profili, con i valori predefiniti già applicati.
+
+    Raises:
+        ValueError: Se un profilo non contiene le chiavi obbligatorie o due profili condividono la cartella.
+    """
+    profili = parser.read_json(profili_path)
+    cartelle = set()
+
+    for profilo in profili:
+        mancanti = {"nome", "username", "password", "cartella"} - profilo.keys()
+        if mancanti:
+            raise ValueError(f"Profilo {profilo.get('nome', '?')} senza le chiavi: {', '.join(sorted(mancanti))}")
+
+        # ogni utente deve avere file propri: due profili nella stessa cartella si sovrascriverebbero
+        cartella = os.path.abspath(profilo["cartella"])
+        if cartella in cartelle:
+            raise ValueError(f"La cartella {profilo['cartella']} è usata da più profili")
+        cartelle.add(cartella)
+
+        if profilo.get("finestra") not in (None, *business.FINESTRE):
+            raise ValueError(f"Profilo {profilo['nome']}: finestra deve essere una tra {', '.join(business.FINESTRE)}")
+        if profilo.get("uscita", "google") not in USCITE:
+            raise ValueError(f"Profilo {profilo['nome']}: uscita deve essere una tra {', '.join(USCITE)}")
+
+        profilo.setdefault("calendar_id", "primary")
+        profilo.setdefault("calendario_dedicato", False)
+        profilo.setdefault("credentials", "credentials.json")
+        profilo.setdefault("uscita", "google")
+        profilo.setdefault("calendario", eventi.CALENDARIO_BINARIO)
+        profilo.setdefault("finestra", None)
+        profilo.setdefault("paralleli_geop", business.PARALLELI_GEOP)
+
+    return profili
+
+
+def _calendarapi():
+    """
+    Importa calendarapi solo quando serve: le librerie Google (googleapiclient, google-auth, oauthlib) sono
+    la parte più lenta dell'avvio e un ciclo senza modifiche su GEOP non le usa (vedi `main.py --once`).
+    """
+    import calendarapi
+    return calendarapi
+
+
+def _lock_utente(cartella: str) -> threading.Lock:
+    chiave = os.path.abspath(cartella)
+    with _lock_utenti_lock:
+        return _lock_utenti.setdefault(chiave, threading.Lock())
+
+
+def sincronizza_utente(profilo: dict, date: dict, interattivo: bool = False, concorrente: bool = None,
+                       anticipa_credenziali: bool = True) -> dict:
+    """
+    Esegue per un utente l'intera pipeline: lettura da GEOP, elaborazione, confronto con l'ultimo
+    snapshot e sincronizzazione con Google Calendar. Tutti i file dell'utente stanno nella sua cartella.
+
+    Con la pipeline concorrente il caricamento (o rinnovo) delle credenziali Google e, se si prevede una
+    sincronizzazione completa, la lettura di Google Calendar partono subito, in parallelo alla lettura
+    e all'elaborazione di GEOP; i risultati si uniscono al momento della riconciliazione.
+    Le credenziali vengono caricate anche se poi GEOP risulta invariato, a meno di `anticipa_credenziali=False`:
+    in quel caso nulla di Google (import delle librerie compresi) parte prima di sapere che GEOP è cambiato,
+    salvo quando si prevede una sincronizzazione completa, che contatterà comunque Google.
+
+    Con il calendario dedicato il primo ciclo crea il calendario e vi sposta gli eventi GEOP di "calendar_id"
+    prima di tutto il resto; nei cicli successivi l'id viene letto dal file locale senza contattare Google.
+
+    Gli eventi elaborati vengono letti una volta sola da `profilo["calendario"]` ("calendar.json" se assente)
+    come record `eventi.EventoGeop` e passati al confronto con lo snapshot, alla sincronizzazione e al feed.
+
+    Con l'uscita "ics" Google non viene mai contattato: se GEOP è cambiato (o il feed manca) il ciclo
+    rigenera il feed iCalendar della cartella con `icsfeed.aggiorna_feed`, cioè una sola scrittura di file.
+
+    Args:
+        profilo (dict): Profilo dell'utente (vedi `carica_profili`).
+        date (dict): Intervallo "start"/"end" da sincronizzare.
+        interattivo (bool): Se True può aprire il browser per il login Google (solo da main.py).
+        concorrente (bool): Pipeline concorrente o sequenziale; se None vale `PIPELINE_CONCORRENTE`.
+        anticipa_credenziali (bool): Se False le credenziali si caricano solo quando servono (esecuzioni singole).
+
+    Returns:
+        dict: Esito con le chiavi "nome", "ok", "saltato", "durata" ed "errore".
+    """
+    inizio = time.perf_counter()
+    cartella = profilo["cartella"]
+    os.makedirs(cartella, exist_ok=True)
+    concorrente = PIPELINE_CONCORRENTE if concorrente is None else concorrente
+
+    def percorso(nome_file):
+        return os.path.join(cartella, nome_file)
+
+    def credenziali():
+        return _calendarapi().accesso(percorso("token.json"), profilo["credentials"], interattivo)
+
+    esito = {"nome": profilo["nome"], "ok": False, "saltato": False, "durata": 0.0, "errore": None}
+    calendar_path = percorso(profilo.get("calendario", "calendar.json"))
+    snapshot_path = percorso(parser.GEOP_SNAPSHOT)
+    state_path = percorso(statestore.STATE_DB)
+
+    # una riconciliazione avviata da una notifica (riconcilia_google) attende la fine del ciclo e viceversa
+    with _lock_utente(cartella):
+        try:
+            creds = None
+            calendar_id = profilo["calendar_id"]
+            ics = profilo.get("uscita", "google") == "ics"
+            feed_path = percorso(icsfeed.ICS_FEED)
+            # il calendario dedicato riguarda solo l'uscita su Google
+            dedicato = profilo.get("calendario_dedicato", False) and not ics
+            if dedicato:
+                config_path = percorso(statestore.CALENDARIO_CONFIG)
+                calendar_id = statestore.calendario_dedicato(config_path)
+                if calendar_id is None:
+                    creds = credenziali()
+                    calendar_id = _calendarapi().prepara_calendario_dedicato(
+                        creds, profilo["calendar_id"], config_path, state_path, profilo["nome"]
+                    )
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline") as pool:
+                creds_futuro = lettura_futura = None
+                if concorrente and not ics:
+                    lettura_prevista = _lettura_google_prevista(snapshot_path, state_path, calendar_id)
+                    if anticipa_credenziali or lettura_prevista:
+                        creds_futuro = pool.submit(lambda: creds or credenziali())
+                    if lettura_prevista:
+                        lettura_futura = pool.submit(
+                            lambda: _calendarapi().lettura_google(
+                                creds_futuro.result(), date, mirror_path=percorso(_calendarapi().GOOGLE_MIRROR),
+                                calendar_id=calendar_id, dedicato=dedicato,
+                            )
+                        )
+
+                login_payload = {"username": profilo["username"], "password": profilo["password"]}
+                if profilo.get("finestra"):
+                    business.get_calendar_a_finestre(
+                        login_payload, date, calendar_path, percorso(business.GEOP_COOKIES),
+                        profilo["finestra"], profilo.get("paralleli_geop", business.PARALLELI_GEOP),
+                    )
+                else:
+                    business.get_calendar(login_payload, date, calendar_path, percorso(business.GEOP_COOKIES))
+
+                # se i dati GEOP non sono cambiati dall'ultima sincronizzazione non serve contattare Google
+                eventi_geop = eventi.leggi(calendar_path)
+                modifiche = parser.confronta_snapshot(eventi_geop, date, snapshot_path)
+
+                # le modifiche rinviate per i limiti di Google vanno riprovate anche se GEOP non è cambiato
+                rinviate = 0
+                if not ics:
+                    with statestore.StateStore(state_path) as store:
+                        rinviate = len(store.coda(calendar_id))
+
+                if modifiche["invariato"] and not rinviate and (not ics or os.path.exists(feed_path)):
+                    metrics.log(f"[{profilo['nome']}] Nessuna modifica su GEOP dall'ultima sincronizzazione.")
+                    esito["ok"] = esito["saltato"] = True
+                elif ics:
+                    icsfeed.aggiorna_feed(calendar_path, feed_path, percorso(icsfeed.ICS_CACHE), profilo["nome"], eventi_geop)
+                    parser.salva_snapshot(modifiche["snapshot"], snapshot_path)
+                    esito["ok"] = True
+                else:
+                    creds = creds_futuro.result() if creds_futuro else creds or credenziali()
+                    calendarapi = _calendarapi()
+
+                    # lo snapshot si salva solo se la sincronizzazione è riuscita, altrimenti si riprova al prossimo ciclo
+                    esito["ok"] = calendarapi.sync_calendar(
+                        creds, date, chiavi=modifiche["chiavi"],
+                        calendar_path=calendar_path,
+                        mirror_path=percorso(calendarapi.GOOGLE_MIRROR),
+                        calendar_id=calendar_id,
+                        state_path=state_path,
+                        utente=profilo["nome"],
+                        google_events=lettura_futura.result() if lettura_futura else None,
+                        paralleli=None if concorrente else 1,
+                        dedicato=dedicato,
+                        eventi_geop=eventi_geop,
+                    )
+                    if esito["ok"]:
+                        parser.salva_snapshot(modifiche["snapshot"], snapshot_path)
+
+        except Exception as error:
+            # un utente con problemi non deve fermare gli altri
+            esito["errore"] = str(error)
+            metrics.log(f"[{profilo['nome']}] Errore durante la sincronizzazione: {error}", "errore")
+
+    esito["durata"] = time.perf_counter() - inizio
+    metrics.registra_tempo("sincronizzazione", esito["durata"])
+    metrics.conta("sincronizzazioni_total", esito="saltata" if esito["saltato"] else "ok" if esito["ok"] else "errore")
+    return esito
+
+
+def calendario_sincronizzato(profilo: dict) -> str:
+    """
+    Restituisce, senza contattare Google, l'id del calendario in cui vengono sincronizzati gli eventi dell'utente:
+    quello del calendario dedicato se il profilo lo usa, altrimenti "calendar_id".
+
+    Returns:
+        str: Id del calendario, o None se il calendario dedicato non è ancora stato preparato dal primo ciclo.
+    """
+    if profilo.get("calendario_dedicato", False):
+        return statestore.calendario_dedicato(os.path.join(profilo["cartella"], statestore.CALENDARIO_CONFIG))
+    return profilo.get("calendar_id", "primary")
+
+
+def riconcilia_google(profilo: dict, date: dict) -> dict:
+    """
+    Riconcilia il calendario Google dell'utente con gli eventi GEOP già elaborati, dopo una notifica push
+    (vedi `attiva_notifiche`). GEOP non viene letto e lo snapshot non cambia: Google si legge con il syncToken
+    (solo gli eventi modificati dall'ultima lettura) e tutti gli eventi GEOP vengono riconciliati, così
+    una lezione cancellata o modificata a mano su Google viene ripristinata subito.
+
+    Args:
+        profilo (dict): Profilo dell'utente (vedi `carica_profili`).
+        date (dict): Intervallo "start"/"end" da sincronizzare.
+
+    Returns:
+        dict: Esito con le chiavi di `sincronizza_utente`; "saltato" se non c'è ancora nulla da riconciliare.
+    """
+    inizio = time.perf_counter()
+    cartella = profilo["cartella"]
+    esito = {"nome": profilo["nome"], "ok": False, "saltato": False, "durata": 0.0, "errore": None}
+    calendar_path = os.path.join(cartella, profilo.get("calendario", "calendar.json"))
+
+    with _lock_utente(cartella):
+        try:
+            calendar_id = calendario_sincronizzato(profilo)
+            if calendar_id is None or not os.path.exists(calendar_path):
+                metrics.log(f"[{profilo['nome']}] Nessuna sincronizzazione ancora eseguita, riconciliazione rinviata al ciclo.")
+                esito["ok"] = esito["saltato"] = True
+            else:
+                calendarapi = _calendarapi()
+                creds = calendarapi.accesso(os.path.join(cartella, "token.json"), profilo["credentials"], False)
+                esito["ok"] = calendarapi.sync_calendar(
+                    creds, date, incrementale=True, chiavi=None,
+                    calendar_path=calendar_path,
+                    mirror_path=os.path.join(cartella, calendarapi.GOOGLE_MIRROR),
+                    calendar_id=calendar_id,
+                    state_path=os.path.join(cartella, statestore.STATE_DB),
+                    utente=profilo["nome"],
+                    dedicato=profilo.get("calendario_dedicato", False),
+                )
+        except Exception as error:
+            esito["errore"] = str(error)
+            metrics.log(f"[{profilo['nome']}] Errore durante la riconciliazione: {error}", "errore")
+
+    esito["durata"] = time.perf_counter() - inizio
+    metrics.registra_tempo("riconciliazione_push", esito["durata"])
+    metrics.conta("riconciliazioni_push_total", esito="saltata" if esito["saltato"] else "ok" if esito["ok"] else "errore")
+    return esito
+
+
+def attiva_notifiche(ricevitore: notifiche.RicevitoreNotifiche, profilo: dict, settimane: int = 6, fine: str = None) -> bool:
+    """
+    Registra il calendario dell'utente presso il ricevitore delle notifiche push: a ogni modifica su Google
+    viene eseguita `riconcilia_google` sull'intervallo di `settimane` settimane dal lunedì corrente (al massimo
+    fino a `fine`). Il canale viene salvato nella cartella dell'utente (`notifiche.CANALE`).
+    Va chiamata dopo un ciclo riuscito; se il calendario è già registrato non contatta Google.
+
+    Returns:
+        bool: True se il calendario è registrato, False se l'uscita non è Google o il calendario dedicato
+              non è ancora pronto.
+    """
+    if profilo.get("uscita", "google") != "google":
+        return False
+    calendar_id = calendario_sincronizzato(profilo)
+    if calendar_id is None:
+        return False
+
+    cartella = profilo["cartella"]
+
+    def credenziali():
+        return _calendarapi().accesso(os.path.join(cartella, "token.json"), profilo["credentials"], False)
+
+    ricevitore.registra(
+        profilo["nome"], calendar_id,
+        apri=lambda id_canale, token, indirizzo, durata: _calendarapi().apri_canale(
+            credenziali(), calendar_id, id_canale, token, indirizzo, durata
+        ),
+        chiudi=lambda id_canale, resource_id: _calendarapi().chiudi_canale(credenziali(), id_canale, resource_id),
+        riconcilia=lambda: riconcilia_google(profilo, business.weeks_range(settimane, fine)),
+        canale_path=os.path.join(cartella, notifiche.CANALE),
+    )
+    return True
+
+
+def _lettura_google_prevista(snapshot_path: str, state_path: str, calendar_id: str) -> bool:
+    """
+    Prevede, prima di leggere GEOP, se `sync_calendar` leggerà Google Calendar: succede nelle sincronizzazioni
+    complete e quando l'indice locale è vuoto. Se la previsione sbaglia non succede niente di grave:
+    `sync_calendar` legge da sé o ignora la lettura anticipata.
+    """
+    if parser.sync_completa_dovuta(snapshot_path):
+        return True
+    with statestore.StateStore(state_path) as store:
+        return not store.eventi(calendar_id)
+
+
+def esegui_ciclo(profili: list, date: dict, workers: int = 4) -> list:
+    """
+    Sincronizza tutti i profili in parallelo, con al massimo `workers` utenti contemporaneamente.
+
+    Args:
+        profili (list): Profili da sincronizzare.
+        date (dict): Intervallo "start"/"end" da sincronizzare.
+        workers (int): Limite globale di sincronizzazioni concorrenti.
+
+    Returns:
+        list: Esiti di `sincronizza_utente`, nell'ordine dei profili.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync") as pool:
+        return list(pool.map(lambda profilo: sincronizza_utente(profilo, date), profili))
+
+
+def riepilogo(esiti: list, durata: float) -> str:
+    """
+    Riassume un ciclo: utenti riusciti, saltati (nessuna modifica), falliti e throughput in utenti al minuto.
+    """
+    ok = sum(1 for esito in esiti if esito["ok"])
+    saltati = sum(1 for esito in esiti if esito["saltato"])
+    throughput = len(esiti) / durata * 60 if durata else 0.0
+    return (
+        f"{len(esiti)} utenti in {durata:.1f} s ({throughput:.1f} utenti/min): "
+        f"{ok} riusciti di cui {saltati} senza modifiche, {len(esiti) - ok} falliti"
+    )
+
+
+def percorsi_feed(profili: list) -> dict:
+    """
+    Percorsi URL dei feed iCalendar dei profili con uscita "ics" (/<nome>.ics) -> file .ics nella loro cartella.
+    """
+    return {
+        f"/{quote(profilo['nome'])}.ics": os.path.join(profilo["cartella"], icsfeed.ICS_FEED)
+        for profilo in profili if profilo.get("uscita") == "ics"
+    }
+
+
+def aggiorna_notifiche(ricevitore: notifiche.RicevitoreNotifiche, profili: list, esiti: list, settimane: int = 6,
+                       fine: str = None):
+    """
+    Attiva le notifiche push per i profili sincronizzati con successo e le disattiva per quelli rimossi
+    o passati all'uscita "ics". Un errore di un utente (es. indirizzo rifiutato da Google) non ferma gli altri.
+    """
+    for profilo, esito in zip(profili, esiti):
+        if not esito["ok"]:
+            continue
+        try:
+            attiva_notifiche(ricevitore, profilo, settimane, fine)
+        except Exception as error:
+            metrics.log(f"[{profilo['nome']}] Attivazione delle notifiche push non riuscita: {error}", "errore")
+
+    attivi = {profilo["nome"] for profilo in profili if profilo.get("uscita", "google") == "google"}
+    for chiave in ricevitore.chiavi() - attivi:
+        ricevitore.rimuovi(chiave)
+
+
+def avvia(profili_path: str, workers: int, intervallo: int, settimane: int = 6, fine: str = None,
+          metriche_file: str = None, feeds: dict = None, ricevitore: notifiche.RicevitoreNotifiche = None):
+    """
+    Ciclo principale del demone: rilegge i profili, sincronizza tutti gli utenti e attende il ciclo successivo.
+    L'intervallo sincronizzato va dal lunedì corrente per `settimane` settimane, al massimo fino a `fine`.
+    Se `metriche_file` è indicato, le metriche vengono scritte in quel file alla fine di ogni ciclo.
+    Se `feeds` è indicato (il dizionario del server di `icsfeed.avvia_server`) viene aggiornato con i feed
+    dei profili riletti. Con `ricevitore` i calendari sincronizzati ricevono le notifiche push di Google
+    (vedi `aggiorna_notifiche`), che ne riparano le modifiche senza attendere il ciclo successivo.
+    """
+    while True:
+        inizio = time.perf_counter()
+        try:
+            profili = carica_profili(profili_path)
+            if feeds is not None:
+                nuovi = percorsi_feed(profili)
+                feeds.clear()
+                feeds.update(nuovi)
+            esiti = esegui_ciclo(profili, business.weeks_range(settimane, fine), workers)
+            metrics.log(riepilogo(esiti, time.perf_counter() - inizio))
+            if ricevitore is not None:
+                aggiorna_notifiche(ricevitore, profili, esiti, settimane, fine)
+        except Exception as error:
+            metrics.log(f"Errore durante il ciclo del demone: {error}", "errore")
+
+        if metriche_file:
+            metrics.scrivi_textfile(metriche_file)
+
+        time.sleep(intervallo)
+
+
+if __name__ == "__main__":
+    # solo il demone configura le quote: chi importa daemon (es. main.py --once) non carica le librerie Google
+    import scheduler
+
+    cli = argparse.ArgumentParser(description="Sincronizza più studenti GEOP su Google Calendar")
+    cli.add_argument("--profili", default=PROFILI, help="file JSON con i profili degli utenti")
+    cli.add_argument("--workers", type=int, default=4, help="numero massimo di utenti sincronizzati in parallelo")
+    cli.add_argument("--intervallo", type=int, default=1800, help="secondi tra un ciclo e il successivo")
+    cli.add_argument("--settimane", type=int, default=6, help="settimane da sincronizzare a partire dal lunedì corrente")
+    cli.add_argument("--fine", default=None, help="data massima di fine (YYYY-MM-DD), es. la fine dell'anno accademico")
+    cli.add_argument("--rps", type=float, default=scheduler.RICHIESTE_AL_SECONDO,
+                     help="scritture al secondo verso Google per l'intero demone")
+    cli.add_argument("--rps-utente", type=float, default=scheduler.RICHIESTE_PER_UTENTE,
+                     help="scritture al secondo verso Google per ciascun utente")
+    cli.add_argument("--log", choices=metrics.LIVELLI, default="evento",
+                     help="livello dei log: \"info\" toglie le righe per singolo evento, \"errore\" lascia solo gli errori")
+    cli.add_argument("--metriche-porta", type=int, default=None, help="porta locale su cui esporre /metrics per Prometheus")
+    cli.add_argument("--metriche-file", default=None, help="file .prom per il textfile collector di node_exporter")
+    cli.add_argument("--sequenziale", action="store_true",
+                     help="legge GEOP e Google uno dopo l'altro e invia un batch alla volta (pipeline precedente)")
+    cli.add_argument("--ics-porta", type=int, default=None,
+                     help="porta locale su cui servire i feed iCalendar dei profili con uscita \"ics\" (/<nome>.ics)")
+    cli.add_argument("--push-url", default=None,
+                     help="URL HTTPS pubblico per le notifiche push di Google (events.watch), inoltrato a --push-porta")
+    cli.add_argument("--push-porta", type=int, default=8766, help="porta locale del ricevitore delle notifiche push")
+    cli.add_argument("--coda", default=None,
+                     help="database SQLite condiviso da più nodi: ogni nodo prende dalla coda gli utenti da sincronizzare "
+                          "(--intervallo non si usa, le scadenze seguono gli orari delle lezioni)")
+    cli.add_argument("--nodo", default=None, help="nome univoco del nodo nella coda (predefinito: host:pid)")
+    cli.add_argument("--lease", type=float, default=None,
+                     help="secondi dopo i quali i lavori di un nodo che non risponde passano agli altri nodi")
+    args = cli.parse_args()
+    if args.coda and args.push_url:
+        cli.error("--push-url non è supportato con --coda: i canali sono legati al nodo che li ha aperti")
+
+    PIPELINE_CONCORRENTE = not args.sequenziale
+
+    scheduler.configura(args.rps, args.rps_utente)
+    metrics.imposta_livello(args.log)
+    if args.metriche_porta is not None:
+        metrics.avvia_server(args.metriche_porta)
+    feeds = None
+    if args.ics_porta is not None:
+        feeds = {}
+        icsfeed.avvia_server(args.ics_porta, feeds)
+    ricevitore = None
+    if args.push_url:
+        ricevitore = notifiche.RicevitoreNotifiche(args.push_url)
+        notifiche.avvia_server(args.push_porta, ricevitore)
+
+    if args.coda:
+        import coordinatore
+
+        # PIPELINE_CONCORRENTE di questo modulo (__main__) non vale per il modulo daemon importato dal coordinatore
+        coordinatore.esegui_nodo(
+            args.profili, args.coda, args.nodo, args.workers, args.settimane, args.fine,
+            args.lease or coordinatore.DURATA_LEASE, feeds=feeds, concorrente=PIPELINE_CONCORRENTE,
+            metriche_file=args.metriche_file,
+        )
+    else:
+        avvia(args.profili, args.workers, args.intervallo, args.settimane, args.fine, args.metriche_file, feeds, ricevitore)
@@ -0,0 +1,72 @@
+# confronto campo per campo tra l'evento calcolato da GEOP e quello presente su Google
+import datetime
+from collections import Counter
+from zoneinfo import ZoneInfo
+
+# campi di primo livello prodotti da parser.format_event che vengono confrontati
+CAMPI = ("summary", "location", "description", "colorId", "start", "end", "reminders", "extendedProperties")
+
+
+def _istante(edge: dict, local_tz: ZoneInfo):
+    """
+    Converte "start"/"end" in un istante confrontabile: "2025-03-25T08:40:00" con timeZone
+    e "2025-03-25T08:40:00+01:00" rappresentano lo stesso momento.
+    """
+    if not edge:
+        return None
+    if "dateTime" not in edge:
+        return edge.get("date")
+
+    istante = datetime.datetime.fromisoformat(edge["dateTime"])
+    if istante.tzinfo is None:
+        istante = istante.replace(tzinfo=ZoneInfo(edge.get("timeZone") or local_tz.key))
+    return istante.astimezone(datetime.timezone.utc)
+
+
+def _valore(body: dict, campo: str, local_tz: ZoneInfo):
+    """
+    Valore normalizzato di un campo: assenza e stringa vuota si equivalgono, colorId mancante è il colore
+    predefinito, di extendedProperties e reminders contano solo le chiavi scritte da format_event.
+    """
+    valore = body.get(campo)
+
+    if campo in ("start", "end"):
+        return _istante(valore, local_tz)
+    if campo == "extendedProperties":
+        return (valore or {}).get("private", {}).get("geopId")
+    if campo == "reminders":
+        return (valore or {}).get("useDefault", True)
+    return valore or ""
+
+
+def differenze(nuovo: dict, esistente: dict, local_tz: ZoneInfo = ZoneInfo("Europe/Rome")) -> dict:
+    """
+    Confronta il corpo calcolato da `parser.format_event` con l'evento presente su Google (o con
+    l'ultimo corpo inviato) e restituisce solo i campi da modificare.
+
+    Args:
+        nuovo (dict): Corpo dell'evento calcolato dai dati GEOP.
+        esistente (dict): Evento Google o ultimo corpo inviato.
+        local_tz (ZoneInfo): Fuso orario degli orari senza offset.
+
+    Returns:
+        dict: Corpo per events.patch con i soli campi cambiati (vuoto se non c'è niente da scrivere).
+    """
+    return {
+        campo: nuovo[campo] for campo in CAMPI
+        if campo in nuovo and _valore(nuovo, campo, local_tz) != _valore(esistente, campo, local_tz)
+    }
+
+
+class StatisticheCampi(Counter):
+    """
+    Conta, per ogni campo, quante volte è stato modificato durante una sincronizzazione.
+    """
+
+    def registra(self, patch: dict):
+        self.update(patch.keys())
+
+    def __str__(self):
+        if not self:
+            return "nessun campo modificato"
+        return ", ".join(f"{campo}={volte}" for campo, volte in self.most_common())
@@ -0,0 +1,217 @@
+# modello compatto degli eventi GEOP elaborati: un record a slot per evento, con inizio e fine già convertiti
+# e corpo Google e impronte calcolati una volta sola, più il formato binario calendar.bin
+import datetime
+import functools
+import marshal
+import operator
+import os
+import sys
+from dataclasses import dataclass, field, fields
+from zoneinfo import ZoneInfo
+
+import parser
+
+LOCAL_TZ = ZoneInfo("Europe/Rome")
+
+# eventi elaborati in formato binario (marshal), alternativa compatta a calendar.json
+CALENDARIO_BINARIO = "calendar.bin"
+
+# versione del formato di calendar.bin: marshal dipende anche dalla versione di Python, salvata nell'intestazione
+FORMATO = 1
+
+
+@dataclass(slots=True)
+class EventoGeop:
+    """
+    Evento GEOP elaborato (una voce di calendar.json) con i soli campi usati dalla sincronizzazione.
+
+    I campi mancanti nell'evento GEOP valgono None, come `event.get(...)`, così `impronta_geop` coincide
+    con `parser.impronta_evento` e `body` con `parser.format_event` dello stesso evento in forma di dizionario.
+
+    Attributes:
+        id (str): Id GEOP.
+        inizio / fine (int): Inizio e fine in secondi epoch (ora di Roma), calcolati una volta alla creazione.
+    """
+
+    id: str
+    title: str
+    materia: str
+    docente: str
+    aula: str
+    modalita: str
+    argomento: str
+    tooltip: str
+    classe: str
+    start: str
+    end: str
+    inizio: int
+    fine: int
+    # valori derivati, calcolati al primo utilizzo e non salvati in calendar.bin
+    _body: dict = field(default=None, repr=False, compare=False)
+    _impronta: str = field(default=None, repr=False, compare=False)
+    _impronta_geop: str = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def da_dizionario(cls, event: dict):
+        """
+        Crea il record da un evento di calendar.json (o di `parser.iter_parse`).
+
+        Returns:
+            EventoGeop: Il record, o None se l'evento non ha "Materia" (stesso filtro di `parser.chiave_evento`).
+        """
+        if not event.get("Materia"):
+            return None
+        return cls(
+            str(event.get("id")), event.get("title"), event.get("Materia"), event.get("Docente"), event.get("Aula"),
+            event.get("Modalità"), event.get("Argomento"), event.get("tooltip"), event.get("ClasseEvento"),
+            event.get("start"), event.get("end"), _epoch(event.get("start")), _epoch(event.get("end")),
+        )
+
+    def dizionario(self) -> dict:
+        """
+        Restituisce l'evento nel formato di calendar.json (senza le chiavi che valgono None).
+        """
+        event = {
+            "id": self.id, "title": self.title, "start": self.start, "end": self.end, "ClasseEvento": self.classe,
+            "tooltip": self.tooltip, "Materia": self.materia, "Aula": self.aula, "Docente": self.docente,
+            "Modalità": self.modalita, "Argomento": self.argomento,
+        }
+        return {chiave: valore for chiave, valore in event.items() if valore is not None}
+
+    @property
+    def chiave(self) -> tuple:
+        """
+        (prefisso di "Materia", start), come `parser.chiave_evento`.
+        """
+        return self.materia.split(" - ")[0].strip(), self.start
+
+    @property
+    def istanti(self) -> tuple:
+        """
+        (inizio, fine) come datetime con il fuso orario di Roma.
+        """
+        return datetime.datetime.fromtimestamp(self.inizio, LOCAL_TZ), datetime.datetime.fromtimestamp(self.fine, LOCAL_TZ)
+
+    @property
+    def body(self) -> dict:
+        """
+        Corpo dell'evento Google (`parser.format_event`), calcolato una volta sola. Non va modificato.
+        """
+        if self._body is None:
+            self._body = parser.format_event(self.dizionario())
+        return self._body
+
+    @property
+    def impronta(self) -> str:
+        """
+        Impronta del corpo Google (`parser.impronta_body`).
+        """
+        if self._impronta is None:
+            self._impronta = parser.impronta_body(self.body)
+        return self._impronta
+
+    @property
+    def impronta_geop(self) -> str:
+        """
+        Impronta dei campi rilevanti dell'evento GEOP (`parser.impronta_evento`).
+        """
+        if self._impronta_geop is None:
+            # stesso ordine di parser.CAMPI_RILEVANTI
+            self._impronta_geop = parser.impronta_campi((
+                self.materia, self.docente, self.aula, self.modalita, self.argomento, self.tooltip,
+                self.start, self.end, self.classe,
+            ))
+        return self._impronta_geop
+
+
+# campi salvati in calendar.bin, nell'ordine del costruttore: tutti tranne i valori derivati
+_CAMPI_SALVATI = operator.attrgetter(*(campo.name for campo in fields(EventoGeop) if not campo.name.startswith("_")))
+
+
+@functools.lru_cache(maxsize=4096)
+def _inizio_ora(ora: str) -> int:
+    # epoch dell'inizio di un'ora locale ("YYYY-MM-DDTHH"): i cambi d'ora avvengono allo scoccare dell'ora,
+    # quindi minuti e secondi si sommano senza rifare il calcolo del fuso
+    return int(datetime.datetime.fromisoformat(f"{ora}:00").replace(tzinfo=LOCAL_TZ).timestamp())
+
+
+def _epoch(valore: str) -> int:
+    if not valore:
+        return 0
+    # calendar.json ha orari locali senza fuso ("YYYY-MM-DDTHH:MM:SS") e le lezioni di un orario cadono in poche
+    # centinaia di ore diverse: fromisoformat, replace(tzinfo) e timestamp() per ogni evento erano la maggior parte
+    # del tempo di lettura di calendar.json come record
+    if len(valore) == 19 and valore[10] == "T":
+        return _inizio_ora(valore[:13]) + int(valore[14:16]) * 60 + int(valore[17:19])
+    istante = datetime.datetime.fromisoformat(valore)
+    if istante.tzinfo is None:
+        istante = istante.replace(tzinfo=LOCAL_TZ)
+    return int(istante.timestamp())
+
+
+def da_eventi(eventi) -> list:
+    """
+    Converte gli eventi di calendar.json (o di `parser.iter_parse`) in record, scartando quelli senza "Materia".
+    """
+    records = []
+    for event in eventi:
+        evento = EventoGeop.da_dizionario(event)
+        if evento is not None:
+            records.append(evento)
+    return records
+
+
+def salva(eventi: list, path: str = CALENDARIO_BINARIO) -> int:
+    """
+    Scrive i record in formato binario (marshal di tuple), in modo atomico.
+
+    Returns:
+        int: Numero di eventi scritti.
+    """
+    dati = marshal.dumps((FORMATO, sys.version_info[:2], [_CAMPI_SALVATI(evento) for evento in eventi]))
+    temporaneo = f"{path}.tmp"
+    with open(temporaneo, "wb") as file:
+        file.write(dati)
+    os.replace(temporaneo, path)
+    return len(eventi)
+
+
+def carica(path: str = CALENDARIO_BINARIO) -> list:
+    """
+    Legge i record scritti da `salva`.
+
+    Raises:
+        ValueError: Se il file non è nel formato atteso (altra versione del formato o di Python).
+    """
+    with open(path, "rb") as file:
+        # marshal.loads sui byte già letti: marshal.load da file legge a piccoli blocchi ed è molto più lento
+        dati = file.read()
+    try:
+        formato, versione, righe = marshal.loads(dati)
+    except (EOFError, TypeError, ValueError) as error:
+        raise ValueError(f"{path} non è un calendario binario valido") from error
+    if formato != FORMATO or tuple(versione) != sys.version_info[:2]:
+        raise ValueError(f"{path} è stato scritto con un altro formato o un'altra versione di Python")
+    return [EventoGeop(*riga) for riga in righe]
+
+
+def leggi(path: str) -> list:
+    """
+    Legge gli eventi elaborati come record, da calendar.bin o da calendar.json secondo l'estensione.
+    """
+    if path.endswith(".bin"):
+        return carica(path)
+    return da_eventi(parser.read_json(path))
+
+
+def scrivi(eventi_grezzi, path: str) -> int:
+    """
+    Elabora gli eventi GEOP grezzi (`parser.iter_parse`) e li scrive in calendar.bin o, secondo l'estensione,
+    in calendar.json con `parser.write_eventi`.
+
+    Returns:
+        int: Numero di eventi scritti (per calendar.bin solo quelli con "Materia").
+    """
+    if path.endswith(".bin"):
+        return salva(da_eventi(parser.iter_parse(eventi_grezzi)), path)
+    return parser.write_eventi(eventi_grezzi, path)
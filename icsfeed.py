@@ -0,0 +1,312 @@
+# uscita alternativa a Google Calendar: feed iCalendar (RFC 5545) degli eventi GEOP, da pubblicare
+# come file o servire in locale via HTTP; nessuna dipendenza dalle librerie Google
+import datetime
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import eventi
+import metrics
+import parser
+
+# feed generato e cache dei blocchi VEVENT già scritti (impronta, sequenza e testo per id GEOP)
+ICS_FEED = "geop.ics"
+ICS_CACHE = "geop_ics.json"
+
+# dominio degli UID: "<id GEOP>@UID_DOMINIO" resta uguale finché GEOP non cambia l'id della lezione
+UID_DOMINIO = "geop-calendar"
+
+# ogni quanto i client che si iscrivono al feed dovrebbero riscaricarlo (RFC 7986)
+INTERVALLO_AGGIORNAMENTO = "PT30M"
+
+# colorId di Google (vedi la tabella in parser.py) -> colore CSS più vicino per la proprietà COLOR (RFC 7986)
+COLORI = {
+    "1": "lightsteelblue",
+    "2": "aquamarine",
+    "3": "plum",
+    "4": "salmon",
+    "5": "gold",
+    "6": "sandybrown",
+    "7": "mediumturquoise",
+    "8": "lightgray",
+    "9": "cornflowerblue",
+    "10": "mediumseagreen",
+    "11": "crimson",
+}
+
+# le date degli eventi sono in ora locale di Roma (TZID): il feed deve descriverne il fuso
+_VTIMEZONE = (
+    "BEGIN:VTIMEZONE",
+    "TZID:Europe/Rome",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:+0100",
+    "TZOFFSETTO:+0200",
+    "TZNAME:CEST",
+    "DTSTART:19700329T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:+0200",
+    "TZOFFSETTO:+0100",
+    "TZNAME:CET",
+    "DTSTART:19701025T030000",
+    "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+)
+
+
+def _testo(valore) -> str:
+    """
+    Escape di un valore TEXT (RFC 5545, 3.3.11): ogni fine riga (\r\n, \r o \n) diventa "\\n".
+    """
+    valore = "" if valore is None else str(valore)
+    return (
+        valore.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\r", "\\n").replace("\n", "\\n")
+    )
+
+
+def _piega(riga: str) -> str:
+    """
+    Spezza una riga più lunga di 75 ottetti (RFC 5545, 3.1) senza dividere un carattere UTF-8.
+    """
+    if len(riga.encode("utf-8")) <= 75:
+        return riga
+    parti, corrente, ottetti = [], "", 0
+    for carattere in riga:
+        lunghezza = len(carattere.encode("utf-8"))
+        # le righe di continuazione iniziano con uno spazio, che conta nei 75 ottetti
+        if ottetti + lunghezza > (75 if not parti else 74):
+            parti.append(corrente)
+            corrente, ottetti = "", 0
+        corrente += carattere
+        ottetti += lunghezza
+    parti.append(corrente)
+    return "\r\n ".join(parti)
+
+
+def _data_locale(valore: str) -> str:
+    return datetime.datetime.fromisoformat(valore).strftime("%Y%m%dT%H%M%S")
+
+
+def vevent(body: dict, geop_id: str, sequenza: int, dtstamp: str) -> str:
+    """
+    Converte il corpo di un evento prodotto da `parser.format_event` in un blocco VEVENT.
+
+    Args:
+        body (dict): Evento nel formato dell'API di Google Calendar.
+        geop_id (str): Id GEOP, da cui deriva l'UID stabile.
+        sequenza (int): Numero di revisione dell'evento (SEQUENCE), incrementato a ogni modifica.
+        dtstamp (str): Istante UTC della revisione, formato YYYYMMDDTHHMMSSZ.
+
+    Returns:
+        str: Righe del blocco separate da CRLF, già piegate, senza CRLF finale.
+    """
+    righe = [
+        "BEGIN:VEVENT",
+        f"UID:{geop_id}@{UID_DOMINIO}",
+        f"DTSTAMP:{dtstamp}",
+        f"LAST-MODIFIED:{dtstamp}",
+        f"SEQUENCE:{sequenza}",
+        f"DTSTART;TZID={body['start']['timeZone']}:{_data_locale(body['start']['dateTime'])}",
+        f"DTEND;TZID={body['end']['timeZone']}:{_data_locale(body['end']['dateTime'])}",
+        f"SUMMARY:{_testo(body.get('summary'))}",
+    ]
+    if body.get("location"):
+        righe.append(f"LOCATION:{_testo(body['location'])}")
+    if body.get("description"):
+        righe.append(f"DESCRIPTION:{_testo(body['description'])}")
+    if body.get("colorId") in COLORI:
+        righe.append(f"COLOR:{COLORI[body['colorId']]}")
+    righe.append("END:VEVENT")
+    return "\r\n".join(_piega(riga) for riga in righe)
+
+
+def _leggi_cache(cache_path: str) -> dict:
+    try:
+        cache = parser.read_json(cache_path)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _scrivi_atomico(path: str, testo: str, newline: str = None):
+    temporaneo = f"{path}.tmp"
+    with open(temporaneo, "w", encoding="utf-8", newline=newline) as file:
+        file.write(testo)
+    os.replace(temporaneo, path)
+
+
+def aggiorna_feed(calendar_path: str = "calendar.json", feed_path: str = ICS_FEED, cache_path: str = ICS_CACHE,
+                  nome: str = "GEOP", eventi_geop: list = None) -> dict:
+    """
+    Rigenera il feed iCalendar dagli eventi di calendar.json.
+
+    Solo gli eventi aggiunti o modificati (impronta di `parser.format_event` diversa da quella in cache)
+    vengono riconvertiti, con SEQUENCE incrementata; gli altri riusano il blocco VEVENT già scritto,
+    identico byte per byte. Se nulla è cambiato e il feed esiste non viene scritto niente, così l'ETag
+    servito da `avvia_server` non cambia. Feed e cache vengono scritti in modo atomico.
+
+    Args:
+        calendar_path (str): Eventi GEOP elaborati (calendar.json o calendar.bin).
+        feed_path (str): File .ics da generare.
+        cache_path (str): Cache dei blocchi VEVENT.
+        nome (str): Nome del calendario mostrato dai client (X-WR-CALNAME).
+        eventi_geop (list): Record già letti da `calendar_path` (`eventi.leggi`); se None vengono letti qui.
+
+    Returns:
+        dict: Numero di eventi "aggiunti", "modificati", "rimossi" e "invariati", e "scritto" (bool).
+    """
+    precedenti = _leggi_cache(cache_path).get("eventi", {})
+    voci = {}
+    conteggio = {"aggiunti": 0, "modificati": 0, "rimossi": 0, "invariati": 0}
+    dtstamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    if eventi_geop is None:
+        eventi_geop = eventi.leggi(calendar_path)
+
+    for evento in eventi_geop:
+        geop_id, body, impronta = evento.id, evento.body, evento.impronta
+
+        precedente = precedenti.get(geop_id)
+        if precedente and precedente["impronta"] == impronta:
+            voci[geop_id] = precedente
+            conteggio["invariati"] += 1
+            continue
+
+        sequenza = precedente["sequenza"] + 1 if precedente else 0
+        voci[geop_id] = {
+            "impronta": impronta,
+            "sequenza": sequenza,
+            "start": body["start"]["dateTime"],
+            "vevent": vevent(body, geop_id, sequenza, dtstamp),
+        }
+        conteggio["modificati" if precedente else "aggiunti"] += 1
+        metrics.log(
+            f"Evento {'aggiornato' if precedente else 'aggiunto'} nel feed: {body['summary']} ({body['start']['dateTime']})",
+            "evento",
+        )
+
+    conteggio["rimossi"] = len(precedenti.keys() - voci.keys())
+    for operazione in ("aggiunti", "modificati", "rimossi"):
+        if conteggio[operazione]:
+            metrics.conta("feed_ics_eventi_total", conteggio[operazione], operazione=operazione)
+
+    conteggio["scritto"] = bool(conteggio["aggiunti"] or conteggio["modificati"] or conteggio["rimossi"]) \
+        or not os.path.exists(feed_path)
+    if conteggio["scritto"]:
+        with metrics.fase("scrittura"):
+            righe = [
+                "BEGIN:VCALENDAR",
+                "VERSION:2.0",
+                f"PRODID:-//{UID_DOMINIO}//GEOP//IT",
+                "CALSCALE:GREGORIAN",
+                "METHOD:PUBLISH",
+                _piega(f"X-WR-CALNAME:{_testo(nome)}"),
+                "X-WR-TIMEZONE:Europe/Rome",
+                f"REFRESH-INTERVAL;VALUE=DURATION:{INTERVALLO_AGGIORNAMENTO}",
+                f"X-PUBLISHED-TTL:{INTERVALLO_AGGIORNAMENTO}",
+                *_VTIMEZONE,
+                *(dati["vevent"] for _, dati in sorted(voci.items(), key=lambda coppia: (coppia[1]["start"], coppia[0]))),
+                "END:VCALENDAR",
+            ]
+            # CRLF come richiesto da RFC 5545: newline="" evita la conversione di "\n" su Windows
+            _scrivi_atomico(feed_path, "\r\n".join(righe) + "\r\n", newline="")
+            _scrivi_atomico(cache_path, json.dumps({"eventi": voci}, ensure_ascii=False))
+
+    metrics.log(
+        f"Feed iCalendar {feed_path}: {conteggio['aggiunti']} aggiunti, {conteggio['modificati']} modificati, "
+        f"{conteggio['rimossi']} rimossi, {conteggio['invariati']} invariati"
+        + ("." if conteggio["scritto"] else " (file non riscritto).")
+    )
+    return conteggio
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    def _rispondi(self, corpo: bool):
+        feed_path = self.server.feeds.get(self.path.split("?")[0])
+        contenuto = _contenuto(feed_path) if feed_path else None
+        if contenuto is None:
+            self.send_error(404)
+            return
+        data, etag = contenuto
+
+        # If-None-Match: il client ha già questa versione del feed
+        richiesti = {valore.strip().removeprefix("W/") for valore in self.headers.get("If-None-Match", "").split(",")}
+        if etag in richiesti or "*" in richiesti:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/calendar; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if corpo:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self._rispondi(corpo=True)
+
+    def do_HEAD(self):
+        self._rispondi(corpo=False)
+
+    def log_message(self, format, *args):
+        # una riga per ogni aggiornamento dei client sporcherebbe i log della sincronizzazione
+        pass
+
+
+# contenuto ed ETag dei feed serviti, ricalcolati solo quando il file cambia: path -> (versione, data, etag)
+_contenuti = {}
+_contenuti_lock = threading.Lock()
+
+
+def _contenuto(feed_path: str):
+    """
+    Restituisce (bytes, ETag) del feed, None se il file non esiste ancora.
+    """
+    try:
+        stat = os.stat(feed_path)
+    except OSError:
+        return None
+    versione = (stat.st_mtime_ns, stat.st_size)
+
+    with _contenuti_lock:
+        salvato = _contenuti.get(feed_path)
+        if salvato and salvato[0] == versione:
+            return salvato[1:]
+
+    try:
+        with open(feed_path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
+    etag = f'"{hashlib.sha1(data).hexdigest()}"'
+    with _contenuti_lock:
+        _contenuti[feed_path] = (versione, data, etag)
+    return data, etag
+
+
+def avvia_server(porta: int, feeds: dict, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Avvia in un thread in background un server HTTP che serve i feed iCalendar, con ETag e If-None-Match:
+    un client che riscarica un feed invariato riceve 304 senza corpo.
+
+    Args:
+        porta (int): Porta di ascolto (0 per una porta libera).
+        feeds (dict): Percorso URL -> file .ics (es. {"/geop.ics": "geop.ics"}). Il dizionario viene letto
+                      a ogni richiesta, quindi può essere aggiornato mentre il server è attivo.
+        host (str): Indirizzo di ascolto, per default solo locale.
+
+    Returns:
+        ThreadingHTTPServer: Il server avviato (`shutdown()` per fermarlo).
+    """
+    server = ThreadingHTTPServer((host, porta), _FeedHandler)
+    server.feeds = feeds
+    threading.Thread(target=server.serve_forever, daemon=True, name="feed-ics").start()
+    return server
@@ -1,30 +1,139 @@
+import time
+_AVVIO = time.perf_counter() # prima degli altri import, per misurarne la durata
+
 import user_login as ul
-import calendarapi
+import argparse
 import business
-import time
+import daemon
+import icsfeed
+import metrics
+import notifiche
+import polling
+import sys
+import traccia
+
+# durata degli import all'avvio: le librerie Google non sono tra questi (daemon le importa solo quando servono)
+DURATA_IMPORT = time.perf_counter() - _AVVIO
+metrics.registra_tempo("import", DURATA_IMPORT)
 
-def main():
+def profilo_locale(calendario_dedicato: bool = False, uscita: str = "google") -> dict:
+    """
+    Profilo dell'utente di main.py (vedi `daemon.carica_profili`), con i file nella cartella corrente.
+    """
+    return {
+        "nome": ul.username(),
+        "username": ul.username(),
+        "password": ul.password(),
+        "cartella": ".",
+        "calendar_id": "primary",
+        "calendario_dedicato": calendario_dedicato,
+        "credentials": "credentials.json",
+        "uscita": uscita,
+    }
+
+
+def main(calendario_dedicato: bool = False, anticipa_credenziali: bool = True, interattivo: bool = True,
+         uscita: str = "google") -> dict:
+    """
+    Esegue una sincronizzazione e ne restituisce l'esito (vedi `daemon.sincronizza_utente`), None se è fallita.
+    Con `calendario_dedicato` gli eventi vanno nel calendario secondario "GEOP" invece che in "primary";
+    con `anticipa_credenziali=False` le librerie e le credenziali Google si caricano solo se GEOP è cambiato;
+    con `interattivo=False` un token mancante o revocato fa fallire il ciclo invece di aprire il browser;
+    con `uscita="ics"` gli eventi vanno nel feed iCalendar geop.ics invece che su Google Calendar.
+    Se le tracce sono attive (`traccia.configura`) il ciclo viene tracciato e, se lento o profilato, salvato.
+    """
     try:
         # variabili
-        login_payload = {
-            "username": ul.username(),
-            "password": ul.password()
-        }
+        profilo = profilo_locale(calendario_dedicato, uscita)
 
         date = business.weeks_range(6) # {"start": "2025-10-01", "end": "2025-12-30"}
 
-        response = business.get_calendar(login_payload, date)
+        # stessa pipeline del demone multi-utente, con i file nella cartella corrente
+        with traccia.ciclo("main") as tracciato:
+            esito = daemon.sincronizza_utente(profilo, date, interattivo=interattivo, anticipa_credenziali=anticipa_credenziali)
+            if tracciato:
+                tracciato.radice["attributi"].update(ok=esito["ok"], saltato=esito["saltato"], errore=esito["errore"])
+        if tracciato and tracciato.file:
+            metrics.log(f"Ciclo di {esito['durata']:.1f} s salvato in {tracciato.file}.")
+        return esito
 
-        creds = calendarapi.accesso()
+    except Exception as error:
+        metrics.log(f"Errore durante l'esecuzione: {error}", "errore")
 
-        calendarapi.sync_calendar(creds, date)
 
-    except Exception as error:
-        print(f"Errore durante l'esecuzione: {error}")
+def profilo_avvio(esito: dict) -> str:
+    """
+    Riassume un'esecuzione singola: durata degli import e del ciclo, tempo totale dall'avvio di main.py
+    (esclusa l'inizializzazione dell'interprete) e se le librerie Google sono state caricate.
+    """
+    ciclo = esito["durata"] if esito else 0.0
+    google = "caricate" if "googleapiclient" in sys.modules else "non caricate"
+    return (
+        f"Avvio: import {DURATA_IMPORT:.3f} s, ciclo {ciclo:.3f} s, totale {time.perf_counter() - _AVVIO:.3f} s "
+        f"(librerie Google {google})."
+    )
 
 
 if __name__ == "__main__":
-    while True:
-        main()
-        time.sleep(1800)
+    cli = argparse.ArgumentParser(description="Sincronizza il calendario GEOP su Google Calendar")
+    cli.add_argument("--log", choices=metrics.LIVELLI, default="evento",
+                     help="livello dei log: \"info\" toglie le righe per singolo evento, \"errore\" lascia solo gli errori")
+    cli.add_argument("--metriche-porta", type=int, default=None, help="porta locale su cui esporre /metrics per Prometheus")
+    cli.add_argument("--metriche-file", default=None, help="file .prom per il textfile collector di node_exporter")
+    cli.add_argument("--calendario-dedicato", action="store_true",
+                     help="sincronizza in un calendario secondario \"GEOP\" (spostandovi gli eventi GEOP di primary)")
+    cli.add_argument("--ics", action="store_true",
+                     help="scrive gli eventi nel feed iCalendar geop.ics invece che su Google Calendar (niente API né OAuth)")
+    cli.add_argument("--ics-porta", type=int, default=None,
+                     help="porta locale su cui servire geop.ics (/geop.ics, con ETag) a cui iscrivere i client di calendario")
+    cli.add_argument("--push-url", default=None,
+                     help="URL HTTPS pubblico per le notifiche push di Google (events.watch), inoltrato a --push-porta: "
+                          "le modifiche fatte su Google vengono riparate in pochi secondi")
+    cli.add_argument("--push-porta", type=int, default=8766, help="porta locale del ricevitore delle notifiche push")
+    cli.add_argument("--traccia-soglia", type=float, default=None,
+                     help="salva la traccia (fasi e richieste HTTP) dei cicli più lunghi di questi secondi")
+    cli.add_argument("--profila", type=float, default=0.0,
+                     help="frazione dei cicli (0-1) eseguiti sotto cProfile, salvati sempre con la traccia")
+    cli.add_argument("--tracce", default=traccia.TRACCE,
+                     help=f"cartella delle tracce salvate (restano le ultime {traccia.MAX_TRACCE})")
+    cli.add_argument("--once", action="store_true",
+                     help="esegue un solo ciclo ed esce (codice 1 se fallisce), per cron o un timer di systemd")
+    args = cli.parse_args()
+
+    metrics.imposta_livello(args.log)
+    traccia.configura(args.traccia_soglia, args.profila, args.tracce)
+    uscita = "ics" if args.ics else "google"
+
+    if args.once:
+        # nessun server delle metriche: il processo termina subito, le metriche vanno in --metriche-file
+        # da cron o systemd non c'è nessuno che completi il login nel browser
+        esito = main(args.calendario_dedicato, anticipa_credenziali=False, interattivo=sys.stdin.isatty(), uscita=uscita)
+        metrics.log(profilo_avvio(esito))
+        if args.metriche_file:
+            metrics.scrivi_textfile(args.metriche_file)
+        sys.exit(0 if esito and esito["ok"] else 1)
+
+    if args.metriche_porta is not None:
+        metrics.avvia_server(args.metriche_porta)
+    if args.ics_porta is not None:
+        icsfeed.avvia_server(args.ics_porta, {f"/{icsfeed.ICS_FEED}": icsfeed.ICS_FEED})
+    ricevitore = None
+    if args.push_url and not args.ics:
+        ricevitore = notifiche.RicevitoreNotifiche(args.push_url)
+        notifiche.avvia_server(args.push_porta, ricevitore)
+
+    def ciclo():
+        esito = main(args.calendario_dedicato, uscita=uscita)
+        if ricevitore is not None and esito and esito["ok"]:
+            # dopo il primo ciclo riuscito: il canale resta aperto e si rinnova da sé
+            try:
+                daemon.attiva_notifiche(ricevitore, profilo_locale(args.calendario_dedicato, uscita))
+            except Exception as error:
+                metrics.log(f"Attivazione delle notifiche push non riuscita: {error}", "errore")
+        if args.metriche_file:
+            metrics.scrivi_textfile(args.metriche_file)
+        return esito
+
+    # più spesso a ridosso delle lezioni, meno di notte, nel weekend e quando GEOP non cambia
+    polling.esegui(ciclo)
 
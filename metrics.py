@@ -0,0 +1,212 @@
+# metriche del processo (tempi delle fasi e contatori delle chiamate) nel formato testuale di Prometheus
+# e livello dei messaggi stampati nei log
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import traccia
+
+# livelli dei log, dal più dettagliato: "evento" stampa una riga per ogni evento letto o scritto,
+# "info" solo i riepiloghi, "errore" solo gli errori
+LIVELLI = ("evento", "info", "errore")
+
+# prefisso comune dei nomi delle metriche
+PREFISSO = "geop_calendar"
+
+# fasi cronometrate della sincronizzazione ("import": import dei moduli all'avvio di main.py)
+FASI = ("import", "geop_login", "geop_fetch", "parse", "google_read", "riconciliazione", "scrittura", "sincronizzazione")
+
+_DESCRIZIONI = {
+    "fase_secondi": ("summary", "Durata delle fasi della sincronizzazione, in secondi."),
+    "chiamate_api_total": ("counter", "Richieste HTTP inviate, per servizio e metodo (le sotto-richieste batch contano singolarmente)."),
+    "modifiche_total": ("counter", "Modifiche a Google Calendar, per operazione ed esito (ok, errore, rinviata)."),
+    "sincronizzazioni_total": ("counter", "Sincronizzazioni degli utenti, per esito (ok, saltata, errore)."),
+    "feed_ics_eventi_total": ("counter", "Eventi rigenerati nel feed iCalendar, per operazione (aggiunti, modificati, rimossi)."),
+    "notifiche_google_total": ("counter", "Notifiche push di Google Calendar accettate, per stato della risorsa (exists, not_exists)."),
+    "lavori_total": ("counter", "Lavori della coda condivisa eseguiti da questo nodo, per esito (ok, errore, perso)."),
+    "riconciliazioni_push_total": ("counter", "Riconciliazioni avviate dalle notifiche push, per esito (ok, saltata, errore)."),
+}
+
+_livello = 0
+_tempi = {}
+_contatori = {}
+_lock = threading.Lock()
+
+
+def imposta_livello(livello: str):
+    """
+    Imposta il livello minimo dei messaggi stampati da `log`.
+
+    Raises:
+        ValueError: Se il livello non è tra `LIVELLI`.
+    """
+    global _livello
+    if livello not in LIVELLI:
+        raise ValueError(f"livello deve essere uno tra: {', '.join(LIVELLI)}")
+    _livello = LIVELLI.index(livello)
+
+
+def log(messaggio: str, livello: str = "info"):
+    """
+    Stampa il messaggio se il suo livello non è inferiore a quello impostato con `imposta_livello`.
+    """
+    if LIVELLI.index(livello) >= _livello:
+        print(messaggio)
+
+
+def registra_tempo(nome: str, secondi: float):
+    """
+    Aggiunge una durata alla fase indicata.
+    """
+    with _lock:
+        conteggio, somma = _tempi.get(nome, (0, 0.0))
+        _tempi[nome] = (conteggio + 1, somma + secondi)
+
+
+@contextlib.contextmanager
+def fase(nome: str):
+    """
+    Cronometra il blocco `with` e ne registra la durata nella fase indicata, anche se solleva un'eccezione.
+    Se il ciclo è tracciato (`traccia.ciclo`) la fase è anche uno span, che contiene le richieste HTTP del blocco.
+
+    Example:
+        with metrics.fase("google_read"):\n
+            eventi = read_calendar(creds, date)
+    """
+    inizio = time.perf_counter()
+    try:
+        with traccia.span(nome):
+            yield
+    finally:
+        registra_tempo(nome, time.perf_counter() - inizio)
+
+
+def conta(nome: str, quantita: int = 1, **etichette):
+    """
+    Incrementa il contatore `nome` per la combinazione di etichette indicata.
+
+    Example:
+        metrics.conta("chiamate_api_total", servizio="google", metodo="events.list")
+    """
+    chiave = (nome, tuple(sorted(etichette.items())))
+    with _lock:
+        _contatori[chiave] = _contatori.get(chiave, 0) + quantita
+
+
+def tempi() -> dict:
+    """
+    Restituisce le durate registrate: fase -> (numero di misure, secondi totali).
+    """
+    with _lock:
+        return dict(_tempi)
+
+
+def contatori() -> dict:
+    """
+    Restituisce i contatori: (nome, etichette ordinate) -> valore.
+    """
+    with _lock:
+        return dict(_contatori)
+
+
+def azzera():
+    """
+    Azzera tempi e contatori (usato dai benchmark per misurare un singolo ciclo).
+    """
+    with _lock:
+        _tempi.clear()
+        _contatori.clear()
+
+
+def _etichette(coppie) -> str:
+    """
+    Formatta le etichette come {nome="valore",...}, con l'escape richiesto dal formato di Prometheus.
+    """
+    if not coppie:
+        return ""
+    valori = []
+    for nome, valore in coppie:
+        valore = str(valore).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        valori.append(f'{nome}="{valore}"')
+    return "{" + ",".join(valori) + "}"
+
+
+def esporta() -> str:
+    """
+    Restituisce tutte le metriche nel formato testuale di Prometheus (versione 0.0.4).
+
+    Returns:
+        str: Testo da servire su /metrics o da scrivere nel file letto dal textfile collector.
+    """
+    with _lock:
+        tempi_fasi = sorted(_tempi.items())
+        valori = sorted(_contatori.items())
+
+    righe = []
+
+    def intestazione(nome):
+        tipo, descrizione = _DESCRIZIONI.get(nome, ("untyped", nome))
+        righe.append(f"# HELP {PREFISSO}_{nome} {descrizione}")
+        righe.append(f"# TYPE {PREFISSO}_{nome} {tipo}")
+
+    if tempi_fasi:
+        intestazione("fase_secondi")
+        for nome, (conteggio, somma) in tempi_fasi:
+            etichette = _etichette([("fase", nome)])
+            righe.append(f"{PREFISSO}_fase_secondi_sum{etichette} {somma:.6f}")
+            righe.append(f"{PREFISSO}_fase_secondi_count{etichette} {conteggio}")
+
+    precedente = None
+    for (nome, coppie), valore in valori:
+        if nome != precedente:
+            intestazione(nome)
+            precedente = nome
+        righe.append(f"{PREFISSO}_{nome}{_etichette(coppie)} {valore}")
+
+    return "\n".join(righe) + "\n"
+
+
+def scrivi_textfile(path: str):
+    """
+    Scrive le metriche in un file per il textfile collector di node_exporter.
+    La scrittura è atomica: il collector non legge mai un file a metà.
+    """
+    temporaneo = f"{path}.tmp"
+    with open(temporaneo, "w", encoding="utf-8") as file:
+        file.write(esporta())
+    os.replace(temporaneo, path)
+
+
+class _MetricheHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = esporta().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # una riga per ogni scrape sporcherebbe i log della sincronizzazione
+        pass
+
+
+def avvia_server(porta: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Avvia in un thread in background un server HTTP che espone le metriche su /metrics.
+
+    Args:
+        porta (int): Porta di ascolto (0 per una porta libera).
+        host (str): Indirizzo di ascolto, per default solo locale.
+
+    Returns:
+        ThreadingHTTPServer: Il server avviato (`shutdown()` per fermarlo).
+    """
+    server = ThreadingHTTPServer((host, porta), _MetricheHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metriche").start()
+    return server
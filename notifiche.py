@@ -0,0 +1,317 @@
+# notifiche push di Google Calendar (events.watch): un canale per calendario sincronizzato e un piccolo server HTTP
+# locale che riceve le notifiche e avvia la riconciliazione del solo calendario modificato, pochi secondi dopo la modifica
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+
+# canale di notifica aperto per il calendario dell'utente: {"id", "resourceId", "token", "scadenza", ...}
+CANALE = "google_canale.json"
+
+# durata richiesta per i canali (parametro ttl): Google può concederne una più breve, che si legge dalla risposta
+DURATA_CANALE = 7 * 24 * 3600
+
+# il canale si rinnova RINNOVO_CANALE_ANTICIPO secondi prima della scadenza; dopo un errore si riprova
+# tra RINNOVO_CANALE_RIPROVA secondi (intanto il canale vecchio, se non ancora scaduto, continua a funzionare)
+RINNOVO_CANALE_ANTICIPO = 3600
+RINNOVO_CANALE_RIPROVA = 300
+
+# Google invia una notifica per ogni modifica: quelle che arrivano entro RITARDO_NOTIFICHE secondi dalla prima
+# (es. un batch di 50 scritture o lo spostamento di più lezioni) producono una sola riconciliazione
+RITARDO_NOTIFICHE = 2.0
+
+
+def leggi_canale(canale_path: str = CANALE) -> dict:
+    """
+    Legge il canale salvato, vuoto se il file manca o è illeggibile.
+    """
+    try:
+        with open(canale_path, "r", encoding="utf-8") as file:
+            canale = json.load(file)
+        return canale if isinstance(canale, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def salva_canale(canale: dict, canale_path: str = CANALE):
+    """
+    Scrive il canale in modo atomico.
+    """
+    temporaneo = f"{canale_path}.tmp"
+    with open(temporaneo, "w", encoding="utf-8") as file:
+        json.dump(canale, file, ensure_ascii=False)
+    os.replace(temporaneo, canale_path)
+
+
+class RicevitoreNotifiche:
+    """
+    Canali di notifica di Google Calendar e loro notifiche, per uno o più calendari (uno per utente).
+
+    Ogni calendario è registrato con una chiave (es. il nome dell'utente) e tre funzioni:
+        - apri(id_canale, token, indirizzo, durata): apre il canale con events.watch e ne restituisce la risposta
+          (vedi `calendarapi.apri_canale`)
+        - chiudi(id_canale, resource_id): chiude un canale con channels.stop (vedi `calendarapi.chiudi_canale`)
+        - riconcilia(): sincronizza il calendario, chiamata dopo le notifiche di una modifica
+
+    Il canale aperto viene salvato nel file indicato: al riavvio si riusa finché non è vicino alla scadenza,
+    invece di aprirne un altro mentre il precedente continua a inviare notifiche. Un thread in background
+    apre un nuovo canale `RINNOVO_CANALE_ANTICIPO` secondi prima della scadenza e chiude il vecchio solo dopo,
+    così nessuna modifica resta senza notifica.
+
+    Una notifica viene accettata solo se l'id del canale è noto e il token coincide con quello scelto all'apertura
+    (Google lo ripete in X-Goog-Channel-Token): chi conosce solo l'URL non può avviare sincronizzazioni.
+
+    Attributes:
+        indirizzo (str): URL HTTPS pubblico a cui Google invia le notifiche (inoltrato al server di `avvia_server`).
+        notifiche (int): Notifiche di modifica accettate.
+        riconciliazioni (int): Riconciliazioni avviate dalle notifiche.
+    """
+
+    def __init__(self, indirizzo: str, ritardo: float = RITARDO_NOTIFICHE, durata: int = DURATA_CANALE):
+        self.indirizzo = indirizzo
+        self.ritardo = ritardo
+        self.durata = durata
+        self.notifiche = 0
+        self.riconciliazioni = 0
+        # chiave -> {"calendar_id", "apri", "chiudi", "riconcilia", "path", "canale", "timer"}
+        self._voci = {}
+        # id canale -> (chiave, token): contiene anche il canale vecchio durante il rinnovo
+        self._canali = {}
+        # chiave -> timer della riconciliazione in attesa
+        self._in_attesa = {}
+        self._lock = threading.Lock()
+
+    def registra(self, chiave: str, calendar_id: str, apri, chiudi, riconcilia, canale_path: str = CANALE):
+        """
+        Attiva le notifiche per un calendario, riusando il canale salvato se è ancora valido.
+        Se la chiave è già registrata per lo stesso calendario aggiorna solo le funzioni.
+
+        Raises:
+            HttpError: Se Google rifiuta l'apertura del canale (es. indirizzo non verificato o non HTTPS).
+        """
+        with self._lock:
+            voce = self._voci.get(chiave)
+            if voce and voce["calendar_id"] == calendar_id:
+                voce.update(apri=apri, chiudi=chiudi, riconcilia=riconcilia)
+                return
+
+        if voce:
+            # calendario cambiato (es. passaggio al calendario dedicato): il canale vecchio non serve più
+            self.rimuovi(chiave)
+
+        voce = {"calendar_id": calendar_id, "apri": apri, "chiudi": chiudi, "riconcilia": riconcilia,
+                "path": canale_path, "canale": None, "timer": None}
+        canale = leggi_canale(canale_path)
+        valido = (canale.get("calendar_id") == calendar_id and canale.get("indirizzo") == self.indirizzo
+                  and canale.get("scadenza", 0) - time.time() > RINNOVO_CANALE_ANTICIPO)
+
+        if valido:
+            metrics.log(f"[{chiave}] Canale di notifica {canale['id']} riusato (scade il {_data(canale['scadenza'])}).")
+        else:
+            if canale.get("id") and canale.get("scadenza", 0) > time.time():
+                self._chiudi(voce, canale)
+            canale = self._apri(voce)
+
+        with self._lock:
+            voce["canale"] = canale
+            self._voci[chiave] = voce
+            self._canali[canale["id"]] = (chiave, canale["token"])
+            self._pianifica(chiave)
+
+    def rimuovi(self, chiave: str):
+        """
+        Disattiva le notifiche di un calendario chiudendone il canale.
+        """
+        with self._lock:
+            voce = self._voci.pop(chiave, None)
+            if voce is None:
+                return
+            if voce["timer"] is not None:
+                voce["timer"].cancel()
+            attesa = self._in_attesa.pop(chiave, None)
+            if attesa is not None:
+                attesa.cancel()
+            self._canali.pop(voce["canale"]["id"], None)
+
+        self._chiudi(voce, voce["canale"])
+        try:
+            os.remove(voce["path"])
+        except OSError:
+            pass
+
+    def chiavi(self) -> set:
+        """
+        Chiavi dei calendari registrati.
+        """
+        with self._lock:
+            return set(self._voci)
+
+    def chiudi(self):
+        """
+        Chiude tutti i canali e ferma i rinnovi, es. all'uscita del programma.
+        """
+        for chiave in self.chiavi():
+            self.rimuovi(chiave)
+
+    def notifica(self, id_canale: str, token: str, stato: str) -> int:
+        """
+        Gestisce una notifica ricevuta e restituisce lo status HTTP della risposta.
+
+        Args:
+            id_canale (str): Intestazione X-Goog-Channel-ID.
+            token (str): Intestazione X-Goog-Channel-Token.
+            stato (str): Intestazione X-Goog-Resource-State: "sync" all'apertura del canale, "exists" o
+                         "not_exists" dopo una modifica.
+
+        Returns:
+            int: 200 se accettata, 404 per un canale sconosciuto (es. chiuso) e 403 per un token errato.
+                 Google non ripete le notifiche rifiutate con questi codici.
+        """
+        with self._lock:
+            chiave, atteso = self._canali.get(id_canale, (None, None))
+            if chiave is None:
+                return 404
+            if not secrets.compare_digest((token or "").encode(), atteso.encode()):
+                metrics.log(f"[{chiave}] Notifica con token errato sul canale {id_canale}, ignorata.", "errore")
+                return 403
+            # la notifica "sync" conferma solo l'apertura del canale
+            if stato == "sync":
+                return 200
+
+            self.notifiche += 1
+            metrics.conta("notifiche_google_total", stato=stato)
+            if chiave not in self._in_attesa:
+                timer = threading.Timer(self.ritardo, self._riconcilia, (chiave,))
+                timer.daemon = True
+                timer.name = "riconcilia-notifiche"
+                self._in_attesa[chiave] = timer
+                timer.start()
+            return 200
+
+    def _riconcilia(self, chiave: str):
+        with self._lock:
+            # le notifiche che arrivano da qui in poi (anche quelle delle scritture della riconciliazione)
+            # ne programmano un'altra: una modifica a metà lettura non va persa
+            self._in_attesa.pop(chiave, None)
+            voce = self._voci.get(chiave)
+            if voce is None:
+                return
+            self.riconciliazioni += 1
+            riconcilia = voce["riconcilia"]
+
+        metrics.log(f"[{chiave}] Modifica su Google Calendar notificata: riconciliazione.")
+        try:
+            riconcilia()
+        except Exception as error:
+            metrics.log(f"[{chiave}] Riconciliazione dopo la notifica non riuscita: {error}", "errore")
+
+    def _apri(self, voce: dict) -> dict:
+        id_canale, token = str(uuid.uuid4()), secrets.token_urlsafe(32)
+        risposta = voce["apri"](id_canale, token, self.indirizzo, self.durata)
+        # expiration è in millisecondi dall'epoch, come stringa
+        scadenza = int(risposta.get("expiration") or 0) / 1000 or time.time() + self.durata
+        canale = {"id": id_canale, "resourceId": risposta["resourceId"], "token": token, "scadenza": scadenza,
+                  "calendar_id": voce["calendar_id"], "indirizzo": self.indirizzo}
+        salva_canale(canale, voce["path"])
+        metrics.log(f"Canale di notifica {id_canale} aperto per {voce['calendar_id']} (scade il {_data(scadenza)}).")
+        return canale
+
+    def _chiudi(self, voce: dict, canale: dict):
+        try:
+            voce["chiudi"](canale["id"], canale["resourceId"])
+        except Exception as error:
+            # un canale non chiuso smette comunque di inviare notifiche alla scadenza, e quelle in arrivo ricevono 404
+            metrics.log(f"Chiusura del canale di notifica {canale['id']} non riuscita: {error}", "errore")
+
+    def _pianifica(self, chiave: str, minimo: float = 0.0):
+        """
+        Programma il rinnovo del canale `RINNOVO_CANALE_ANTICIPO` secondi prima della scadenza,
+        ma non prima di `minimo` secondi. Va chiamata con il lock acquisito.
+        """
+        voce = self._voci[chiave]
+        if voce["timer"] is not None:
+            voce["timer"].cancel()
+        attesa = voce["canale"]["scadenza"] - time.time() - RINNOVO_CANALE_ANTICIPO
+        voce["timer"] = threading.Timer(max(minimo, attesa), self._rinnovo_programmato, (chiave,))
+        voce["timer"].daemon = True
+        voce["timer"].name = "rinnovo-canale"
+        voce["timer"].start()
+
+    def _rinnovo_programmato(self, chiave: str):
+        with self._lock:
+            voce = self._voci.get(chiave)
+            # calendario rimosso o timer sostituito mentre attendeva il lock
+            if voce is None or voce["timer"] is not threading.current_thread():
+                return
+
+        try:
+            nuovo = self._apri(voce)
+        except Exception as error:
+            metrics.log(f"[{chiave}] Rinnovo del canale di notifica non riuscito: {error}", "errore")
+            with self._lock:
+                if self._voci.get(chiave) is voce:
+                    self._pianifica(chiave, minimo=RINNOVO_CANALE_RIPROVA)
+            return
+
+        with self._lock:
+            if self._voci.get(chiave) is voce:
+                vecchio = voce["canale"]
+                voce["canale"] = nuovo
+                self._canali[nuovo["id"]] = (chiave, nuovo["token"])
+                self._canali.pop(vecchio["id"], None)
+                self._pianifica(chiave, minimo=RINNOVO_CANALE_RIPROVA)
+            else:
+                # calendario rimosso durante l'apertura: il nuovo canale non serve
+                vecchio = nuovo
+        # il vecchio canale si chiude solo quando il nuovo è attivo
+        self._chiudi(voce, vecchio)
+
+
+def _data(istante: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(istante))
+
+
+class _NotificheHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        # il corpo delle notifiche di Calendar è vuoto: tutto è nelle intestazioni
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        status = self.server.ricevitore.notifica(
+            self.headers.get("X-Goog-Channel-ID", ""),
+            self.headers.get("X-Goog-Channel-Token", ""),
+            self.headers.get("X-Goog-Resource-State", ""),
+        )
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # una riga per notifica sporcherebbe i log della sincronizzazione
+        pass
+
+
+def avvia_server(porta: int, ricevitore: RicevitoreNotifiche, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Avvia in un thread in background il server HTTP che riceve le notifiche di Google (POST su qualunque percorso).
+
+    Google invia le notifiche solo a un indirizzo HTTPS pubblico con certificato valido (`RicevitoreNotifiche.indirizzo`):
+    il server ascolta in locale e va raggiunto tramite un reverse proxy o un tunnel che termina il TLS.
+
+    Args:
+        porta (int): Porta di ascolto (0 per una porta libera).
+        ricevitore (RicevitoreNotifiche): Destinatario delle notifiche.
+        host (str): Indirizzo di ascolto, per default solo locale.
+
+    Returns:
+        ThreadingHTTPServer: Il server avviato (`shutdown()` per fermarlo).
+    """
+    server = ThreadingHTTPServer((host, porta), _NotificheHandler)
+    server.ricevitore = ricevitore
+    threading.Thread(target=server.serve_forever, daemon=True, name="notifiche-google").start()
+    return server
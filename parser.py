@@ -1,7 +1,26 @@
+import codecs
+import hashlib
+import html
 import json
+import os
 import re
+import time
 from requests import Response # importo la classe per dichiarare il tipo di oggetto che voglio riceveres
 
+# chiavi attese nel tooltip (in minuscolo): "Modalità" può arrivare anche come entità HTML
+_CHIAVI_TOOLTIP = frozenset(("materia", "aula", "corsi", "docente", "argomento", "modalit&agrave;", "modalità"))
+# stessa ricerca come regex compilata una volta sola, per le (rare) righe con più chiavi:
+# una chiave è valida all'inizio del testo o dopo uno spazio
+_CHIAVE_TOOLTIP = re.compile(
+    r"(?<!\S)(Materia|Aula|Corsi|Docente|Argomento|Modalit(?:&agrave;|à)):\s*",
+    re.IGNORECASE,
+)
+
+# dimensione dei blocchi letti dalla risposta GEOP durante la decodifica in streaming
+BLOCCO_STREAM = 64 * 1024
+# encoder di calendar.json creato una volta sola (json.dumps ne costruirebbe uno per evento)
+_ENCODER_CALENDARIO = json.JSONEncoder(indent=4, ensure_ascii=False)
+
 
 def parse_json(json_data: list) -> list:
     """
@@ -10,29 +29,44 @@ def parse_json(json_data: list) -> list:
         - Scarta gli eventi con id==0 o la cui "Materia" contiene "SOSPENSIONE DIDATTICA"s.
     
     Args:
-        json_data (list): Lista di dizionari che rappresentano gli eventi.
+        json_data (list): Lista (o qualunque iterabile, es. `iter_eventi`) di dizionari che rappresentano gli eventi.
     
     Returns:
         list: Una lista di dizionari con i dati formattati.
     """
-    parsed_events = []
+    return list(iter_parse(json_data))
+
+
+def iter_parse(json_data):
+    """
+    Come `parse_json`, ma restituisce gli eventi elaborati uno alla volta (generatore),
+    così un flusso di eventi può essere elaborato e scritto senza tenerlo tutto in memoria.
+    """
     for event in json_data:
         # scarta l'evento se l'id è 0 o se la materia contiene "SOSPENSIONE DIDATTICA"
         if event.get("id") == 0 or event.get("title", "").strip().startswith("SOSPENSIONE DIDATTICA"):
             continue
 
         if "tooltip" in event:
-            tooltip_text = event["tooltip"]
-            parsed_tooltip = parse_tooltip(tooltip_text)
-            parsed_event = {**event, **parsed_tooltip}
-            parsed_events.append(parsed_event)
-            
-    return parsed_events
+            yield {**event, **parse_tooltip(event["tooltip"])}
 
 
 def parse_tooltip(tooltip: str) -> dict:
     """
     Formatta la stringa tooltip estraendo coppie chiave-valore per chiavi note.
+
+    Le righe (separate da <br>) vengono lette in un solo passaggio, con queste regole:
+        - la prima riga non vuota è lo stato ("tooltip", es. "PRESENTE");
+        - una chiave nota seguita da ":" (a inizio riga o dopo uno spazio) apre sempre un nuovo valore,
+          anche se quello precedente è vuoto: "Docente:  Aula: B2" dà Docente "" e Aula "B2"
+          (prima di questo parser "Aula: B2" finiva nel valore di Docente);
+        - il valore arriva fino alla chiave successiva; le righe senza chiave lo continuano, unite da uno spazio;
+        - i ":" non preceduti da una chiave nota restano nel valore ("Materia: Intro: basi");
+        - la chiave mantiene la grafia del tooltip, tranne "Modalità" (anche come entità HTML), normalizzata
+          e senza il "-" iniziale del valore; se una chiave si ripete vale l'ultima;
+        - le entità HTML (&agrave;, &amp;, &#39;, ...) dei valori vengono decodificate.
+    Solo le righe con altri ":" passano dalla regex `_CHIAVE_TOOLTIP`, per trovare più chiavi sulla stessa riga.
+    Gli esempi di riferimento sono in tests/test_parser.py.
     
     Args:
         tooltip (str): Il testo del tooltip contenente informazioni in formato chiave-valore.
@@ -41,46 +75,143 @@ def parse_tooltip(tooltip: str) -> dict:
         dict: Un dizionario con le coppie chiave-valore estratte.
     """
     result = {}
+    chiave = None
+    valore = []
 
-    # splitta per <br> e pulisce le righe
-    lines = [line.strip() for line in tooltip.split("<br>") if line.strip()]
-    
-    # la prima riga è lo stato (es. "PRESENTE")
-    if lines:
-        result["tooltip"] = lines[0]
-    
-    # unisce il resto in un'unica stringa
-    rest = " ".join(lines[1:])
-    
-    # definisce le chiavi attese da estrarre 
-    expected_keys = ["Materia", "Aula", "Corsi", "Docente", "Argomento", "Modalit&agrave;"]
-
-    # Costruisce un'espressione regolare per trovare coppie "Chiave: Valore" nel testo
-    # Il pattern cerca:
-    # 1. Una delle chiavi presenti in expected_keys seguita da ":"
-    # 2. Il valore corrispondente, che può contenere qualsiasi carattere fino a quando:
-    #    - Non incontra un'altra chiave seguita da ":" (cioè l'inizio di un'altra coppia chiave-valore)
-    #    - Oppure fino alla fine della stringa ($)
-    pattern = r"(" + "|".join(expected_keys) + r"):\s*(.*?)(?=\s+(?:" + "|".join(expected_keys) + r"):\s*|$)"
-
-    # Applica il pattern per trovare tutte le coppie chiave-valore nel testo
-    matches = re.findall(pattern, rest, flags=re.IGNORECASE)
-
-    for key, value in matches:
-        key = key.strip()
-        value = value.strip()
-
-        # normalizza la chiave "Modalit&agrave;" in "Modalità" e rimuove il trattino iniziale se presente
-        if key.lower() == "modalit&agrave;":
-            key = "Modalità"
-            if value.startswith("-"):
-                value = value[1:].strip()
-
-        result[key] = value
-    
+    for riga in tooltip.split("<br>"):
+        riga = riga.strip()
+        if not riga:
+            continue
+
+        # la prima riga è lo stato (es. "PRESENTE")
+        if not result and chiave is None:
+            result["tooltip"] = html.unescape(riga) if "&" in riga else riga
+            continue
+
+        testa, due_punti, coda = riga.partition(":")
+        if due_punti and testa.lower() in _CHIAVI_TOOLTIP:
+            _aggiungi(result, chiave, valore)
+            chiave, valore = testa, []
+            riga = coda.lstrip()
+
+        if ":" in riga:
+            for segmento_chiave, segmento in _dividi(riga):
+                if segmento_chiave is not None:
+                    _aggiungi(result, chiave, valore)
+                    chiave, valore = segmento_chiave, []
+                if segmento:
+                    valore.append(segmento)
+        elif riga:
+            valore.append(riga)
+
+    _aggiungi(result, chiave, valore)
     return result
 
 
+def _dividi(riga: str) -> list:
+    """
+    Divide una riga in segmenti (chiave o None, testo) in corrispondenza delle chiavi note.
+    """
+    segmenti = []
+    chiave, inizio = None, 0
+    for match in _CHIAVE_TOOLTIP.finditer(riga):
+        segmenti.append((chiave, riga[inizio:match.start()].strip()))
+        chiave, inizio = match.group(1), match.end()
+    segmenti.append((chiave, riga[inizio:].strip()))
+    return segmenti
+
+
+def _aggiungi(result: dict, chiave: str, parti: list):
+    if chiave is None:
+        return
+    valore = " ".join(parti)
+    if "&" in valore:
+        valore = html.unescape(valore)
+
+    # normalizza la chiave "Modalit&agrave;" in "Modalità" e rimuove il trattino iniziale se presente
+    if chiave[:7].lower() == "modalit":
+        chiave = "Modalità"
+        if valore.startswith("-"):
+            valore = valore[1:].strip()
+
+    result[chiave] = valore
+
+
+def iter_eventi(blocchi):
+    """
+    Decodifica in streaming un array JSON di eventi (la risposta di fullcalendar_events_alunno.asp),
+    restituendo un evento alla volta man mano che arrivano i blocchi di byte.
+    In memoria restano solo il blocco corrente e l'evento in corso di decodifica.
+
+    Args:
+        blocchi: Iterabile di bytes (es. `Response.iter_content`) o di str.
+
+    Yields:
+        dict: Un evento GEOP grezzo.
+
+    Raises:
+        ValueError: Se il contenuto non è un array JSON valido.
+
+    Example:
+        response = session.post(XHR_URL, data=date, stream=True)\n
+        eventi = parse_json(iter_eventi(response.iter_content(BLOCCO_STREAM)))
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    blocchi = iter(blocchi)
+    buffer = ""
+    pos = 0
+    inizio = True
+    finiti = False
+
+    def leggi():
+        nonlocal buffer, pos, finiti
+        blocco = next(blocchi, None)
+        if blocco is None:
+            finiti = True
+            buffer = buffer[pos:] + utf8.decode(b"", final=True)
+        else:
+            buffer = buffer[pos:] + (utf8.decode(blocco) if isinstance(blocco, bytes) else blocco)
+        pos = 0
+
+    while True:
+        # salta spazi e separatori fino al prossimo valore
+        while pos < len(buffer) and buffer[pos] in " \t\r\n" + ("" if inizio else ","):
+            pos += 1
+        if pos == len(buffer):
+            if finiti:
+                raise ValueError("Risposta GEOP troncata: array JSON non chiuso")
+            leggi()
+            continue
+
+        if inizio:
+            if buffer[pos] != "[":
+                raise ValueError("La risposta GEOP non è un array JSON")
+            pos += 1
+            inizio = False
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            evento, fine = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # evento spezzato tra due blocchi: serve il blocco successivo
+            if finiti:
+                raise
+            leggi()
+            continue
+
+        if fine == len(buffer) and not finiti and buffer[pos] not in "{[\"":
+            # un numero o un letterale a fine buffer potrebbe continuare nel blocco successivo
+            leggi()
+            continue
+
+        pos = fine
+        yield evento
+
+
 def format_event(event: dict) -> dict:
     """
     Formatta i dati di un evento in un dizionario compatibile con l'API di Google Calendar.
@@ -96,6 +227,7 @@ def format_event(event: dict) -> dict:
             - "start" (str):                    Data e ora di inizio dell'evento in formato ISO 8601 (es. "2025-03-25T08:40:00")
             - "end" (str):                      Data e ora di fine dell'evento in formato ISO 8601
             - "ClasseEvento" (str, opzionale):  Classe dell'evento (es. "esame", "prima_lezione", etc.)
+            - "id" (int):                       Id GEOP, salvato in extendedProperties.private.geopId
     
     Returns:
         dict: Dizionario formattato per l'uso con l'API di Google Calendar
@@ -144,7 +276,13 @@ def format_event(event: dict) -> dict:
         },
         "reminders": {
             "useDefault": False,
-        }
+        },
+        # l'id GEOP permette di riconoscere l'evento senza interpretare summary e orari
+        "extendedProperties": {
+            "private": {
+                "geopId": str(event.get("id")),
+            },
+        },
     }
     return event_details
 
@@ -164,15 +302,157 @@ def format_event(event: dict) -> dict:
 '''
 
 
-def write_json(response: Response):
-    with open("calendar.json", "w", encoding="utf-8") as json_file:
-        json.dump(
-            parse_json(response.json()), # 
-            json_file, indent=4, ensure_ascii=False
-            )
+def write_json(response: Response, nome_file: str = "calendar.json"):
+    write_eventi(response.json(), nome_file)
+
+
+def write_eventi(eventi, nome_file: str = "calendar.json") -> int:
+    """
+    Elabora gli eventi GEOP grezzi (lista o generatore, es. `iter_eventi`) e li scrive in `nome_file`
+    uno alla volta, con lo stesso formato di json.dump(..., indent=4).
+
+    Returns:
+        int: Numero di eventi scritti.
+    """
+    scritti = 0
+    with open(nome_file, "w", encoding="utf-8") as json_file:
+        for event in iter_parse(eventi):
+            testo = _ENCODER_CALENDARIO.encode(event).replace("\n", "\n    ")
+            json_file.write(("[\n    " if not scritti else ",\n    ") + testo)
+            scritti += 1
+        json_file.write("\n]" if scritti else "[]")
+    return scritti
         
 
 def read_json(nome_file):
     with open(nome_file, 'r', encoding='utf-8') as file:
         data = json.load(file)
     return data
+
+
+# ultimo snapshot GEOP sincronizzato con successo (hash complessivo e impronta per evento)
+GEOP_SNAPSHOT = "geop_snapshot.json"
+
+# campi che finiscono nell'evento Google tramite format_event: solo questi contano come modifica
+CAMPI_RILEVANTI = ("Materia", "Docente", "Aula", "Modalità", "Argomento", "tooltip", "start", "end", "ClasseEvento")
+
+# anche senza modifiche GEOP, una sincronizzazione completa ogni tanto ripara le modifiche fatte su Google
+INTERVALLO_SYNC_COMPLETA = 24 * 3600
+
+
+def chiave_evento(event: dict):
+    """
+    Restituisce la chiave con cui la sincronizzazione riconosce un evento GEOP: (prefisso di "Materia", start).
+
+    Args:
+        event (dict): Evento di calendar.json.
+
+    Returns:
+        tuple: Coppia (prefisso, start), oppure None se l'evento non ha "Materia".
+    """
+    materia = event.get("Materia", "")
+    if not materia:
+        return None
+    # ottiene il prefisso dall'attributo "Materia" (es: "UFS02")
+    return (materia.split(" - ")[0].strip(), event.get("start"))
+
+
+def impronta_body(body: dict) -> str:
+    """
+    Calcola l'impronta (hash) del corpo di un evento Google prodotto da `format_event`.
+    """
+    return hashlib.sha1(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def impronta_evento(event: dict) -> str:
+    """
+    Calcola l'impronta (hash) dei soli campi rilevanti di un evento GEOP.
+    """
+    return impronta_campi([event.get(campo) for campo in CAMPI_RILEVANTI])
+
+
+def impronta_campi(valori) -> str:
+    """
+    Calcola l'impronta dei valori dei campi rilevanti, nell'ordine di `CAMPI_RILEVANTI`.
+    """
+    return hashlib.sha1(json.dumps(list(valori), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def confronta_snapshot(events: list, date: dict, snapshot_path: str = GEOP_SNAPSHOT) -> dict:
+    """
+    Confronta gli eventi GEOP appena scaricati con l'ultimo snapshot sincronizzato.
+
+    Args:
+        events (list): Eventi di calendar.json, come dizionari o come record `eventi.EventoGeop`.
+        date (dict): Intervallo "start"/"end" richiesto a GEOP, incluso nell'hash complessivo.
+        snapshot_path (str): File dello snapshot precedente.
+
+    Returns:
+        dict: Dizionario con le chiavi:
+            - "invariato" (bool): True se non serve alcuna sincronizzazione.
+            - "chiavi" (set | None): id GEOP (stringhe) degli eventi aggiunti, modificati o rimossi;
+              None se serve una sincronizzazione completa (primo avvio o sincronizzazione periodica).
+            - "snapshot" (dict): nuovo snapshot da salvare con `salva_snapshot` dopo una sincronizzazione riuscita.
+    """
+    impronte = {}
+    for event in events:
+        if not isinstance(event, dict):
+            # record di eventi.py: già filtrato, impronta calcolata una volta sola
+            impronte[event.id] = event.impronta_geop
+        elif chiave_evento(event):
+            impronte[str(event.get("id"))] = impronta_evento(event)
+
+    hash_totale = hashlib.sha1(
+        json.dumps([date, sorted(impronte.items())], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+    precedente = _leggi_snapshot(snapshot_path)
+    ultima_completa = precedente.get("ultima_completa", 0)
+    completa = _completa_dovuta(precedente)
+
+    snapshot = {
+        "hash": hash_totale,
+        "impronte": impronte,
+        "ultima_completa": time.time() if completa else ultima_completa,
+    }
+
+    if completa:
+        return {"invariato": False, "chiavi": None, "snapshot": snapshot}
+
+    if precedente.get("hash") == hash_totale:
+        return {"invariato": True, "chiavi": set(), "snapshot": snapshot}
+
+    vecchie = precedente.get("impronte", {})
+    chiavi = {k for k in impronte.keys() | vecchie.keys() if impronte.get(k) != vecchie.get(k)}
+
+    return {"invariato": not chiavi, "chiavi": chiavi, "snapshot": snapshot}
+
+
+def sync_completa_dovuta(snapshot_path: str = GEOP_SNAPSHOT) -> bool:
+    """
+    Indica, senza i dati GEOP, se il prossimo `confronta_snapshot` chiederà una sincronizzazione completa
+    (nessuno snapshot o ultima sincronizzazione completa più vecchia di `INTERVALLO_SYNC_COMPLETA`):
+    in quel caso Google Calendar verrà letto comunque e la lettura si può anticipare.
+    """
+    return _completa_dovuta(_leggi_snapshot(snapshot_path))
+
+
+def _leggi_snapshot(snapshot_path: str) -> dict:
+    try:
+        return read_json(snapshot_path)
+    except (OSError, ValueError):
+        return {}
+
+
+def _completa_dovuta(precedente: dict) -> bool:
+    return not precedente or time.time() - precedente.get("ultima_completa", 0) > INTERVALLO_SYNC_COMPLETA
+
+
+def salva_snapshot(snapshot: dict, snapshot_path: str = GEOP_SNAPSHOT):
+    """
+    Salva in modo atomico lo snapshot GEOP dopo una sincronizzazione riuscita.
+    """
+    temporaneo = f"{snapshot_path}.tmp"
+    with open(temporaneo, "w", encoding="utf-8") as json_file:
+        json.dump(snapshot, json_file, ensure_ascii=False)
+    os.replace(temporaneo, snapshot_path)
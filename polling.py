@@ -0,0 +1,186 @@
+# frequenza adattiva dei cicli di sincronizzazione: più spesso durante le lezioni, meno di notte, nel weekend,
+# dopo cicli senza modifiche e dopo gli errori
+import datetime
+import random
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+import metrics
+import parser
+
+LOCAL_TZ = ZoneInfo("Europe/Rome")
+
+# intervalli tra l'inizio di un ciclo e l'inizio del successivo, in secondi
+INTERVALLO_VICINO = 300       # entro MARGINE_EVENTO dall'inizio o dalla fine di una lezione (presenze)
+INTERVALLO_LEZIONE = 900      # durante una lezione
+INTERVALLO_FERIALE = 1800     # giorno feriale, fuori dalle lezioni
+INTERVALLO_RIPOSO = 3 * 3600  # notte e weekend
+INTERVALLO_MINIMO = 60
+INTERVALLO_MASSIMO = 6 * 3600
+
+# finestra attorno a inizio e fine di ogni lezione in cui GEOP aggiorna presenze e registro
+MARGINE_EVENTO = datetime.timedelta(minutes=15)
+
+# fascia notturna: dalle ORA_NOTTE alle ORA_MATTINA
+ORA_NOTTE = 21
+ORA_MATTINA = 7
+
+# dopo ogni ciclo senza modifiche l'intervallo raddoppia, fino a RADDOPPI_INVARIATI volte
+RADDOPPI_INVARIATI = 1
+
+# backoff dopo cicli falliti (GEOP o Google): base * 2^(fallimenti - 1), al massimo BACKOFF_MASSIMO
+BACKOFF_BASE = 60
+BACKOFF_MASSIMO = 3600
+
+# riduzione casuale massima degli intervalli, perché più istanze non interroghino GEOP tutte insieme
+JITTER = 0.1
+
+
+def momenti(eventi: list) -> list:
+    """
+    Restituisce gli istanti di inizio e fine delle lezioni (ora locale senza fuso, come in calendar.json), ordinati.
+    Gli eventi sono quelli di calendar.json o quelli grezzi di GEOP: servono solo "start" ed "end".
+    """
+    istanti = set()
+    for event in eventi:
+        for campo in ("start", "end"):
+            try:
+                istanti.add(datetime.datetime.fromisoformat(event[campo]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return sorted(istanti)
+
+
+def prossima_attesa(eventi: list, adesso: datetime.datetime = None, invariati: int = 0, fallimenti: int = 0,
+                    rng: random.Random = random) -> tuple:
+    """
+    Calcola dopo quanto avviare il prossimo ciclo.
+
+    - dopo un ciclo fallito: backoff esponenziale con jitter, indipendente dall'orario;
+    - vicino all'inizio o alla fine di una lezione: `INTERVALLO_VICINO`, anche se i cicli precedenti erano invariati;
+    - durante una lezione, di notte e nel weekend: l'intervallo della fascia, che raddoppia a ogni ciclo
+      senza modifiche (fino a `RADDOPPI_INVARIATI` volte);
+    - nei giorni feriali fuori dalle lezioni: `INTERVALLO_FERIALE`, senza raddoppi.
+
+    In ogni caso l'attesa non supera il prossimo inizio o fine di lezione (meno `MARGINE_EVENTO`) né l'inizio
+    del prossimo giorno feriale (`ORA_MATTINA`): il sonno notturno e del weekend termina prima della prima lezione
+    e non si allunga sulla mattina, quando le variazioni di orario tornano frequenti.
+
+    Args:
+        eventi (list): Eventi con "start" ed "end" (calendar.json).
+        adesso (datetime.datetime): Ora locale senza fuso; se None l'ora corrente a Roma.
+        invariati (int): Cicli consecutivi terminati senza modifiche su GEOP.
+        fallimenti (int): Cicli consecutivi falliti.
+        rng (random.Random): Generatore del jitter.
+
+    Returns:
+        tuple: (secondi di attesa, motivo in forma leggibile per i log).
+    """
+    if adesso is None:
+        adesso = datetime.datetime.now(LOCAL_TZ).replace(tzinfo=None)
+
+    if fallimenti:
+        attesa = min(BACKOFF_MASSIMO, BACKOFF_BASE * 2 ** (fallimenti - 1))
+        # "equal jitter": almeno metà dell'attesa, per non tempestare un servizio già in difficoltà
+        return rng.uniform(attesa / 2, attesa), f"{fallimenti} cicli falliti"
+
+    istanti = momenti(eventi)
+    fattore = 2 ** min(invariati, RADDOPPI_INVARIATI)
+
+    if any(abs(adesso - istante) <= MARGINE_EVENTO for istante in istanti):
+        attesa, motivo = INTERVALLO_VICINO, "inizio o fine di una lezione"
+    elif any(inizio <= adesso < fine for inizio, fine in _lezioni(eventi)):
+        attesa, motivo = INTERVALLO_LEZIONE * fattore, "lezione in corso"
+    elif adesso.weekday() >= 5:
+        attesa, motivo = INTERVALLO_RIPOSO * fattore, "weekend"
+    elif adesso.hour >= ORA_NOTTE or adesso.hour < ORA_MATTINA:
+        attesa, motivo = INTERVALLO_RIPOSO * fattore, "notte"
+    else:
+        # non raddoppia: di giorno le variazioni d'orario arrivano anche lontano dalle lezioni
+        attesa, motivo = INTERVALLO_FERIALE, "giorno feriale"
+
+    attesa = min(attesa, INTERVALLO_MASSIMO) * rng.uniform(1 - JITTER, 1)
+
+    # svegliarsi in tempo per il prossimo inizio o fine di lezione
+    prossimo = next((istante - MARGINE_EVENTO for istante in istanti if istante - MARGINE_EVENTO > adesso), None)
+    if prossimo is not None and (prossimo - adesso).total_seconds() < attesa:
+        attesa, motivo = (prossimo - adesso).total_seconds(), f"{motivo}, fino alla prossima lezione"
+    mattina = _prossima_mattina(adesso)
+    if (mattina - adesso).total_seconds() < attesa:
+        attesa, motivo = (mattina - adesso).total_seconds(), f"{motivo}, fino al mattino"
+
+    return max(INTERVALLO_MINIMO, attesa), motivo
+
+
+def _prossima_mattina(adesso: datetime.datetime) -> datetime.datetime:
+    # inizio (ORA_MATTINA) del primo giorno feriale successivo ad `adesso`
+    mattina = adesso.replace(hour=ORA_MATTINA, minute=0, second=0, microsecond=0)
+    while mattina <= adesso or mattina.weekday() >= 5:
+        mattina += datetime.timedelta(days=1)
+    return mattina
+
+
+def _lezioni(eventi: list):
+    for event in eventi:
+        try:
+            yield datetime.datetime.fromisoformat(event["start"]), datetime.datetime.fromisoformat(event["end"])
+        except (KeyError, TypeError, ValueError):
+            continue
+
+
+def _leggi_eventi(calendar_path: str) -> list:
+    # senza calendar.json (primo avvio fallito) o con un file illeggibile valgono solo gli orari della settimana
+    try:
+        return parser.read_json(calendar_path)
+    except (OSError, ValueError):
+        return []
+
+
+_in_corso = threading.Lock()
+
+
+def esegui(ciclo, calendar_path: str = "calendar.json", cicli: int = None, rng: random.Random = random):
+    """
+    Esegue `ciclo` ripetutamente, con le attese calcolate da `prossima_attesa` sugli eventi di `calendar_path`.
+
+    I cicli non si sovrappongono mai: l'attesa parte dall'inizio del ciclo, ma se un ciclo dura più
+    dell'intervallo il successivo parte subito dopo la sua fine, e un secondo `esegui` nello stesso processo
+    fallisce invece di eseguire cicli in parallelo.
+
+    Args:
+        ciclo: Funzione senza argomenti che restituisce l'esito di `daemon.sincronizza_utente`
+               (chiavi "ok" e "saltato"), o None se è fallita.
+        calendar_path (str): calendar.json da cui leggere gli orari delle lezioni.
+        cicli (int): Numero di cicli da eseguire, None per continuare all'infinito.
+        rng (random.Random): Generatore del jitter.
+
+    Raises:
+        RuntimeError: Se un altro `esegui` è già attivo nel processo.
+    """
+    if not _in_corso.acquire(blocking=False):
+        raise RuntimeError("Un ciclo di sincronizzazione è già in esecuzione")
+
+    try:
+        invariati = fallimenti = 0
+        eseguiti = 0
+        while True:
+            inizio = time.monotonic()
+            esito = ciclo()
+            eseguiti += 1
+
+            if not esito or not esito.get("ok"):
+                fallimenti += 1
+            else:
+                fallimenti = 0
+                invariati = invariati + 1 if esito.get("saltato") else 0
+
+            if cicli is not None and eseguiti >= cicli:
+                break
+
+            attesa, motivo = prossima_attesa(_leggi_eventi(calendar_path), invariati=invariati, fallimenti=fallimenti, rng=rng)
+            attesa = max(0.0, attesa - (time.monotonic() - inizio))
+            metrics.log(f"Prossima sincronizzazione tra {attesa / 60:.0f} minuti ({motivo}).")
+            time.sleep(attesa)
+    finally:
+        _in_corso.release()
@@ -0,0 +1,143 @@
+# limitazione delle scritture su Google Calendar: token bucket per progetto e per utente, backoff con jitter
+import json
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+# quote predefinite (richieste al secondo): l'API Calendar limita sia il progetto sia il singolo utente
+RICHIESTE_AL_SECONDO = 20.0
+RICHIESTE_PER_UTENTE = 10.0
+
+# backoff esponenziale: attesa massima base * 2^tentativo, al massimo BACKOFF_MAX secondi
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+TENTATIVI = 5
+
+# motivi degli errori 403 che indicano una limitazione (gli altri 403 sono permessi mancanti)
+MOTIVI_LIMITAZIONE = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: si riempie di `al_secondo` gettoni al secondo fino a `capacita`.
+
+    Una richiesta che chiede più gettoni di quelli disponibili li prende comunque "in prestito"
+    e attende il tempo necessario a ripagarli: in questo modo anche un batch più grande della
+    capacità passa, rispettando il ritmo medio.
+
+    Attributes:
+        attesa_totale (float): Secondi complessivamente trascorsi in attesa di gettoni.
+    """
+
+    def __init__(self, al_secondo: float, capacita: float = None):
+        self.al_secondo = al_secondo
+        self.capacita = capacita if capacita is not None else al_secondo
+        self.attesa_totale = 0.0
+        self._gettoni = self.capacita
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquisisci(self, gettoni: float = 1) -> float:
+        """
+        Preleva `gettoni` gettoni, attendendo se il bucket è in debito.
+
+        Returns:
+            float: Secondi di attesa.
+        """
+        with self._lock:
+            adesso = time.monotonic()
+            self._gettoni = min(self.capacita, self._gettoni + (adesso - self._ultimo) * self.al_secondo)
+            self._ultimo = adesso
+            self._gettoni -= gettoni
+            attesa = -self._gettoni / self.al_secondo if self._gettoni < 0 else 0.0
+            self.attesa_totale += attesa
+
+        # si dorme fuori dal lock: gli altri thread calcolano la propria attesa sul debito già registrato
+        if attesa:
+            time.sleep(attesa)
+        return attesa
+
+
+_globale = None
+_utenti = {}
+_lock = threading.Lock()
+_config = {"al_secondo": RICHIESTE_AL_SECONDO, "per_utente": RICHIESTE_PER_UTENTE, "capacita": None}
+
+
+def configura(al_secondo: float = RICHIESTE_AL_SECONDO, per_utente: float = RICHIESTE_PER_UTENTE, capacita: float = None):
+    """
+    Imposta le quote usate dai bucket e azzera quelli già creati.
+
+    Args:
+        al_secondo (float): Richieste al secondo per l'intero processo (quota del progetto).
+        per_utente (float): Richieste al secondo per ciascun utente.
+        capacita (float): Raffica massima di ogni bucket; se None è pari al batch massimo dell'API (50)
+                          o alla quota, se maggiore.
+    """
+    global _globale
+    with _lock:
+        _config.update(al_secondo=al_secondo, per_utente=per_utente, capacita=capacita)
+        _globale = None
+        _utenti.clear()
+
+
+def _bucket(al_secondo: float) -> TokenBucket:
+    capacita = _config["capacita"] if _config["capacita"] is not None else max(al_secondo, 50)
+    return TokenBucket(al_secondo, capacita)
+
+
+def acquisisci(richieste: int = 1, utente: str = None) -> float:
+    """
+    Attende finché sia la quota del progetto sia quella dell'utente consentono `richieste` richieste.
+    Le sotto-richieste di un batch contano singolarmente verso la quota di Google.
+
+    Returns:
+        float: Secondi di attesa complessivi.
+    """
+    global _globale
+    with _lock:
+        if _globale is None:
+            _globale = _bucket(_config["al_secondo"])
+        globale = _globale
+        per_utente = None
+        if utente is not None:
+            per_utente = _utenti.get(utente)
+            if per_utente is None:
+                per_utente = _utenti[utente] = _bucket(_config["per_utente"])
+
+    attesa = per_utente.acquisisci(richieste) if per_utente else 0.0
+    return attesa + globale.acquisisci(richieste)
+
+
+def _motivo(errore: HttpError) -> str:
+    """
+    Estrae il campo "reason" dal corpo di un errore delle API Google.
+    """
+    try:
+        dettagli = json.loads(errore.content.decode("utf-8"))["error"]
+        return (dettagli.get("errors") or [{}])[0].get("reason") or dettagli.get("status", "")
+    except (ValueError, KeyError, TypeError, AttributeError, IndexError):
+        return ""
+
+
+def da_riprovare(errore) -> bool:
+    """
+    Indica se l'errore è temporaneo e la richiesta va ripetuta più tardi:
+    429, 403 per limitazione (rateLimitExceeded, userRateLimitExceeded, quotaExceeded) ed errori 5xx.
+    """
+    if not isinstance(errore, HttpError):
+        return False
+    status = errore.resp.status
+    if status == 429 or status >= 500:
+        return True
+    return status == 403 and _motivo(errore) in MOTIVI_LIMITAZIONE
+
+
+def attesa_backoff(tentativo: int, base: float = BACKOFF_BASE, massimo: float = BACKOFF_MAX) -> float:
+    """
+    Backoff esponenziale con "full jitter": un valore casuale tra 0 e min(massimo, base * 2^tentativo),
+    così più utenti limitati nello stesso momento non riprovano tutti insieme.
+    """
+    return random.uniform(0, min(massimo, base * 2 ** tentativo))
@@ -0,0 +1,198 @@
+# indice locale (SQLite) che associa ogni evento GEOP all'evento Google creato per lui
+# e stato del calendario dedicato; nessuna dipendenza dalle librerie Google
+import json
+import os
+import sqlite3
+
+STATE_DB = "geop_state.db"
+
+# id del calendario dedicato e stato della migrazione dal calendario di origine (vedi calendarapi.prepara_calendario_dedicato)
+CALENDARIO_CONFIG = "geop_calendario.json"
+
+
+def leggi_calendario_dedicato(config_path: str = CALENDARIO_CONFIG) -> dict:
+    """
+    Legge la configurazione del calendario dedicato: {"id", "origine", "migrato"}, vuota se il file manca o è illeggibile.
+    """
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            config = json.load(file)
+        return config if isinstance(config, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def salva_calendario_dedicato(config: dict, config_path: str = CALENDARIO_CONFIG):
+    """
+    Scrive la configurazione del calendario dedicato in modo atomico: un'interruzione non lascia un file a metà
+    che farebbe creare un secondo calendario.
+    """
+    temporaneo = f"{config_path}.tmp"
+    with open(temporaneo, "w", encoding="utf-8") as file:
+        json.dump(config, file, ensure_ascii=False)
+    os.replace(temporaneo, config_path)
+
+
+def calendario_dedicato(config_path: str = CALENDARIO_CONFIG) -> str:
+    """
+    Restituisce l'id del calendario dedicato, senza contattare Google.
+
+    Returns:
+        str: Id del calendario, o None se non è ancora stato creato o la migrazione non è conclusa.
+    """
+    config = leggi_calendario_dedicato(config_path)
+    return config.get("id") if config.get("migrato") else None
+
+
+class StateStore:
+    """
+    Indice persistente degli eventi sincronizzati, una riga per coppia (calendario, id GEOP) con:
+        - google_id:    id dell'evento su Google Calendar
+        - etag:         etag restituito da Google all'ultima scrittura
+        - impronta:     hash del corpo inviato a Google (vedi `parser.impronta_body`)
+        - summary:      titolo, usato nei log
+        - start:        inizio dell'evento GEOP (YYYY-MM-DDTHH:MM:SS, ora locale)
+        - body:         ultimo corpo inviato a Google (JSON), per calcolare le differenze senza leggere Google
+
+    e la coda delle modifiche rinviate perché Google le ha limitate (tabella coda), da riprovare al ciclo successivo.
+
+    Le modifiche vengono confermate all'uscita dal blocco `with` (o con `commit`).
+
+    Example:
+        with StateStore("geop_state.db") as store:\n
+            indice = store.eventi("primary")
+    """
+
+    def __init__(self, path: str = STATE_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS eventi (
+                calendar_id TEXT NOT NULL,
+                geop_id     TEXT NOT NULL,
+                google_id   TEXT NOT NULL,
+                etag        TEXT,
+                impronta    TEXT,
+                summary     TEXT,
+                start       TEXT,
+                body        TEXT,
+                PRIMARY KEY (calendar_id, geop_id)
+            )
+            """
+        )
+        # database creati prima della colonna body
+        colonne = {riga["name"] for riga in self._conn.execute("PRAGMA table_info(eventi)")}
+        if "body" not in colonne:
+            self._conn.execute("ALTER TABLE eventi ADD COLUMN body TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS eventi_google ON eventi (calendar_id, google_id)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS coda (
+                calendar_id TEXT NOT NULL,
+                chiave      TEXT NOT NULL,
+                operazione  TEXT NOT NULL,
+                descrizione TEXT,
+                tentativi   INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (calendar_id, chiave)
+            )
+            """
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # anche se la sincronizzazione fallisce a metà, le scritture già confermate da Google vanno registrate
+        self.commit()
+        self.close()
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def eventi(self, calendar_id: str) -> dict:
+        """
+        Restituisce l'indice di un calendario.
+
+        Returns:
+            dict: id GEOP -> dizionario con le colonne della riga.
+        """
+        righe = self._conn.execute("SELECT * FROM eventi WHERE calendar_id = ?", (calendar_id,))
+        return {riga["geop_id"]: dict(riga) for riga in righe}
+
+    def registra(self, calendar_id: str, geop_id: str, google_id: str, etag: str, impronta: str, summary: str, start: str,
+                 body: str = None):
+        """
+        Inserisce o aggiorna l'associazione tra un evento GEOP e il suo evento Google.
+        """
+        self._conn.execute(
+            """
+            INSERT INTO eventi (calendar_id, geop_id, google_id, etag, impronta, summary, start, body)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (calendar_id, geop_id) DO UPDATE SET
+                google_id = excluded.google_id, etag = excluded.etag, impronta = excluded.impronta,
+                summary = excluded.summary, start = excluded.start, body = excluded.body
+            """,
+            (calendar_id, geop_id, google_id, etag, impronta, summary, start, body),
+        )
+
+    def rimuovi(self, calendar_id: str, geop_id: str):
+        """
+        Elimina l'associazione di un evento GEOP (evento Google cancellato).
+        """
+        self._conn.execute("DELETE FROM eventi WHERE calendar_id = ? AND geop_id = ?", (calendar_id, geop_id))
+
+    def sposta(self, da: str, a: str, geop_id: str, etag: str = None):
+        """
+        Sposta l'associazione di un evento GEOP in un altro calendario (events.move conserva l'id Google).
+        Un'eventuale riga già presente nel calendario di destinazione viene sostituita.
+        """
+        self._conn.execute(
+            "UPDATE OR REPLACE eventi SET calendar_id = ?, etag = COALESCE(?, etag) WHERE calendar_id = ? AND geop_id = ?",
+            (a, etag, da, geop_id),
+        )
+
+    def pota(self, calendar_id: str, prima_di: str):
+        """
+        Elimina le righe degli eventi iniziati prima di `prima_di` (YYYY-MM-DD): sono fuori dall'intervallo
+        sincronizzato e non verranno più toccati.
+        """
+        self._conn.execute("DELETE FROM eventi WHERE calendar_id = ? AND start < ?", (calendar_id, prima_di))
+
+    def coda(self, calendar_id: str) -> list:
+        """
+        Restituisce le modifiche rinviate di un calendario, come dizionari con le colonne della tabella coda.
+        """
+        righe = self._conn.execute("SELECT * FROM coda WHERE calendar_id = ? ORDER BY chiave", (calendar_id,))
+        return [dict(riga) for riga in righe]
+
+    def accoda(self, calendar_id: str, chiave: str, operazione: str, descrizione: str):
+        """
+        Aggiunge una modifica rinviata, o incrementa il numero di tentativi se è già in coda.
+
+        Args:
+            chiave (str): Id GEOP dell'evento o, per gli eventi Google senza id GEOP, "google:<id Google>".
+        """
+        self._conn.execute(
+            """
+            INSERT INTO coda (calendar_id, chiave, operazione, descrizione)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (calendar_id, chiave) DO UPDATE SET
+                operazione = excluded.operazione, descrizione = excluded.descrizione, tentativi = coda.tentativi + 1
+            """,
+            (calendar_id, chiave, operazione, descrizione),
+        )
+
+    def svuota_coda(self, calendar_id: str, tranne: set = ()):
+        """
+        Elimina le modifiche in coda di un calendario, tranne quelle con chiave in `tranne`.
+        """
+        tranne = list(tranne)
+        segnaposto = ", ".join("?" for _ in tranne)
+        self._conn.execute(
+            f"DELETE FROM coda WHERE calendar_id = ? AND chiave NOT IN ({segnaposto})", (calendar_id, *tranne)
+        )
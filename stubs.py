@@ -0,0 +1,695 @@
+# stand-in locali delle API usate dal progetto (GEOP e Google Calendar), per benchmark e prove offline
+# nessuna chiamata esce dalla macchina: i server ascoltano su 127.0.0.1
+import datetime
+import email.parser
+import gzip
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from zoneinfo import ZoneInfo
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    Handler HTTP generico: inoltra ogni richiesta al metodo `gestisci` dello stub proprietario.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        status, payload, *extra = self.server.stub.gestisci(self.command, unquote(url.path), query, body, self.headers)
+        content_type = extra[0] if extra else "application/json; charset=UTF-8"
+        intestazioni = extra[1] if len(extra) > 1 else {}
+
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        if self.server.stub.accetta_gzip(self.headers):
+            data = gzip.compress(data)
+            intestazioni = {**intestazioni, "Content-Encoding": "gzip"}
+
+        # contati prima dell'invio: il client potrebbe leggere i contatori appena ricevuta la risposta
+        self.server.stub.conta_byte(length, len(data))
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for nome, valore in intestazioni.items():
+            self.send_header(nome, valore)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        # niente log per richiesta, il benchmark li conterebbe come rumore
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # connessioni keep-alive interrotte dai client (es. quelle dei thread già terminati): non sono errori dello stub
+        if isinstance(sys.exc_info()[1], ConnectionResetError):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubServer:
+    """
+    Base comune degli stand-in: avvia un ThreadingHTTPServer su una porta libera di 127.0.0.1,
+    conta le richieste per endpoint e i byte dei corpi ricevuti e inviati (dopo l'eventuale compressione)
+    e applica una latenza artificiale per simulare il round-trip.
+    """
+
+    def __init__(self, latenza: float = 0.0):
+        self.latenza = latenza
+        self.richieste = Counter()
+        self.byte_ricevuti = 0
+        self.byte_inviati = 0
+        self._server = None
+        self._thread = None
+        self._byte_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._server = _StubHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def gestisci(self, metodo: str, path: str, query: dict, body: bytes, headers) -> tuple:
+        """
+        Gestisce una richiesta e restituisce (status, payload), (status, payload, content_type)
+        o (status, payload, content_type, intestazioni).
+        Il payload può essere un oggetto serializzabile in JSON oppure bytes già codificati.
+        """
+        raise NotImplementedError
+
+    def accetta_gzip(self, headers) -> bool:
+        """
+        Indica se comprimere la risposta: per default gli stub non comprimono.
+        """
+        return False
+
+    def conta_byte(self, ricevuti: int, inviati: int):
+        with self._byte_lock:
+            self.byte_ricevuti += ricevuti
+            self.byte_inviati += inviati
+
+    def azzera_contatori(self):
+        """
+        Azzera richieste e byte contati, per misurare un singolo ciclo.
+        """
+        self.richieste.clear()
+        with self._byte_lock:
+            self.byte_ricevuti = self.byte_inviati = 0
+
+    def _attendi(self):
+        if self.latenza:
+            time.sleep(self.latenza)
+
+
+class CalendarStub(StubServer):
+    """
+    Stand-in dell'API Google Calendar v3 (endpoint events, calendars.insert, calendarList.list, channels.stop e batch),
+    servito a partire da un documento
+    di discovery locale (`documento`, per esempio quello di `calendarapi.discovery_doc`) o, se assente,
+    da quello incluso in googleapiclient.
+
+    Gli eventi sono conservati in memoria per calendarId; `list` rispetta la semantica di
+    timeMin/timeMax (fine > timeMin, inizio < timeMax), l'ordinamento per startTime e la paginazione.
+    `move` sposta un evento in un altro calendario conservandone l'id.
+    Le richieste batch (multipart/mixed) vengono scomposte e ogni parte è contata col proprio endpoint.
+
+    Ogni modifica riceve un numero di versione: `list` restituisce un nextSyncToken e, se chiamata
+    con syncToken, solo gli eventi modificati o cancellati (status "cancelled") da quella versione.
+    `scadi_sync_token` invalida i token emessi, che da quel momento ricevono 410 Gone.
+
+    Con `quota_al_secondo` le scritture (anche dentro un batch) oltre quel numero nell'ultimo secondo
+    ricevono 403 rateLimitExceeded, come quando si supera la quota dell'API.
+
+    `events.watch` apre un canale di notifica e `channels.stop` lo chiude: finché il canale non scade, ogni modifica
+    al calendario (anche con `modifica`) invia all'indirizzo del canale una POST con le intestazioni X-Goog-*,
+    come le notifiche push di Google, da un thread in background e nell'ordine delle modifiche.
+
+    Come Google, gli eventi salvati ricevono i metadati della risorsa completa (creator, organizer, iCalUID, ...),
+    il parametro `fields` riduce la risposta ai campi richiesti e le risposte sono compresse con gzip
+    solo se il client invia sia "Accept-Encoding: gzip" sia "gzip" nello User-Agent (`gzip=False` lo disattiva).
+    """
+
+    def __init__(self, latenza: float = 0.0, page_size: int = 250, quota_al_secondo: int = None, gzip: bool = True,
+                 documento: str = None):
+        super().__init__(latenza)
+        self.documento = documento
+        self.page_size = page_size
+        self.gzip = gzip
+        self.quota_al_secondo = quota_al_secondo
+        self._scritture = deque()
+        self.eventi = {}
+        # calendari secondari creati con calendars.insert: id -> risorsa
+        self.calendari = {}
+        self._id = itertools.count(1)
+        self._lock = threading.Lock()
+        self._versione = 0
+        self._generazione = 0
+        self._versioni = {}
+        self._cancellati = {}
+        # eventi restituiti dalle list, per misurare il volume trasferito
+        self.trasferiti = 0
+        # canali di notifica aperti con events.watch: id -> canale, e notifiche da inviare
+        self.canali = {}
+        self._notifiche = queue.Queue()
+        self._postino = None
+
+    def carica(self, eventi: list, calendar_id: str = "primary"):
+        """
+        Popola il calendario indicato con una lista di eventi (dizionari in formato Google).
+        """
+        for event in eventi:
+            self.modifica(calendar_id, event["id"], event)
+
+    def modifica(self, calendar_id: str, event_id: str, event: dict = None):
+        """
+        Inserisce, sostituisce o (con event=None) cancella un evento registrando la modifica,
+        come farebbe un utente dall'interfaccia di Google Calendar.
+        """
+        with self._lock:
+            self._versione += 1
+            calendario = self.eventi.setdefault(calendar_id, {})
+            if event is None:
+                calendario.pop(event_id, None)
+                self._cancellati.setdefault(calendar_id, {})[event_id] = self._versione
+            else:
+                event["etag"] = f'"{self._versione}"'
+                event["updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+                for campo, valore in _metadati(event_id, self.url).items():
+                    event.setdefault(campo, valore)
+                calendario[event_id] = event
+                self._cancellati.get(calendar_id, {}).pop(event_id, None)
+            self._versioni.setdefault(calendar_id, {})[event_id] = self._versione
+            for canale in self.canali.values():
+                if canale["calendar_id"] == calendar_id:
+                    self._notifica(canale, "exists")
+
+    def _notifica(self, canale: dict, stato: str):
+        """
+        Accoda una notifica per il canale, se non è scaduto. Va chiamata con il lock acquisito.
+        """
+        if int(canale["expiration"]) <= time.time() * 1000:
+            return
+        canale["numero"] += 1
+        self._notifiche.put((canale["address"], {
+            "X-Goog-Channel-ID": canale["id"],
+            "X-Goog-Channel-Token": canale.get("token", ""),
+            "X-Goog-Channel-Expiration": time.strftime("%a, %d %b %Y %H:%M:%S GMT",
+                                                       time.gmtime(int(canale["expiration"]) / 1000)),
+            "X-Goog-Resource-ID": canale["resourceId"],
+            "X-Goog-Resource-URI": canale["resourceUri"],
+            "X-Goog-Resource-State": stato,
+            "X-Goog-Message-Number": str(canale["numero"]),
+        }))
+        if self._postino is None:
+            self._postino = threading.Thread(target=self._invia_notifiche, daemon=True, name="stub-notifiche")
+            self._postino.start()
+
+    def _invia_notifiche(self):
+        while True:
+            indirizzo, intestazioni = self._notifiche.get()
+            try:
+                richiesta = urllib.request.Request(indirizzo, data=b"", headers=intestazioni, method="POST")
+                with urllib.request.urlopen(richiesta, timeout=10):
+                    pass
+                self.richieste["notifiche"] += 1
+            except Exception:
+                # anche le risposte 403/404 del ricevitore: Google non ripete queste notifiche
+                self.richieste["notifiche_rifiutate"] += 1
+
+    def scadi_sync_token(self):
+        """
+        Invalida tutti i syncToken emessi finora (il server risponderà 410 Gone).
+        """
+        self._generazione += 1
+
+    def service(self):
+        """
+        Restituisce un client googleapiclient che punta allo stub invece che a googleapis.com.
+        Anche l'URI delle richieste batch deriva dal rootUrl del documento, quindi va sostituito.
+        """
+        doc = json.loads(self.documento or get_static_doc("calendar", "v3"))
+        doc["rootUrl"] = self.url
+        return build_from_document(doc, http=httplib2.Http())
+
+    def accetta_gzip(self, headers) -> bool:
+        # regola di Google: servono sia Accept-Encoding sia "gzip" nello User-Agent
+        return (self.gzip and "gzip" in headers.get("Accept-Encoding", "")
+                and "gzip" in headers.get("User-Agent", ""))
+
+    def gestisci(self, metodo, path, query, body, headers):
+        self._attendi()
+        parti = path.strip("/").split("/")
+
+        if parti == ["batch", "calendar", "v3"] and metodo == "POST":
+            self.richieste["batch"] += 1
+            return self._batch(body, headers)
+
+        return self._evento(metodo, parti, query, body)
+
+    def _evento(self, metodo: str, parti: list, query: dict, body: bytes) -> tuple:
+        status, payload, *extra = self._operazione(metodo, parti, query, body)
+        if "fields" in query and isinstance(payload, dict) and status < 400:
+            payload = _applica_campi(payload, _parse_campi(query["fields"]))
+        return (status, payload, *extra)
+
+    def _operazione(self, metodo: str, parti: list, query: dict, body: bytes) -> tuple:
+        # calendar/v3/users/me/calendarList e calendar/v3/calendars
+        if parti == ["calendar", "v3", "users", "me", "calendarList"] and metodo == "GET":
+            self.richieste["calendarList.list"] += 1
+            primario = {"id": "primary", "summary": "primary", "accessRole": "owner"}
+            return 200, {"kind": "calendar#calendarList", "items": [primario, *self.calendari.values()]}
+
+        if parti == ["calendar", "v3", "calendars"] and metodo == "POST":
+            self.richieste["calendars.insert"] += 1
+            calendario = json.loads(body)
+            with self._lock:
+                calendario["id"] = f"stub{next(self._id):06d}@group.calendar.google.com"
+            calendario.update({"kind": "calendar#calendar", "accessRole": "owner"})
+            self.calendari[calendario["id"]] = calendario
+            return 200, calendario
+
+        if parti == ["calendar", "v3", "channels", "stop"] and metodo == "POST":
+            self.richieste["channels.stop"] += 1
+            richiesta = json.loads(body)
+            with self._lock:
+                canale = self.canali.get(richiesta["id"])
+                if canale is None or canale["resourceId"] != richiesta.get("resourceId"):
+                    return 404, _errore(404, f"Channel '{richiesta['id']}' not found for project")
+                del self.canali[richiesta["id"]]
+            return 204, b""
+
+        if parti[:3] == ["calendar", "v3", "calendars"] and parti[4:] == ["events", "watch"] and metodo == "POST":
+            self.richieste["events.watch"] += 1
+            return 200, self._watch(parti[3], json.loads(body))
+
+        # calendar/v3/calendars/{calendarId}/events[/{eventId}[/move]]
+        if parti[:3] != ["calendar", "v3", "calendars"] or len(parti) < 5 or parti[4] != "events":
+            self.richieste["sconosciuto"] += 1
+            return 404, _errore(404, f"{metodo} {'/'.join(parti)} non gestito dallo stub")
+
+        calendar_id = parti[3]
+        calendario = self.eventi.setdefault(calendar_id, {})
+
+        if metodo != "GET" and self._limitata():
+            self.richieste["limitate"] += 1
+            return 403, _errore(403, "Rate Limit Exceeded", "rateLimitExceeded")
+
+        if len(parti) == 5 and metodo == "GET":
+            self.richieste["events.list"] += 1
+            if "syncToken" in query:
+                return self._list_sync(calendar_id, query)
+            return 200, self._list(calendar_id, query)
+
+        if len(parti) == 5 and metodo == "POST":
+            self.richieste["events.insert"] += 1
+            event = _normalizza(json.loads(body))
+            with self._lock:
+                event["id"] = f"stub{next(self._id):06d}"
+            event["htmlLink"] = f"{self.url}event?eid={event['id']}"
+            self.modifica(calendar_id, event["id"], event)
+            return 200, event
+
+        event_id = parti[5]
+        if parti[6:] == ["move"] and metodo == "POST":
+            self.richieste["events.move"] += 1
+            if event_id not in calendario:
+                return 404, _errore(404, "Not Found")
+            event = dict(calendario[event_id])
+            self.modifica(calendar_id, event_id)
+            self.modifica(query["destination"], event_id, event)
+            return 200, event
+
+        if event_id not in calendario:
+            self.richieste[f"events.{metodo.lower()}"] += 1
+            return 404, _errore(404, "Not Found")
+
+        if metodo == "PUT":
+            self.richieste["events.update"] += 1
+            event = _normalizza(json.loads(body))
+            event["id"] = event_id
+            self.modifica(calendar_id, event_id, event)
+            return 200, event
+
+        if metodo == "PATCH":
+            self.richieste["events.patch"] += 1
+            event = dict(calendario[event_id])
+            event.update(json.loads(body))
+            self.modifica(calendar_id, event_id, _normalizza(event))
+            return 200, event
+
+        if metodo == "DELETE":
+            self.richieste["events.delete"] += 1
+            self.modifica(calendar_id, event_id)
+            return 204, b""
+
+        self.richieste["sconosciuto"] += 1
+        return 405, _errore(405, f"{metodo} non supportato")
+
+    def _watch(self, calendar_id: str, richiesta: dict) -> dict:
+        """
+        Apre un canale di notifica e invia la notifica iniziale "sync", come Google.
+        """
+        durata = int(richiesta.get("params", {}).get("ttl", 7 * 24 * 3600))
+        with self._lock:
+            canale = {
+                "kind": "api#channel", "id": richiesta["id"], "resourceId": f"risorsa{next(self._id):06d}",
+                "resourceUri": f"{self.url}calendar/v3/calendars/{calendar_id}/events?alt=json",
+                "token": richiesta.get("token", ""), "expiration": str(int((time.time() + durata) * 1000)),
+                "address": richiesta["address"], "calendar_id": calendar_id, "numero": 0,
+            }
+            self.canali[canale["id"]] = canale
+            self._notifica(canale, "sync")
+        return {campo: canale[campo] for campo in ("kind", "id", "resourceId", "resourceUri", "token", "expiration")}
+
+    def _limitata(self) -> bool:
+        """
+        Registra una scrittura e indica se supera la quota dell'ultimo secondo.
+        """
+        if not self.quota_al_secondo:
+            return False
+        with self._lock:
+            adesso = time.monotonic()
+            while self._scritture and adesso - self._scritture[0] >= 1.0:
+                self._scritture.popleft()
+            if len(self._scritture) >= self.quota_al_secondo:
+                return True
+            self._scritture.append(adesso)
+            return False
+
+    def _batch(self, body: bytes, headers) -> tuple:
+        """
+        Scompone una richiesta multipart/mixed, esegue ogni parte e ricompone la risposta
+        nel formato atteso da googleapiclient.http.BatchHttpRequest.
+        """
+        messaggio = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + headers["Content-Type"].encode() + b"\r\n\r\n" + body
+        )
+        boundary = "stub_batch_boundary"
+        risposta = []
+
+        for parte in messaggio.get_payload():
+            content_id = parte["Content-ID"].strip("<>")
+            testa, sep, corpo = parte.get_payload(decode=True).partition(b"\r\n\r\n")
+            if not sep:
+                testa, sep, corpo = testa.partition(b"\n\n")
+            metodo, uri = testa.decode().splitlines()[0].split(" ")[:2]
+            url = urlsplit(uri)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+            status, payload, *_ = self._evento(metodo, unquote(url.path).strip("/").split("/"), query, corpo.strip())
+            data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+
+            risposta.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n"
+                + data.decode("utf-8") + "\r\n"
+            )
+
+        risposta.append(f"--{boundary}--\r\n")
+        return 200, "".join(risposta).encode("utf-8"), f"multipart/mixed; boundary={boundary}"
+
+    def _list(self, calendar_id: str, query: dict) -> dict:
+        time_min = _parse_istante(query.get("timeMin"))
+        time_max = _parse_istante(query.get("timeMax"))
+
+        eventi = []
+        for event in self.eventi.get(calendar_id, {}).values():
+            inizio = _parse_istante(event["start"].get("dateTime") or event["start"].get("date"))
+            fine = _parse_istante(event["end"].get("dateTime") or event["end"].get("date"))
+            if time_min and fine <= time_min:
+                continue
+            if time_max and inizio >= time_max:
+                continue
+            eventi.append((inizio, event))
+
+        eventi.sort(key=lambda coppia: coppia[0])
+
+        page_size = min(int(query.get("maxResults", self.page_size)), 2500)
+        offset = int(query.get("pageToken", 0))
+        pagina = [event for _, event in eventi[offset:offset + page_size]]
+        self.trasferiti += len(pagina)
+
+        risposta = {"kind": "calendar#events", "items": pagina}
+        if offset + page_size < len(eventi):
+            risposta["nextPageToken"] = str(offset + page_size)
+        else:
+            risposta["nextSyncToken"] = f"{self._generazione}:{self._versione}"
+        return risposta
+
+    def _list_sync(self, calendar_id: str, query: dict) -> tuple:
+        """
+        Lista incrementale: eventi modificati e cancellati dopo la versione indicata dal syncToken.
+        """
+        generazione, _, versione = query["syncToken"].partition(":")
+        if int(generazione) != self._generazione:
+            return 410, _errore(410, "Sync token is no longer valid, a full sync is required.", "fullSyncRequired")
+
+        versione = int(versione)
+        calendario = self.eventi.get(calendar_id, {})
+        cancellati = self._cancellati.get(calendar_id, {})
+        modificati = sorted(
+            (seq, event_id) for event_id, seq in self._versioni.get(calendar_id, {}).items() if seq > versione
+        )
+
+        items = [
+            calendario[event_id] if event_id not in cancellati else {"id": event_id, "status": "cancelled"}
+            for _, event_id in modificati
+        ]
+
+        page_size = min(int(query.get("maxResults", self.page_size)), 2500)
+        offset = int(query.get("pageToken", 0))
+        risposta = {"kind": "calendar#events", "items": items[offset:offset + page_size]}
+        self.trasferiti += len(risposta["items"])
+        if offset + page_size < len(items):
+            risposta["nextPageToken"] = str(offset + page_size)
+        else:
+            risposta["nextSyncToken"] = f"{self._generazione}:{self._versione}"
+        return 200, risposta
+
+
+class GeopStub(StubServer):
+    """
+    Stand-in di GEOP: `update/login.asp` imposta un cookie di sessione, `json/fullcalendar_events_alunno.asp`
+    restituisce gli eventi con "start" nell'intervallo [start, end) se la sessione è valida,
+    altrimenti la pagina di login in HTML (come fa GEOP quando la sessione è scaduta).
+    Come GEOP, risponde con Content-Type text/html anche al JSON.
+
+    `latenza_evento` simula il costo lato server di una risposta grande: ogni evento restituito
+    aggiunge quel tempo alla latenza fissa della richiesta.
+    """
+
+    def __init__(self, eventi: list = None, latenza: float = 0.0, latenza_evento: float = 0.0):
+        super().__init__(latenza)
+        self.eventi = eventi or []
+        self.latenza_evento = latenza_evento
+        self.sessioni = set()
+        self._id = itertools.count(1)
+
+    @property
+    def login_url(self) -> str:
+        return self.url + "geopcfp2/update/login.asp"
+
+    @property
+    def xhr_url(self) -> str:
+        return self.url + "geopcfp2/json/fullcalendar_events_alunno.asp"
+
+    def scadi_sessioni(self):
+        """
+        Invalida tutte le sessioni aperte.
+        """
+        self.sessioni.clear()
+
+    def gestisci(self, metodo, path, query, body, headers):
+        self._attendi()
+        form = {k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+        if path.endswith("/update/login.asp"):
+            self.richieste["login.asp"] += 1
+            sessione = f"S{next(self._id):08d}"
+            self.sessioni.add(sessione)
+            return 200, b"<html>ok</html>", "text/html", {"Set-Cookie": f"ASPSESSIONID={sessione}; Path=/"}
+
+        if path.endswith("/json/fullcalendar_events_alunno.asp"):
+            self.richieste["fullcalendar_events_alunno.asp"] += 1
+            cookie = headers.get("Cookie", "")
+            if not any(f"ASPSESSIONID={s}" in cookie for s in self.sessioni):
+                return 200, b"<html><form action='login.asp'></form></html>", "text/html"
+
+            inizio, fine = form.get("start", ""), form.get("end", "9999")
+            eventi = [ev for ev in self.eventi if inizio <= ev["start"][:10] < fine]
+            if self.latenza_evento:
+                time.sleep(self.latenza_evento * len(eventi))
+            return 200, json.dumps(eventi, ensure_ascii=False).encode("utf-8"), "text/html"
+
+        self.richieste["sconosciuto"] += 1
+        return 404, b"Not Found", "text/html"
+
+
+class OAuthStub(StubServer):
+    """
+    Stand-in dell'endpoint OAuth di Google (`token`): ogni rinnovo con grant_type=refresh_token
+    restituisce un nuovo token di accesso valido `durata` secondi. Con `revocato` risponde invalid_grant,
+    come Google per un refresh token revocato.
+
+    Per usarlo, le credenziali vanno create con `token_uri=stub.token_uri` (`Credentials.from_authorized_user_file`
+    ignora il token_uri del file: va sostituito `google.oauth2.credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT`).
+    """
+
+    def __init__(self, durata: int = 3600, latenza: float = 0.0):
+        super().__init__(latenza)
+        self.durata = durata
+        self.revocato = False
+        self._id = itertools.count(1)
+
+    @property
+    def token_uri(self) -> str:
+        return self.url + "token"
+
+    def gestisci(self, metodo, path, query, body, headers):
+        self._attendi()
+        form = {k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+        if path.endswith("/token") and form.get("grant_type") == "refresh_token":
+            self.richieste["token"] += 1
+            if self.revocato:
+                return 400, {"error": "invalid_grant", "error_description": "Token has been expired or revoked."}
+            return 200, {"access_token": f"tok{next(self._id)}", "expires_in": self.durata, "token_type": "Bearer"}
+
+        self.richieste["sconosciuto"] += 1
+        return 404, {"error": "not_found"}
+
+
+def _errore(codice: int, messaggio: str, reason: str = "") -> dict:
+    """
+    Corpo di errore nel formato delle API Google.
+    """
+    return {"error": {"code": codice, "message": messaggio, "errors": [{"reason": reason or messaggio, "message": messaggio}]}}
+
+
+def _metadati(event_id: str, url: str) -> dict:
+    """
+    Campi che Google aggiunge a ogni evento e che la sincronizzazione non usa.
+    """
+    return {
+        "kind": "calendar#event",
+        "status": "confirmed",
+        "htmlLink": f"{url}event?eid={event_id}",
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "creator": {"email": "studente@example.com", "self": True},
+        "organizer": {"email": "studente@example.com", "self": True},
+        "iCalUID": f"{event_id}@google.com",
+        "sequence": 0,
+        "eventType": "default",
+    }
+
+
+def _parse_campi(maschera: str) -> dict:
+    """
+    Interpreta una maschera `fields` ("a,b/c,items(d,e)") come albero: campo -> sotto-albero (None = tutto).
+    """
+    albero = {}
+    pos = 0
+
+    def livello(nodo):
+        nonlocal pos
+        while pos < len(maschera):
+            fine = pos
+            while fine < len(maschera) and maschera[fine] not in ",()":
+                fine += 1
+            *genitori, foglia = [parte.strip() for parte in maschera[pos:fine].split("/")]
+            pos = fine
+            destinazione = nodo
+            for parte in genitori:
+                destinazione = destinazione.setdefault(parte, {})
+            if pos < len(maschera) and maschera[pos] == "(":
+                pos += 1
+                livello(destinazione.setdefault(foglia, {}))
+                pos += 1  # ")"
+            elif foglia:
+                destinazione[foglia] = None
+            if pos < len(maschera) and maschera[pos] == ")":
+                return
+            pos += 1  # ","
+
+    livello(albero)
+    return albero
+
+
+def _applica_campi(valore, albero: dict):
+    """
+    Riduce un oggetto JSON ai campi dell'albero prodotto da `_parse_campi`.
+    """
+    if albero is None:
+        return valore
+    if isinstance(valore, list):
+        return [_applica_campi(elemento, albero) for elemento in valore]
+    if not isinstance(valore, dict):
+        return valore
+    return {campo: _applica_campi(valore[campo], sotto) for campo, sotto in albero.items() if campo in valore}
+
+
+def _normalizza(event: dict) -> dict:
+    """
+    Come fa Google, restituisce gli orari con l'offset esplicito del fuso indicato in "timeZone".
+    """
+    for campo in ("start", "end"):
+        edge = event.get(campo, {})
+        if "dateTime" in edge and edge.get("timeZone"):
+            istante = datetime.datetime.fromisoformat(edge["dateTime"])
+            if istante.tzinfo is None:
+                edge["dateTime"] = istante.replace(tzinfo=ZoneInfo(edge["timeZone"])).isoformat()
+    return event
+
+
+def _parse_istante(valore):
+    """
+    Converte un istante RFC 3339 (o una data YYYY-MM-DD, interpretata come mezzanotte UTC) in datetime.
+    """
+    if not valore:
+        return None
+    if "T" not in valore:
+        giorno = datetime.date.fromisoformat(valore)
+        return datetime.datetime(giorno.year, giorno.month, giorno.day, tzinfo=datetime.timezone.utc)
+    return datetime.datetime.fromisoformat(valore)
@@ -0,0 +1,5 @@
+# i moduli del progetto stanno nella cartella principale, non in un pacchetto
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
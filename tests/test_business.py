@@ -0,0 +1,50 @@
+import pytest
+
+import business
+
+
+class _Risposta:
+    def __init__(self, status_code: int = 200, corpo: bytes = b"[]"):
+        self.status_code = status_code
+        self.corpo = corpo
+        self.chiusa = False
+
+    def iter_content(self, dimensione):
+        for inizio in range(0, len(self.corpo), 4):
+            yield self.corpo[inizio:inizio + 4]
+
+    def close(self):
+        self.chiusa = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@pytest.fixture
+def sessione():
+    sessione = business.GeopSession({"username": "u", "password": "p"})
+    # cookie presenti: nessun login prima della richiesta
+    sessione.session.cookies.set("ASPSESSIONID", "x")
+    return sessione
+
+
+def test_risposta_json_con_errore_viene_chiusa(sessione):
+    risposta = _Risposta(500, b'{"errore": true}')
+
+    with pytest.raises(RuntimeError):
+        sessione._con_sessione(lambda: (risposta, True))
+    assert risposta.chiusa
+
+
+def test_calendario_stream_chiuso_senza_essere_letto_tutto(sessione, monkeypatch):
+    risposta = _Risposta(corpo=b'[{"id": 1}, {"id": 2}, {"id": 3}]')
+    monkeypatch.setattr(sessione, "_post_calendario", lambda date, stream=False: risposta)
+
+    eventi = sessione.calendario_stream({"start": "2025-10-06", "end": "2025-10-13"})
+    assert next(eventi) == {"id": 1}
+    assert not risposta.chiusa
+    eventi.close()
+    assert risposta.chiusa
@@ -0,0 +1,64 @@
+import calendarapi
+
+
+class _Richiesta:
+    def __init__(self, risposta):
+        self._risposta = risposta
+
+    def execute(self):
+        return self._risposta
+
+
+class _ServizioFinto:
+    """
+    Servizio Calendar minimo: registra i parametri di events.list e risponde con una pagina vuota e un syncToken.
+    """
+
+    def __init__(self):
+        self.chiamate = []
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.chiamate.append(params)
+        return _Richiesta({"items": [], "nextSyncToken": f"token{len(self.chiamate)}"})
+
+
+def test_lettura_incrementale_ripete_i_parametri_della_lettura_completa(tmp_path, monkeypatch):
+    servizio = _ServizioFinto()
+    monkeypatch.setattr(calendarapi, "get_service", lambda creds: servizio)
+    mirror_path = str(tmp_path / "mirror.json")
+    date_info = {"start": "2025-10-06", "end": "2025-10-10"}
+
+    calendarapi.read_calendar_incrementale(None, date_info, mirror_path)
+    calendarapi.read_calendar_incrementale(None, date_info, mirror_path)
+
+    completa, incrementale = servizio.chiamate
+    assert "timeMin" in completa and "syncToken" not in completa
+    assert incrementale["syncToken"] == "token1" and "timeMin" not in incrementale
+    for chiave, valore in calendarapi.PARAMETRI_INCREMENTALI.items():
+        assert completa[chiave] == incrementale[chiave] == valore
+
+
+def test_connessioni_dei_thread_con_le_credenziali_del_client(tmp_path, monkeypatch):
+    import threading
+
+    import httplib2
+    from google.oauth2.credentials import Credentials
+    from google_auth_httplib2 import AuthorizedHttp
+
+    monkeypatch.setattr(calendarapi, "DISCOVERY_CACHE", str(tmp_path / "discovery.json"))
+    creds = Credentials(token="t", refresh_token="r", client_id="c", client_secret="s")
+    service = calendarapi.get_service(creds)
+    calendarapi.invalida_service(creds)
+
+    connessioni = []
+    thread = threading.Thread(target=lambda: connessioni.append(calendarapi._http_thread(service)))
+    thread.start()
+    thread.join()
+
+    assert isinstance(connessioni[0], AuthorizedHttp) and connessioni[0].credentials is creds
+    assert connessioni[0] is not service._http
+    # client non costruito da get_service (es. lo stand-in dei benchmark): connessione senza credenziali
+    assert type(calendarapi._http_thread(_ServizioFinto())) is httplib2.Http
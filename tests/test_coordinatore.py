@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+
+import pytest
+
+import coordinatore
+from coordinatore import CodaLavori
+
+
+@pytest.fixture
+def coda(tmp_path):
+    with CodaLavori(str(tmp_path / "coda.db")) as coda:
+        yield coda
+
+
+def test_prendi_in_ordine_di_scadenza(coda):
+    coda.allinea(["b", "a", "c"], adesso=100.0)
+    coda.completa("x", coda.prendi("x", 1, adesso=100.0)[0], "ok", 50.0, 0, 0)  # "a" torna in coda prima degli altri
+
+    lavori = coda.prendi("nodo1", 2, adesso=100.0)
+
+    assert [lavoro["utente"] for lavoro in lavori] == ["a", "b"]
+    assert coda.prendi("nodo2", 5, adesso=100.0)[0]["utente"] == "c"
+    assert coda.prendi("nodo2", 5, adesso=100.0) == []
+
+
+def test_prendi_ignora_lavori_non_scaduti(coda):
+    coda.allinea(["a"], adesso=100.0)
+    coda.completa("x", coda.prendi("x", 1, adesso=100.0)[0], "ok", 200.0, 0, 0)
+
+    assert coda.prendi("nodo1", 1, adesso=150.0) == []
+    assert coda.prossima_scadenza(adesso=150.0) == 200.0
+    assert [lavoro["utente"] for lavoro in coda.prendi("nodo1", 1, adesso=200.0)] == ["a"]
+
+
+def test_lease_scaduto_passa_a_un_altro_nodo(coda):
+    coda.allinea(["a"], adesso=100.0)
+    [vecchio] = coda.prendi("morto", 1, durata=10.0, adesso=100.0)
+
+    assert coda.prendi("vivo", 1, adesso=105.0) == []
+    assert coda.prossima_scadenza(adesso=105.0) == 110.0
+
+    [nuovo] = coda.prendi("vivo", 1, adesso=111.0)
+    assert nuovo["precedente"] == "morto"
+    assert nuovo["token"] == vecchio["token"] + 1
+
+    # il nodo che ha perso il lease non può più rinnovarlo né completare il lavoro
+    assert coda.rinnova("morto", [vecchio], adesso=112.0) == ["a"]
+    assert coda.completa("morto", vecchio, "ok", 0.0, 0, 0) is False
+    assert coda.completa("vivo", nuovo, "ok", 500.0, 0, 0) is True
+    assert coda.stato()[0]["ultimo_nodo"] == "vivo"
+
+
+def test_heartbeat_mantiene_il_lease(coda):
+    coda.allinea(["a"], adesso=100.0)
+    lavori = coda.prendi("nodo1", 1, durata=10.0, adesso=100.0)
+
+    assert coda.rinnova("nodo1", lavori, durata=10.0, adesso=108.0) == []
+    assert coda.prendi("nodo2", 1, adesso=115.0) == []
+
+
+def test_allinea_non_rimuove_lavori_in_lease(coda):
+    coda.allinea(["a", "b"], adesso=100.0)
+    coda.prendi("nodo1", 1, adesso=100.0)
+
+    assert coda.allinea([], adesso=101.0) == (0, 1)
+    assert [riga["utente"] for riga in coda.stato()] == ["a"]
+
+
+def test_rilascia_rende_i_lavori_subito_disponibili(coda):
+    coda.allinea(["a"], adesso=100.0)
+    coda.prendi("nodo1", 1, adesso=100.0)
+
+    assert coda.rilascia("nodo1") == 1
+    assert coda.prendi("nodo2", 1, adesso=100.0)[0]["precedente"] is None
+
+
+def test_nodo_senza_worker_liberi_non_gira_a_vuoto(tmp_path, monkeypatch):
+    profili = [{"nome": f"u{n}", "username": "u", "password": "p", "cartella": str(tmp_path / f"u{n}")}
+               for n in range(3)]
+    profili_path = tmp_path / "users.json"
+    profili_path.write_text(json.dumps(profili), encoding="utf-8")
+    coda_path = str(tmp_path / "coda.db")
+
+    def lavoro_lento(coda_path, nodo, profilo, lavoro, date, concorrente=None):
+        time.sleep(1.0)
+        with CodaLavori(coda_path) as coda:
+            coda.completa(nodo, lavoro, "ok", time.time() + 3600, 0, 0)
+
+    prese = []
+    prendi = CodaLavori.prendi
+
+    def conta_prendi(self, nodo, quanti=1, *args, **kwargs):
+        prese.append(quanti)
+        return prendi(self, nodo, quanti, *args, **kwargs)
+
+    monkeypatch.setattr(coordinatore, "esegui_lavoro", lavoro_lento)
+    monkeypatch.setattr(CodaLavori, "prendi", conta_prendi)
+    arresto = threading.Event()
+    nodo = threading.Thread(target=coordinatore.esegui_nodo, args=(str(profili_path), coda_path),
+                            kwargs={"nodo": "n1", "workers": 1, "arresto": arresto})
+    nodo.start()
+    time.sleep(2.5)
+    arresto.set()
+    nodo.join()
+
+    # un controllo della coda per ogni lavoro terminato, più quello iniziale
+    assert len(prese) <= 4
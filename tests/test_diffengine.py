@@ -0,0 +1,54 @@
+from zoneinfo import ZoneInfo
+
+import diffengine
+
+ROMA = ZoneInfo("Europe/Rome")
+
+CORPO = {
+    "summary": "UFS01 Analisi",
+    "location": "A1 - Presenza",
+    "description": "Docente: Rossi",
+    "start": {"dateTime": "2025-10-06T09:00:00", "timeZone": "Europe/Rome"},
+    "end": {"dateTime": "2025-10-06T11:00:00", "timeZone": "Europe/Rome"},
+    "reminders": {"useDefault": False, "overrides": []},
+    "extendedProperties": {"private": {"geopId": "101"}},
+}
+
+
+def test_evento_identico_nessuna_differenza():
+    assert diffengine.differenze(CORPO, dict(CORPO), ROMA) == {}
+
+
+def test_stesso_istante_con_offset_non_e_una_modifica():
+    google = {**CORPO, "start": {"dateTime": "2025-10-06T07:00:00Z"}, "end": {"dateTime": "2025-10-06T11:00:00+02:00"}}
+    assert diffengine.differenze(CORPO, google, ROMA) == {}
+
+
+def test_assenza_e_stringa_vuota_si_equivalgono():
+    nuovo = {**CORPO, "location": ""}
+    google = {chiave: valore for chiave, valore in CORPO.items() if chiave != "location"}
+    assert diffengine.differenze(nuovo, google, ROMA) == {}
+
+
+def test_solo_i_campi_cambiati():
+    google = {**CORPO, "location": "B2 - Presenza", "colorId": "5", "etag": "x", "id": "g1"}
+    # colorId non è nel corpo calcolato: non viene toccato
+    assert diffengine.differenze(CORPO, google, ROMA) == {"location": "A1 - Presenza"}
+
+
+def test_tag_geop_mancante_va_scritto():
+    google = {**CORPO, "extendedProperties": {"private": {}}}
+    assert diffengine.differenze(CORPO, google, ROMA) == {"extendedProperties": CORPO["extendedProperties"]}
+
+
+def test_orario_spostato():
+    google = {**CORPO, "start": {"dateTime": "2025-10-06T10:00:00", "timeZone": "Europe/Rome"}}
+    assert diffengine.differenze(CORPO, google, ROMA) == {"start": CORPO["start"]}
+
+
+def test_statistiche_campi():
+    statistiche = diffengine.StatisticheCampi()
+    assert str(statistiche) == "nessun campo modificato"
+    statistiche.registra({"location": "x", "start": {}})
+    statistiche.registra({"location": "y"})
+    assert str(statistiche) == "location=2, start=1"
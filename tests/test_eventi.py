@@ -0,0 +1,70 @@
+import datetime
+import json
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import eventi
+import parser
+
+EVENTO = {
+    "id": 101, "title": "Analisi 1 - Limiti", "start": "2025-10-06T09:00:00", "end": "2025-10-06T11:00:00",
+    "ClasseEvento": "lezione", "tooltip": "Materia: Analisi 1", "Materia": "Analisi 1 - Limiti", "Aula": "A1",
+    "Docente": "Rossi", "Modalità": "Presenza", "Argomento": "Limiti",
+}
+
+
+def test_epoch_coincide_con_zoneinfo_anche_ai_cambi_d_ora():
+    fuso = ZoneInfo("Europe/Rome")
+    istante = datetime.datetime(2025, 3, 29)
+    while istante < datetime.datetime(2025, 3, 31):
+        assert eventi._epoch(istante.isoformat()) == int(istante.replace(tzinfo=fuso).timestamp())
+        istante += datetime.timedelta(minutes=7, seconds=13)
+    istante = datetime.datetime(2025, 10, 25)
+    while istante < datetime.datetime(2025, 10, 27):
+        assert eventi._epoch(istante.isoformat()) == int(istante.replace(tzinfo=fuso).timestamp())
+        istante += datetime.timedelta(minutes=7, seconds=13)
+
+
+def test_epoch_con_fuso_e_senza_secondi():
+    assert eventi._epoch("2025-10-06T09:00:00+02:00") == eventi._epoch("2025-10-06T09:00:00")
+    assert eventi._epoch("2025-10-06T09:00") == eventi._epoch("2025-10-06T09:00:00")
+    assert eventi._epoch("") == 0
+
+
+def test_record_coincide_con_le_funzioni_sui_dizionari():
+    evento = eventi.EventoGeop.da_dizionario(EVENTO)
+
+    assert evento.chiave == parser.chiave_evento(EVENTO)
+    assert evento.body == parser.format_event(EVENTO)
+    assert evento.impronta_geop == parser.impronta_evento(EVENTO)
+    assert evento.dizionario() == {chiave: valore if chiave != "id" else str(valore) for chiave, valore in EVENTO.items()}
+
+
+def test_eventi_senza_materia_scartati():
+    assert eventi.da_eventi([EVENTO, {**EVENTO, "id": 102, "Materia": None}]) == [eventi.EventoGeop.da_dizionario(EVENTO)]
+
+
+def test_salva_e_carica(tmp_path):
+    records = eventi.da_eventi([EVENTO, {**EVENTO, "id": 102, "Aula": None, "start": "2025-10-07T14:30:00"}])
+    path = str(tmp_path / eventi.CALENDARIO_BINARIO)
+
+    assert eventi.salva(records, path) == 2
+    assert eventi.carica(path) == records
+
+
+def test_json_e_bin_danno_gli_stessi_record(tmp_path):
+    json_path = tmp_path / "calendar.json"
+    json_path.write_text(json.dumps([EVENTO]), encoding="utf-8")
+    bin_path = str(tmp_path / eventi.CALENDARIO_BINARIO)
+    eventi.salva(eventi.leggi(str(json_path)), bin_path)
+
+    assert eventi.leggi(bin_path) == eventi.leggi(str(json_path))
+
+
+def test_carica_rifiuta_file_non_validi(tmp_path):
+    path = tmp_path / eventi.CALENDARIO_BINARIO
+    path.write_bytes(b"non marshal")
+
+    with pytest.raises(ValueError):
+        eventi.carica(str(path))
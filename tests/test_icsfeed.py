@@ -0,0 +1,61 @@
+import os
+
+import eventi
+import icsfeed
+
+EVENTO = {
+    "id": 101, "title": "Analisi", "start": "2025-10-06T09:00:00", "end": "2025-10-06T11:00:00",
+    "ClasseEvento": "lezione", "tooltip": "PRESENTE", "Materia": "UFS01 - Analisi", "Aula": "A1",
+    "Docente": "Rossi", "Modalità": "Presenza", "Argomento": "Limiti",
+}
+
+
+def test_testo_escape():
+    assert icsfeed._testo("a;b,c\\d") == "a\\;b\\,c\\\\d"
+    assert icsfeed._testo("x\r\ny\nz\rw") == "x\\ny\\nz\\nw"
+    assert icsfeed._testo(None) == ""
+
+
+def test_piega_utf8_multibyte():
+    riga = "DESCRIPTION:" + "è€😀a" * 40
+    righe = icsfeed._piega(riga).split("\r\n")
+
+    assert len(righe) > 1
+    assert all(len(parte.encode("utf-8")) <= 75 for parte in righe)
+    assert all(parte.startswith(" ") for parte in righe[1:])
+    assert righe[0] + "".join(parte[1:] for parte in righe[1:]) == riga
+
+
+def test_piega_righe_corte_invariate():
+    assert icsfeed._piega("SUMMARY:breve") == "SUMMARY:breve"
+
+
+def _aggiorna(cartella, eventi_geop):
+    return icsfeed.aggiorna_feed(feed_path=str(cartella / "geop.ics"), cache_path=str(cartella / "cache.json"),
+                                 eventi_geop=eventi_geop)
+
+
+def test_aggiorna_feed_non_riscrive_se_nulla_cambia(tmp_path):
+    records = eventi.da_eventi([EVENTO])
+    assert _aggiorna(tmp_path, records)["aggiunti"] == 1
+    feed = tmp_path / "geop.ics"
+    contenuto, mtime = feed.read_bytes(), os.stat(feed).st_mtime_ns
+
+    esito = _aggiorna(tmp_path, eventi.da_eventi([EVENTO]))
+
+    assert esito["scritto"] is False and esito["invariati"] == 1
+    assert feed.read_bytes() == contenuto and os.stat(feed).st_mtime_ns == mtime
+    assert b"SEQUENCE:0\r\n" in contenuto
+
+
+def test_aggiorna_feed_incrementa_sequence_solo_per_gli_eventi_modificati(tmp_path):
+    altro = {**EVENTO, "id": 102, "start": "2025-10-07T09:00:00", "end": "2025-10-07T11:00:00"}
+    _aggiorna(tmp_path, eventi.da_eventi([EVENTO, altro]))
+
+    esito = _aggiorna(tmp_path, eventi.da_eventi([{**EVENTO, "Aula": "B2"}, altro]))
+
+    assert (esito["modificati"], esito["invariati"], esito["scritto"]) == (1, 1, True)
+    testo = (tmp_path / "geop.ics").read_bytes().decode("utf-8")
+    blocchi = {blocco.split("UID:")[1].split("@")[0]: blocco for blocco in testo.split("BEGIN:VEVENT")[1:]}
+    assert "SEQUENCE:1\r\n" in blocchi["101"] and "SEQUENCE:0\r\n" in blocchi["102"]
+    assert all(riga.endswith("\r") or not riga for riga in testo.split("\n"))
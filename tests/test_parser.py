@@ -0,0 +1,50 @@
+import pytest
+
+import parser
+
+
+@pytest.mark.parametrize("tooltip, atteso", [
+    (
+        "PRESENTE<br>Materia: UFS01 - Analisi<br>Aula: A1<br>Docente: Rossi Mario<br>Modalit&agrave;: - Presenza"
+        "<br>Argomento: Limiti",
+        {"tooltip": "PRESENTE", "Materia": "UFS01 - Analisi", "Aula": "A1", "Docente": "Rossi Mario",
+         "Modalità": "Presenza", "Argomento": "Limiti"},
+    ),
+    # più chiavi sulla stessa riga
+    (
+        "PRESENTE<br>Materia: UFT02 Reti Aula: Lab 3 Docente: Verdi",
+        {"tooltip": "PRESENTE", "Materia": "UFT02 Reti", "Aula": "Lab 3", "Docente": "Verdi"},
+    ),
+    # un valore vuoto non assorbe la chiave che segue, sulla stessa riga o sulla successiva
+    ("PRESENTE<br>Docente:  Aula: x:y", {"tooltip": "PRESENTE", "Docente": "", "Aula": "x:y"}),
+    ("PRESENTE<br>Docente:<br>Aula: B2", {"tooltip": "PRESENTE", "Docente": "", "Aula": "B2"}),
+    # ":" senza una chiave nota restano nel valore
+    ("ASSENTE<br>Materia: Intro: basi<br>Docente: Bianchi",
+     {"tooltip": "ASSENTE", "Materia": "Intro: basi", "Docente": "Bianchi"}),
+    ("PRESENTE<br>Argomento: nota:Aula non disponibile", {"tooltip": "PRESENTE", "Argomento": "nota:Aula non disponibile"}),
+    # righe senza chiave continuano il valore precedente
+    ("PRESENTE<br>Argomento: TCP<br>handshake a tre vie<br>Corsi: ITS",
+     {"tooltip": "PRESENTE", "Argomento": "TCP handshake a tre vie", "Corsi": "ITS"}),
+    ("PRESENTE<br>Argomento: Caff&egrave; &amp; biscotti", {"tooltip": "PRESENTE", "Argomento": "Caffè & biscotti"}),
+    ("PRESENTE<br>materia: minuscolo<br>AULA: A2", {"tooltip": "PRESENTE", "materia": "minuscolo", "AULA": "A2"}),
+    ("<br>  <br>GIUSTIFICATO", {"tooltip": "GIUSTIFICATO"}),
+    ("", {}),
+])
+def test_parse_tooltip(tooltip, atteso):
+    assert parser.parse_tooltip(tooltip) == atteso
+
+
+def test_iter_parse_scarta_sospensioni_ed_eventi_senza_id():
+    eventi = [
+        {"id": 0, "title": "x", "tooltip": "PRESENTE"},
+        {"id": 1, "title": " SOSPENSIONE DIDATTICA", "tooltip": "PRESENTE"},
+        {"id": 2, "title": "UFS01", "tooltip": "PRESENTE<br>Aula: A1"},
+        {"id": 3, "title": "senza tooltip"},
+    ]
+    assert parser.parse_json(eventi) == [{"id": 2, "title": "UFS01", "tooltip": "PRESENTE", "Aula": "A1"}]
+
+
+def test_iter_eventi_a_blocchi():
+    testo = '[{"id": 1, "title": "Caff\\u00e8"}, {"id": 2, "title": "b"}]'.encode()
+    blocchi = [testo[i:i + 5] for i in range(0, len(testo), 5)]
+    assert list(parser.iter_eventi(blocchi)) == [{"id": 1, "title": "Caffè"}, {"id": 2, "title": "b"}]
@@ -0,0 +1,65 @@
+import datetime
+import random
+
+import polling
+
+# lunedì 6 ottobre 2025, una lezione 9-11
+LEZIONE = {"start": "2025-10-06T09:00:00", "end": "2025-10-06T11:00:00"}
+
+
+class _SenzaJitter(random.Random):
+    def uniform(self, a, b):
+        return b
+
+
+def attesa(adesso: str, eventi=(LEZIONE,), invariati: int = 0, fallimenti: int = 0) -> float:
+    return polling.prossima_attesa(list(eventi), datetime.datetime.fromisoformat(adesso), invariati, fallimenti,
+                                   rng=_SenzaJitter())[0]
+
+
+def test_vicino_a_inizio_e_fine_lezione():
+    assert attesa("2025-10-06T08:50:00") == polling.INTERVALLO_VICINO
+    assert attesa("2025-10-06T11:10:00", invariati=5) == polling.INTERVALLO_VICINO
+
+
+def test_durante_la_lezione():
+    assert attesa("2025-10-06T09:30:00") == polling.INTERVALLO_LEZIONE
+
+
+def test_raddoppio_limitato_a_raddoppi_invariati():
+    massimo = polling.INTERVALLO_LEZIONE * 2 ** polling.RADDOPPI_INVARIATI
+    assert attesa("2025-10-06T09:20:00", invariati=1) == min(polling.INTERVALLO_LEZIONE * 2, massimo)
+    # al massimo fino a 15 minuti prima della fine (10:45): 85 minuti
+    assert attesa("2025-10-06T09:20:00", invariati=10) == min(massimo, 85 * 60)
+    assert attesa("2025-10-11T12:00:00", invariati=10) == min(
+        polling.INTERVALLO_MASSIMO, polling.INTERVALLO_RIPOSO * 2 ** polling.RADDOPPI_INVARIATI)
+
+
+def test_giorno_feriale_non_raddoppia():
+    assert attesa("2025-10-07T14:00:00", eventi=(), invariati=10) == polling.INTERVALLO_FERIALE
+
+
+def test_attesa_termina_prima_della_lezione():
+    # lezione alle 9: sveglia alle 8:45
+    assert attesa("2025-10-06T08:20:00", invariati=10) == 25 * 60
+    assert attesa("2025-10-05T23:00:00", invariati=10) == 6 * 3600
+
+
+def test_notte_e_weekend_terminano_al_mattino_feriale():
+    # senza lezioni il sonno si ferma alle 7 di un giorno feriale, non prosegue nella mattina
+    assert attesa("2025-10-06T04:00:00", eventi=(), invariati=10) == 3 * 3600
+    assert attesa("2025-10-13T05:30:00", eventi=(), invariati=10) == 90 * 60
+    # domenica alle 22: fino a lunedì alle 7 mancano 9 ore, più di INTERVALLO_MASSIMO
+    assert attesa("2025-10-12T22:00:00", eventi=(), invariati=10) == polling.INTERVALLO_MASSIMO
+    assert attesa("2025-10-12T04:00:00", eventi=(), invariati=0) == polling.INTERVALLO_RIPOSO
+
+
+def test_backoff_dopo_i_fallimenti():
+    assert attesa("2025-10-06T09:30:00", fallimenti=1) == polling.BACKOFF_BASE
+    assert attesa("2025-10-06T09:30:00", fallimenti=3) == polling.BACKOFF_BASE * 4
+    assert attesa("2025-10-06T09:30:00", fallimenti=30) == polling.BACKOFF_MASSIMO
+
+
+def test_attesa_minima():
+    # a un minuto dalla sveglia per la lezione si attende comunque INTERVALLO_MINIMO
+    assert attesa("2025-10-06T08:44:30") >= polling.INTERVALLO_MINIMO
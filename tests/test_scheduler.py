@@ -0,0 +1,96 @@
+import json
+import types
+
+import pytest
+from googleapiclient.errors import HttpError
+
+import scheduler
+
+
+class _Orologio:
+    """
+    Sostituisce time.monotonic e time.sleep di scheduler: il tempo avanza solo con le attese.
+    """
+
+    def __init__(self):
+        self.adesso = 1000.0
+
+    def monotonic(self):
+        return self.adesso
+
+    def sleep(self, secondi):
+        self.adesso += secondi
+
+
+@pytest.fixture
+def orologio(monkeypatch):
+    orologio = _Orologio()
+    monkeypatch.setattr(scheduler, "time", orologio)
+    return orologio
+
+
+def _errore(status: int, motivo: str = None) -> HttpError:
+    corpo = {"error": {"errors": [{"reason": motivo}]}} if motivo else {"error": {}}
+    return HttpError(types.SimpleNamespace(status=status, reason=""), json.dumps(corpo).encode())
+
+
+def test_bucket_pieno_non_attende(orologio):
+    bucket = scheduler.TokenBucket(10, capacita=5)
+    assert [bucket.acquisisci() for _ in range(5)] == [0.0] * 5
+    assert bucket.attesa_totale == 0.0
+
+
+def test_bucket_vuoto_attende_il_ritmo_medio(orologio):
+    bucket = scheduler.TokenBucket(10, capacita=5)
+    for _ in range(5):
+        bucket.acquisisci()
+    assert bucket.acquisisci() == pytest.approx(0.1)
+    # durante l'attesa il bucket si è riempito di un solo gettone, già usato
+    assert bucket.acquisisci() == pytest.approx(0.1)
+
+
+def test_richiesta_piu_grande_della_capacita_passa_in_prestito(orologio):
+    bucket = scheduler.TokenBucket(10, capacita=5)
+    assert bucket.acquisisci(25) == pytest.approx(2.0)
+    assert bucket.attesa_totale == pytest.approx(2.0)
+
+
+def test_bucket_si_riempie_fino_alla_capacita(orologio):
+    bucket = scheduler.TokenBucket(10, capacita=5)
+    bucket.acquisisci(5)
+    orologio.adesso += 60
+    assert bucket.acquisisci(5) == 0.0
+    assert bucket.acquisisci() == pytest.approx(0.1)
+
+
+def test_quota_per_utente_e_globale(orologio):
+    scheduler.configura(al_secondo=100, per_utente=1, capacita=1)
+    try:
+        assert scheduler.acquisisci(1, utente="a") == 0.0
+        # l'utente "a" ha esaurito la sua quota, "b" no
+        assert scheduler.acquisisci(1, utente="a") == pytest.approx(1.0)
+        assert scheduler.acquisisci(1, utente="b") == pytest.approx(0.0, abs=0.02)
+    finally:
+        scheduler.configura()
+
+
+@pytest.mark.parametrize("errore, atteso", [
+    (_errore(429), True),
+    (_errore(503), True),
+    (_errore(403, "rateLimitExceeded"), True),
+    (_errore(403, "userRateLimitExceeded"), True),
+    (_errore(403, "forbidden"), False),
+    (_errore(404), False),
+    (ValueError("non HTTP"), False),
+])
+def test_da_riprovare(errore, atteso):
+    assert scheduler.da_riprovare(errore) is atteso
+
+
+def test_attesa_backoff_limitata(monkeypatch):
+    monkeypatch.setattr(scheduler.random, "uniform", lambda a, b: b)
+    assert scheduler.attesa_backoff(0) == scheduler.BACKOFF_BASE
+    assert scheduler.attesa_backoff(3) == scheduler.BACKOFF_BASE * 8
+    assert scheduler.attesa_backoff(20) == scheduler.BACKOFF_MAX
+    monkeypatch.setattr(scheduler.random, "uniform", lambda a, b: a)
+    assert scheduler.attesa_backoff(3) == 0
@@ -0,0 +1,61 @@
+import types
+
+import pytest
+
+import traccia
+
+
+class _Sessione:
+    def send(self, request, **kwargs):
+        if not isinstance(request.body, (bytes, str, type(None))):
+            request.body = b"".join(request.body)
+        return types.SimpleNamespace(status_code=200, headers={}, content=b"ok")
+
+
+class _Http:
+    def request(self, uri, method="GET", body=None, headers=None):
+        return types.SimpleNamespace(status=204), b""
+
+
+@pytest.fixture
+def tracce(tmp_path):
+    traccia.configura(soglia=3600, cartella=str(tmp_path))
+    yield
+    traccia.configura()
+
+
+def _richieste(tracciato):
+    return [span["attributi"] for span in tracciato.radice["figli"] if span["nome"] == "http"]
+
+
+def test_corpo_in_streaming_non_fa_fallire_la_richiesta(tracce):
+    sessione = traccia.sessione(_Sessione())
+    richiesta = types.SimpleNamespace(method="POST", url="https://geop.example/x?a=1", body=(b"a" for _ in range(3)))
+
+    with traccia.ciclo() as tracciato:
+        assert sessione.send(richiesta).status_code == 200
+        traccia.http(_Http()).request("https://www.googleapis.com/batch", "POST", body=iter([b"x"]))
+
+    geop, google = _richieste(tracciato)
+    assert geop == {"metodo": "POST", "url": "https://geop.example/x", "byte_inviati": None, "status": 200,
+                    "byte_ricevuti": 2}
+    assert google["byte_inviati"] is None and google["status"] == 204
+
+
+def test_solo_le_connessioni_avvolte(tracce):
+    avvolta, libera = traccia.http(_Http()), _Http()
+
+    with traccia.ciclo() as tracciato:
+        avvolta.request("https://a.example/", body="abc")
+        libera.request("https://b.example/")
+
+    assert [(r["url"], r["byte_inviati"]) for r in _richieste(tracciato)] == [("https://a.example/", 3)]
+    assert _Http.request is not avvolta.request
+
+
+def test_fuori_da_un_ciclo_nessuno_span():
+    sessione = traccia.sessione(_Sessione())
+    richiesta = types.SimpleNamespace(method="GET", url="https://geop.example/", body=None)
+
+    assert sessione.send(richiesta).content == b"ok"
+    assert traccia._attiva is None
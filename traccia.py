@@ -0,0 +1,278 @@
+# tracce dei cicli di sincronizzazione, attive solo su richiesta: span annidati (fasi e richieste HTTP con URL,
+# status, byte e durata), cProfile su una frazione dei cicli e salvataggio su file dei cicli lenti
+import contextlib
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+
+# cartella delle tracce salvate e numero massimo di cicli conservati (i più vecchi vengono eliminati)
+TRACCE = "tracce"
+MAX_TRACCE = 20
+
+# funzioni riportate nel riepilogo di pstats salvato con la traccia
+RIGHE_PROFILO = 40
+
+_config = {"soglia": None, "frequenza": 0.0, "cartella": TRACCE, "massimo": MAX_TRACCE}
+_attiva = None
+
+
+def configura(soglia: float = None, frequenza: float = 0.0, cartella: str = TRACCE, massimo: int = MAX_TRACCE):
+    """
+    Attiva le tracce dei cicli (`ciclo`). Con i valori predefiniti sono disattivate e non costano nulla.
+    Le richieste HTTP vengono registrate solo sulle connessioni avvolte con `sessione` e `http`.
+
+    Args:
+        soglia (float): Durata in secondi oltre la quale un ciclo viene salvato in `cartella`; None per nessuna soglia.
+        frequenza (float): Frazione dei cicli (tra 0 e 1) eseguiti sotto cProfile e sempre salvati.
+        cartella (str): Cartella delle tracce salvate.
+        massimo (int): Cicli conservati nella cartella.
+
+    Raises:
+        ValueError: Se `frequenza` non è tra 0 e 1.
+    """
+    if not 0.0 <= frequenza <= 1.0:
+        raise ValueError("frequenza deve essere compresa tra 0 e 1")
+    _config.update(soglia=soglia, frequenza=frequenza, cartella=cartella, massimo=massimo)
+
+
+def attive() -> bool:
+    """
+    Indica se le tracce dei cicli sono attive.
+    """
+    return _config["soglia"] is not None or _config["frequenza"] > 0
+
+
+class Traccia:
+    """
+    Albero degli span di un ciclo. Ogni thread ha la propria pila di span aperti: uno span aperto in un thread
+    senza span attivi (es. la lettura di Google della pipeline concorrente) diventa figlio della radice
+    e riporta il nome del thread.
+
+    Attributes:
+        radice (dict): Span del ciclo: {"nome", "inizio", "durata", "attributi", "figli"}, tempi in secondi
+                       dall'inizio del ciclo.
+        profilo (str): Riepilogo di pstats se il ciclo è stato profilato, altrimenti None.
+        file (str): Traccia salvata alla fine del ciclo, None se non è stata salvata.
+    """
+
+    def __init__(self, nome: str):
+        self._t0 = time.perf_counter()
+        self.radice = {"nome": nome, "inizio": 0.0, "durata": None, "attributi": {
+            "avvio": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+        }, "figli": []}
+        self.profilo = None
+        self.file = None
+        self._pile = threading.local()
+        self._lock = threading.Lock()
+
+    def _pila(self) -> list:
+        if not hasattr(self._pile, "span"):
+            self._pile.span = []
+        return self._pile.span
+
+    def apri(self, nome: str, attributi: dict) -> dict:
+        pila = self._pila()
+        span = {"nome": nome, "inizio": round(time.perf_counter() - self._t0, 6), "durata": None,
+                "attributi": attributi, "figli": []}
+        if pila:
+            genitore = pila[-1]
+        else:
+            genitore = self.radice
+            if threading.current_thread() is not threading.main_thread():
+                attributi["thread"] = threading.current_thread().name
+        with self._lock:
+            genitore["figli"].append(span)
+        pila.append(span)
+        return span
+
+    def chiudi(self, span: dict):
+        span["durata"] = round(time.perf_counter() - self._t0 - span["inizio"], 6)
+        pila = self._pila()
+        if pila and pila[-1] is span:
+            pila.pop()
+
+
+@contextlib.contextmanager
+def span(nome: str, **attributi):
+    """
+    Registra il blocco `with` come span della traccia del ciclo in corso (niente se le tracce non sono attive).
+    Restituisce il dizionario degli attributi, a cui il blocco può aggiungere valori (es. lo status HTTP).
+
+    Example:
+        with traccia.span("discovery_build"):\n
+            service = build_from_document(doc, http=http)
+    """
+    traccia = _attiva
+    if traccia is None:
+        yield attributi
+        return
+    aperto = traccia.apri(nome, attributi)
+    try:
+        yield attributi
+    except BaseException as error:
+        attributi["errore"] = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        traccia.chiudi(aperto)
+
+
+@contextlib.contextmanager
+def ciclo(nome: str = "ciclo"):
+    """
+    Traccia un ciclo di sincronizzazione se le tracce sono attive (vedi `configura`).
+
+    Una frazione `frequenza` dei cicli viene eseguita sotto cProfile (solo il thread che chiama `ciclo`:
+    cProfile non segue gli altri thread, i cui tempi restano comunque negli span). Il ciclo viene salvato
+    in `cartella` se dura più di `soglia` secondi o se è stato profilato: un file JSON con gli span
+    e il riepilogo di pstats e, per i cicli profilati, il file .prof da aprire con pstats o snakeviz.
+
+    Yields:
+        Traccia: La traccia del ciclo (`file` è valorizzato all'uscita se è stata salvata), None se non attive.
+    """
+    global _attiva
+
+    if not attive() or _attiva is not None:
+        # tracce disattivate, o ciclo annidato in un altro già tracciato
+        yield None
+        return
+
+    traccia = Traccia(nome)
+    profiler = cProfile.Profile() if random.random() < _config["frequenza"] else None
+    _attiva = traccia
+    if profiler:
+        profiler.enable()
+    try:
+        yield traccia
+    finally:
+        if profiler:
+            profiler.disable()
+        _attiva = None
+        traccia.radice["durata"] = round(time.perf_counter() - traccia._t0, 6)
+
+        soglia = _config["soglia"]
+        if profiler or (soglia is not None and traccia.radice["durata"] > soglia):
+            try:
+                _salva(traccia, profiler)
+            except OSError:
+                # una traccia non salvata non deve far fallire la sincronizzazione
+                traccia.file = None
+
+
+def _salva(traccia: Traccia, profiler: cProfile.Profile = None):
+    cartella, massimo = _config["cartella"], _config["massimo"]
+    os.makedirs(cartella, exist_ok=True)
+    base = os.path.join(cartella, f"{traccia.radice['nome']}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}")
+
+    if profiler:
+        profiler.dump_stats(f"{base}.prof")
+        testo = io.StringIO()
+        pstats.Stats(profiler, stream=testo).sort_stats("cumulative").print_stats(RIGHE_PROFILO)
+        traccia.profilo = testo.getvalue()
+
+    temporaneo = f"{base}.json.tmp"
+    with open(temporaneo, "w", encoding="utf-8") as file:
+        json.dump({"span": traccia.radice, "http": riepilogo_http(traccia.radice), "profilo": traccia.profilo},
+                  file, ensure_ascii=False, indent=1)
+    os.replace(temporaneo, f"{base}.json")
+    traccia.file = f"{base}.json"
+
+    # rotazione: restano gli ultimi `massimo` cicli (.json e relativo .prof)
+    salvate = sorted(
+        (nome for nome in os.listdir(cartella) if nome.endswith(".json")),
+        key=lambda nome: (os.path.getmtime(os.path.join(cartella, nome)), nome),
+    )
+    for nome in salvate[:-massimo] if massimo else []:
+        for estensione in (".json", ".prof"):
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(cartella, nome.removesuffix(".json") + estensione))
+
+
+def riepilogo_http(radice: dict) -> dict:
+    """
+    Totali delle richieste HTTP di una traccia per host: richieste, secondi e byte ricevuti.
+    """
+    totali = {}
+    pila = [radice]
+    while pila:
+        span = pila.pop()
+        pila.extend(span["figli"])
+        if span["nome"] != "http":
+            continue
+        host = span["attributi"].get("url", "").split("/")[2:3] or ["?"]
+        voce = totali.setdefault(host[0], {"richieste": 0, "secondi": 0.0, "byte_ricevuti": 0})
+        voce["richieste"] += 1
+        voce["secondi"] = round(voce["secondi"] + (span["durata"] or 0.0), 6)
+        voce["byte_ricevuti"] += span["attributi"].get("byte_ricevuti") or 0
+    return totali
+
+
+def _url(url: str) -> str:
+    # senza query string: parametri lunghi e ripetitivi (fields, syncToken) che non servono a capire i tempi
+    return str(url).split("?", 1)[0]
+
+
+def _byte(corpo):
+    # un corpo in streaming (generatore o file) non ha lunghezza: la traccia non deve mai far fallire la richiesta
+    if corpo is None:
+        return 0
+    try:
+        return len(corpo)
+    except TypeError:
+        return None
+
+
+def sessione(session):
+    """
+    Registra uno span "http" per ogni richiesta della sessione requests (GEOP, rinnovo del token Google)
+    eseguita durante un ciclo tracciato. Viene avvolta solo la sessione indicata, non la libreria;
+    fuori da un ciclo tracciato il costo è un controllo per richiesta.
+
+    Returns:
+        requests.Session: La stessa sessione.
+    """
+    invia = session.send
+
+    def send(request, **kwargs):
+        if _attiva is None:
+            return invia(request, **kwargs)
+        with span("http", metodo=request.method, url=_url(request.url), byte_inviati=_byte(request.body)) as attributi:
+            response = invia(request, **kwargs)
+            attributi["status"] = response.status_code
+            # con stream=True il corpo non è ancora stato letto: si usa Content-Length, se presente
+            if kwargs.get("stream"):
+                attributi["byte_ricevuti"] = int(response.headers.get("Content-Length") or 0) or None
+            else:
+                attributi["byte_ricevuti"] = len(response.content)
+            return response
+
+    session.send = send
+    return session
+
+
+def http(connessione):
+    """
+    Come `sessione`, per una connessione httplib2 (API di Google Calendar, batch compresi): va avvolta
+    la connessione interna di AuthorizedHttp, che esegue anche i rinnovi del token.
+
+    Returns:
+        httplib2.Http: La stessa connessione.
+    """
+    richiedi = connessione.request
+
+    def request(uri, method="GET", body=None, headers=None, *args, **kwargs):
+        if _attiva is None:
+            return richiedi(uri, method, body, headers, *args, **kwargs)
+        with span("http", metodo=method, url=_url(uri), byte_inviati=_byte(body)) as attributi:
+            risposta, contenuto = richiedi(uri, method, body, headers, *args, **kwargs)
+            attributi["status"] = risposta.status
+            attributi["byte_ricevuti"] = len(contenuto or b"")
+            return risposta, contenuto
+
+    connessione.request = request
+    return connessione